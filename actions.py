@@ -29,6 +29,8 @@ from gpszoomdialog import GpsZoomDialog
 from mapswitchdialog import MapSwitchButton
 from parcelidentifier import ParcelIdentifyAction
 from pixelmeasure import PixelMeasureAction
+from qgsutils import SpatialiteIterator
+from zonalstats import ZonalStatistics
 
 
 class Actions(object):
@@ -98,6 +100,20 @@ class Actions(object):
                 self.gpsDialog.hide()
             self.main.selectionManagerPoints.clearWithMode(0)
 
+    def zonalStatsObjections(self):
+        """Calculate the erosion statistics of all parcels with an objection.
+
+        The results are shown in a new table.
+        """
+        layer = self.main.utils.getLayerByName(
+            self.main.settings.getValue('layers/bezwaren'))
+        if not layer:
+            return
+        parcels = SpatialiteIterator(layer).queryWhere(
+            [('datum_bezwaar', 'IS NOT', None)], ['uniek_id'])
+        ZonalStatistics(self.main).run(parcels,
+                                       'Erosiestatistieken bezwaren')
+
     def addAllActionsToToolbar(self):
         """Initialise all actions and add them to the toolbar."""
         exitAction = QtGui.QAction(QtGui.QIcon(':/icons/icons/exit.png'),
@@ -170,9 +186,19 @@ class Actions(object):
         self.pixelMeasureAction.setVisible(False)
         self.toolbar.addAction(self.pixelMeasureAction)
 
+        self.zonalStatsAction = QtGui.QAction(
+            'Erosiestatistieken van alle bezwaren', self.parent)
+        QtCore.QObject.connect(self.zonalStatsAction,
+                               QtCore.SIGNAL('triggered(bool)'),
+                               self.zonalStatsObjections)
+        self.main.iface.addPluginToMenu('DOV - Erosiebezwaren',
+                                        self.zonalStatsAction)
+
     def deactivate(self):
         """Deactivate actions that need it and delete the toolbar."""
         self.parcelIdentifyAction.deactivate()
         self.mapSwitchButton.deactivate()
         self.pixelMeasureAction.deactivate()
+        self.main.iface.removePluginMenu('DOV - Erosiebezwaren',
+                                         self.zonalStatsAction)
         del(self.toolbar)
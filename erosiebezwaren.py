@@ -22,13 +22,20 @@ import PyQt4.QtCore as QtCore
 import PyQt4.QtGui as QtGui
 
 import actions
+import qgsutils
 import utils
 
 from annotate import AnnotationManager
+from featurecache import FeatureCache
+from fileindex import FileIndex
+from minmaxpyramid import MinMaxPyramidIndex
 from parcelinfowidget import ParcelInfoDock
 from parcelinfowidget import ParcelInfoWidget
+from rasterblockcache import RasterBlockCache
 from selectionmanager import SelectionManager
+from selectionoverlay import OverlaySelectionManager
 from settingsmanager import SettingsManager
+from viewportdispatcher import ViewportDispatcher
 
 
 class Erosiebezwaren(object):
@@ -65,9 +72,24 @@ class Erosiebezwaren(object):
         self.iface.addPluginToMenu('DOV - Erosiebezwaren', self.action)
 
         self.utils = utils.Utils(self)
-        self.selectionManagerPolygons = SelectionManager(
+        self.queryExecutor = qgsutils.SpatialiteQueryExecutor()
+        self.producentnrIndex = None
+        self.featureCache = FeatureCache(self)
+        self.fileIndex = FileIndex(self)
+        self.rasterBlockCache = RasterBlockCache(self)
+        self.minMaxPyramids = MinMaxPyramidIndex(self)
+        self.transformCache = qgsutils.CoordinateTransformCache()
+        self.viewportDispatcher = ViewportDispatcher(self)
+
+        # 'layer' to select in the temporary layers, 'overlay' to draw the
+        # selection on the map canvas
+        if self.settings.getValue('selection/backend') == 'overlay':
+            selectionManager = OverlaySelectionManager
+        else:
+            selectionManager = SelectionManager
+        self.selectionManagerPolygons = selectionManager(
             self, self.settings.getValue('layers/tempSelectionPolygons'))
-        self.selectionManagerPoints = SelectionManager(
+        self.selectionManagerPoints = selectionManager(
             self, self.settings.getValue('layers/tempSelectionPoints'))
         self.annotationManager = AnnotationManager(self)
         self.actions = actions.Actions(self, self.iface.mainWindow(),
@@ -89,12 +111,35 @@ class Erosiebezwaren(object):
         # self.selectionManagerPoints.deactivate()
         # self.annotationManager.deactivate()
         self.actions.deactivate()
+        self.viewportDispatcher.unload()
         self.iface.removeDockWidget(self.parcelInfoDock)
 
         del(self.actions)
         del(self.toolbar)
         del(self.parcelInfoWidget)
         del(self.parcelInfoDock)
+        self.selectionManagerPolygons.unload()
+        self.selectionManagerPoints.unload()
         del(self.selectionManagerPolygons)
         del(self.selectionManagerPoints)
         del(self.annotationManager)
+
+        if self.producentnrIndex is not None:
+            self.producentnrIndex.unload()
+        del(self.producentnrIndex)
+        self.featureCache.clear()
+        del(self.featureCache)
+        self.fileIndex.clear()
+        del(self.fileIndex)
+        self.rasterBlockCache.clear()
+        del(self.rasterBlockCache)
+        self.minMaxPyramids.clear()
+        del(self.minMaxPyramids)
+        del(self.transformCache)
+        del(self.viewportDispatcher)
+
+        self.queryExecutor.stop()
+        del(self.queryExecutor)
+        qgsutils.connectionPool.closeAll()
+        self.utils.unload()
+        del(self.utils)
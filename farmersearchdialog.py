@@ -1,5 +1,9 @@
 # -*- coding: utf-8 -*-
-"""Module containing the FarmerSearchDialog and FarmerResultWidget classes."""
+"""Module containing the classes to search for a farmer.
+
+Contains the FarmerResultModel, FarmerResultWidget and FarmerSearchDialog
+classes.
+"""
 
 #  DOV Erosiebezwaren, QGis plugin to assess field erosion on tablets
 #  Copyright (C) 2015-2017  Roel Huybrechts
@@ -23,13 +27,296 @@ import PyQt4.QtGui as QtGui
 
 import re
 
+from ngramindex import ProducentnrIndex
 from parcellistdialog import ParcelListDialog
 from qgsutils import SpatialiteIterator
-from widgets import valuelabel
 
 from ui_farmersearchdialog import Ui_FarmerSearchDialog
 
 
+class FarmerResultModel(QtCore.QAbstractTableModel):
+    """Table model with the results of a search for a farmer.
+
+    Results are fetched page by page: the view asks for the next page when
+    the user scrolls to the end of the results.
+    """
+
+    HEADERS = ['Producentnr', 'Naam', 'Adres', 'Postcode', 'Gemeente']
+
+    def __init__(self, parent, fetchMoreCallback):
+        """Initialisation.
+
+        Parameters
+        ----------
+        parent : QtCore.QObject
+            Parent object of the model.
+        fetchMoreCallback : function
+            Function to call to fetch the next page of results. It is called
+            with the number of result rows fetched so far (including
+            duplicates that are not shown) and should call appendResults
+            once the results are available.
+
+        """
+        QtCore.QAbstractTableModel.__init__(self, parent)
+        self.fetchMoreCallback = fetchMoreCallback
+        self.results = []
+        self.resultSet = set()
+        # number of result rows fetched, before removing duplicates
+        self.fetched = 0
+        self.hasMore = False
+        self.fetching = False
+
+    def rowCount(self, parent=QtCore.QModelIndex()):
+        """Get the number of farmers in the model.
+
+        Parameters
+        ----------
+        parent : QtCore.QModelIndex, optional
+            The parent QModelIndex.
+
+        Returns
+        -------
+        int
+            The number of farmers in the model.
+
+        """
+        if parent.isValid():
+            return 0
+        return len(self.results)
+
+    def columnCount(self, parent=QtCore.QModelIndex()):
+        """Get the number of columns of the model.
+
+        Parameters
+        ----------
+        parent : QtCore.QModelIndex, optional
+            The parent QModelIndex.
+
+        Returns
+        -------
+        int
+            The number of columns of the model.
+
+        """
+        if parent.isValid():
+            return 0
+        return len(self.HEADERS)
+
+    def data(self, index, role=QtCore.Qt.DisplayRole):
+        """Get a specific detail of a farmer from the model.
+
+        Parameters
+        ----------
+        index : QtCore.QModelIndex
+            The model index locating the datavalue to get.
+        role : int, optional
+            Codelist value specifying which role is to use the data. Defaults
+            to Qt.DisplayRole.
+
+        Returns
+        -------
+        unicode or None
+            The value of the model at the requested location.
+
+        """
+        if role != QtCore.Qt.DisplayRole or not index.isValid() or \
+                index.row() >= len(self.results):
+            return None
+
+        value = self.results[index.row()][index.column()]
+        if value:
+            return unicode(value)
+        return None
+
+    def headerData(self, section, orientation, role=QtCore.Qt.DisplayRole):
+        """Get the header of a column.
+
+        Parameters
+        ----------
+        section : int
+            Index of the column or row.
+        orientation : QtCore.Qt.Orientation
+            Orientation of the header.
+        role : int, optional
+            Codelist value specifying which role is to use the data. Defaults
+            to Qt.DisplayRole.
+
+        Returns
+        -------
+        str or None
+            The header of the column.
+
+        """
+        if role == QtCore.Qt.DisplayRole and \
+                orientation == QtCore.Qt.Horizontal:
+            return self.HEADERS[section]
+        return None
+
+    def getResult(self, row):
+        """Get the details of the farmer at the given row.
+
+        Parameters
+        ----------
+        row : int
+            Row in the model.
+
+        Returns
+        -------
+        tuple
+            Details of the farmer, with producentnr_zo, naam, straat_met_nr,
+            postcode and gemeente.
+
+        """
+        return self.results[row]
+
+    def canFetchMore(self, parent=QtCore.QModelIndex()):
+        """Check whether there are more results available.
+
+        Parameters
+        ----------
+        parent : QtCore.QModelIndex, optional
+            The parent QModelIndex.
+
+        Returns
+        -------
+        boolean
+            `True` if there are more results to fetch, `False` otherwise.
+
+        """
+        return not parent.isValid() and self.hasMore and not self.fetching
+
+    def fetchMore(self, parent=QtCore.QModelIndex()):
+        """Start fetching the next page of results.
+
+        Parameters
+        ----------
+        parent : QtCore.QModelIndex, optional
+            The parent QModelIndex.
+
+        """
+        if self.canFetchMore(parent):
+            self.fetching = True
+            self.fetchMoreCallback(self.fetched)
+
+    def setResults(self, results, hasMore=False):
+        """Set the first page of results, reusing the rows already present.
+
+        Only the rows of farmers that are no longer in the result are removed,
+        and only the farmers that were not in the model yet are inserted at
+        their position in the results. If the order of the remaining rows
+        differs from the results the model is reset, so the rows are always
+        in the order of the results.
+
+        Parameters
+        ----------
+        results : list of tuple
+            Details of the farmers.
+        hasMore : boolean, optional
+            Whether more results can be fetched. Defaults to `False`.
+
+        """
+        self.fetching = False
+        self.fetched = len(results)
+        newResultSet = set(results)
+
+        row = len(self.results) - 1
+        while row >= 0:
+            if self.results[row] in newResultSet:
+                row -= 1
+                continue
+            last = row
+            while row >= 0 and self.results[row] not in newResultSet:
+                row -= 1
+            self.beginRemoveRows(QtCore.QModelIndex(), row + 1, last)
+            for farmer in self.results[row + 1:last + 1]:
+                self.resultSet.discard(farmer)
+            del(self.results[row + 1:last + 1])
+            self.endRemoveRows()
+
+        ordered = self._unique(results)
+        if [f for f in ordered if f in self.resultSet] != self.results:
+            self.beginResetModel()
+            self.results = ordered
+            self.resultSet = set(ordered)
+            self.hasMore = hasMore
+            self.endResetModel()
+            return
+
+        self.hasMore = hasMore
+        row = 0
+        while row < len(ordered):
+            if row < len(self.results) and self.results[row] == ordered[row]:
+                row += 1
+                continue
+            last = row
+            while last + 1 < len(ordered) and \
+                    ordered[last + 1] not in self.resultSet:
+                last += 1
+            self.beginInsertRows(QtCore.QModelIndex(), row, last)
+            self.results[row:row] = ordered[row:last + 1]
+            self.resultSet.update(ordered[row:last + 1])
+            self.endInsertRows()
+            row = last + 1
+
+    def _unique(self, results):
+        """Remove duplicate farmers from the results, keeping their order.
+
+        Parameters
+        ----------
+        results : list of tuple
+            Details of the farmers.
+
+        Returns
+        -------
+        list of tuple
+            Details of the farmers, every farmer only once.
+
+        """
+        seen = set()
+        unique = []
+        for farmer in results:
+            if farmer not in seen:
+                seen.add(farmer)
+                unique.append(farmer)
+        return unique
+
+    def appendResults(self, results, hasMore=False):
+        """Append a page of results to the model.
+
+        Parameters
+        ----------
+        results : list of tuple
+            Details of the farmers.
+        hasMore : boolean, optional
+            Whether more results can be fetched. Defaults to `False`.
+
+        """
+        self.fetching = False
+        self.fetched += len(results)
+        self.hasMore = hasMore
+        newResults = []
+        for farmer in results:
+            if farmer not in self.resultSet:
+                self.resultSet.add(farmer)
+                newResults.append(farmer)
+
+        if len(newResults) > 0:
+            self.beginInsertRows(QtCore.QModelIndex(), len(self.results),
+                                 len(self.results) + len(newResults) - 1)
+            self.results.extend(newResults)
+            self.endInsertRows()
+
+    def clear(self):
+        """Remove all results from the model."""
+        self.beginResetModel()
+        self.results = []
+        self.resultSet.clear()
+        self.fetched = 0
+        self.hasMore = False
+        self.fetching = False
+        self.endResetModel()
+
+
 class FarmerResultWidget(QtGui.QWidget):
     """A widget to display results of a search for a farmer."""
 
@@ -48,38 +335,76 @@ class FarmerResultWidget(QtGui.QWidget):
         self.main = self.farmerSearchDialog.main
         QtGui.QWidget.__init__(self, parent)
 
-        self.horMaxSizePolicy = QtGui.QSizePolicy()
-        self.horMaxSizePolicy.setHorizontalPolicy(QtGui.QSizePolicy.Maximum)
-        self.layout = QtGui.QGridLayout(self)
+        self.layout = QtGui.QVBoxLayout(self)
+        self.layout.setContentsMargins(0, 0, 0, 0)
         self.setLayout(self.layout)
 
-        self.layout.addWidget(QtGui.QLabel(
+        self.messageLabel = QtGui.QLabel(
             '<i>Zoek landbouwer op basis van naam of, indien u<br>enkel ' +
-            'cijfers invoert, op producentnummer.</i>'), 0, 0)
+            'cijfers invoert, op producentnummer.</i>', self)
+        self.messageLabel.setAlignment(QtCore.Qt.AlignLeft |
+                                       QtCore.Qt.AlignTop)
+        self.layout.addWidget(self.messageLabel)
+
+        self.model = FarmerResultModel(self, self.farmerSearchDialog.fetchMore)
+
+        self.view = QtGui.QTableView(self)
+        self.view.setModel(self.model)
+        self.view.setSelectionMode(QtGui.QAbstractItemView.NoSelection)
+        self.view.setEditTriggers(QtGui.QAbstractItemView.NoEditTriggers)
+        self.view.setWordWrap(False)
+        self.view.verticalHeader().hide()
+        self.view.horizontalHeader().setStretchLastSection(True)
+        self.view.hide()
+        self.layout.addWidget(self.view)
+
+        QtCore.QObject.connect(self.view,
+                               QtCore.SIGNAL('clicked(QModelIndex)'),
+                               self.resultClicked)
+
+    def _showResults(self):
+        """Show the result table, or a message if there are no results."""
+        if self.model.rowCount() > 0:
+            self.messageLabel.hide()
+            self.view.show()
+            self.view.resizeColumnsToContents()
+        else:
+            self.setNoResult(clear=False)
 
-        self.resultSet = set()
+    def setResults(self, result, hasMore=False):
+        """Show the farmers from the result, reusing the rows already shown.
+
+        Parameters
+        ----------
+        result : list of tuple
+            First page of results of the search query executed via
+            qgsutils.SpatialiteIterator.rawQuery
+        hasMore : boolean, optional
+            Whether more results can be fetched. Defaults to `False`.
 
-    def addFromQuery(self, result):
-        """Add all the farmers from the result.
+        """
+        self.model.setResults(result, hasMore)
+        self._showResults()
+
+    def appendResults(self, result, hasMore=False):
+        """Add the next page of farmers from the result.
 
         Parameters
         ----------
-        result : list of list
-            Result of the search query executed via
+        result : list of tuple
+            Next page of results of the search query executed via
             qgsutils.SpatialiteIterator.rawQuery
+        hasMore : boolean, optional
+            Whether more results can be fetched. Defaults to `False`.
 
         """
-        for farmer in result:
-            self.addResult(farmer)
-        if len(self.resultSet) < 1:
-            self.setNoResult()
+        self.model.appendResults(result, hasMore)
+        self._showResults()
 
     def clear(self):
         """Clear all previously added results."""
-        self.resultSet.clear()
-        for i in reversed(range(self.layout.count())):
-            self.layout.itemAt(i).widget().setParent(None)
-        QtCore.QCoreApplication.processEvents()
+        self.model.clear()
+        self.view.hide()
 
     def setNoResult(self, clear=True):
         """Display a message to inform the query had no results.
@@ -93,7 +418,22 @@ class FarmerResultWidget(QtGui.QWidget):
         """
         if clear:
             self.clear()
-        self.layout.addWidget(QtGui.QLabel('Geen resultaat'), 0, 0)
+        self.view.hide()
+        self.messageLabel.setText('Geen resultaat')
+        self.messageLabel.show()
+
+    def resultClicked(self, index):
+        """Open the parcel list of the farmer that was clicked.
+
+        Parameters
+        ----------
+        index : QtCore.QModelIndex
+            Index of the clicked cell.
+
+        """
+        if index.isValid():
+            farmer = self.model.getResult(index.row())
+            self.showParcelList(farmer[1], farmer[0])
 
     def showParcelList(self, naam, producentnr_zo):
         """Open the parcellist showing the parcels of a specific farmer.
@@ -112,68 +452,26 @@ class FarmerResultWidget(QtGui.QWidget):
             specific farmer.
 
         """
-        def enableWidgets():
-            for i in reversed(range(self.layout.count())):
-                self.layout.itemAt(i).widget().setEnabled(True)
-
         if not self.main.parcelInfoWidget:
             return
 
-        for i in reversed(range(self.layout.count())):
-            self.layout.itemAt(i).widget().setEnabled(False)
+        self.view.setEnabled(False)
 
         QtCore.QCoreApplication.processEvents()
         d = ParcelListDialog(self.main.parcelInfoWidget)
         QtCore.QObject.connect(d, QtCore.SIGNAL('finished(int)'),
-                               enableWidgets)
+                               lambda x: self.view.setEnabled(True))
         d.populate(self.farmerSearchDialog.onlyObjections, naam,
                    producentnr_zo)
         d.show()
 
-    def addResult(self, farmer):
-        """Add a farmer the the result.
-
-        Adds a new row for the farmer, including a button to open the parcel
-        list, their producentnr_zo, naam, postcode and gemeente.
-
-        Parameters
-        ----------
-        farmer : list
-            A list of details about the farmer, with producentnr_zo, naam,
-            postcode and gemeente.
-
-        """
-        if farmer not in self.resultSet:
-            self.resultSet.add(farmer)
-            row = self.layout.rowCount()
-
-            btn = QtGui.QPushButton(str(farmer[0]), self)
-            QtCore.QObject.connect(
-                btn, QtCore.SIGNAL('clicked(bool)'),
-                lambda: self.showParcelList(farmer[1], farmer[0]))
-            self.layout.addWidget(btn, row, 0)
-
-            lb0 = valuelabel.ValueLabel(self)
-            lb0.setText(farmer[1])
-            self.layout.addWidget(lb0, row, 1)
-
-            lb1 = valuelabel.ValueLabel(self)
-            lb1.setText(farmer[2])
-            self.layout.addWidget(lb1, row, 2)
-
-            lb2 = valuelabel.ValueLabel(self)
-            lb2.setText(farmer[3])
-            lb2.setSizePolicy(self.horMaxSizePolicy)
-            self.layout.addWidget(lb2, row, 3)
-
-            lb3 = valuelabel.ValueLabel(self)
-            lb3.setText(farmer[4])
-            self.layout.addWidget(lb3, row, 4)
-
 
 class FarmerSearchDialog(QtGui.QDialog, Ui_FarmerSearchDialog):
     """Class describing the dialog to search for a farmer."""
 
+    # Number of results to fetch at once.
+    PAGE_SIZE = 500
+
     def __init__(self, main):
         """Initialise the dialog, without showing it yet.
 
@@ -186,6 +484,7 @@ class FarmerSearchDialog(QtGui.QDialog, Ui_FarmerSearchDialog):
         self.main = main
         self.reNumber = re.compile(r'^[0-9\.-]+$')
         self.reProducentnr = re.compile(r'^[^1-9]*([1-9]+.*)$')
+        self.reWordEnd = re.compile(r'\w$', re.U)
         QtGui.QDialog.__init__(self, self.main.iface.mainWindow())
         self.setupUi(self)
 
@@ -193,59 +492,285 @@ class FarmerSearchDialog(QtGui.QDialog, Ui_FarmerSearchDialog):
                               'Alle landbouwers': 0}
         self.onlyObjections = None
 
-        self.farmerResultWidget = FarmerResultWidget(self.scrollAreaContents,
-                                                     self)
-        self.scrollAreaLayout.insertWidget(0, self.farmerResultWidget)
+        self.farmerResultWidget = FarmerResultWidget(self, self)
+        self.resultLayout.addWidget(self.farmerResultWidget)
+
+        self.searchTicket = None
+        self.searchStatement = None
+        self.searchRowids = None
+        self.fetchMoreTicket = None
+
+        self.searchTimer = QtCore.QTimer(self)
+        self.searchTimer.setSingleShot(True)
+        self.searchTimer.setInterval(
+            self.main.settings.getValue('search/debounce'))
 
         QtCore.QObject.connect(self.btn_search, QtCore.SIGNAL('clicked(bool)'),
                                self.search)
+        QtCore.QObject.connect(self.ldt_searchfield,
+                               QtCore.SIGNAL('textChanged(QString)'),
+                               self.scheduleSearch)
+        QtCore.QObject.connect(self.cmb_searchType,
+                               QtCore.SIGNAL('currentIndexChanged(int)'),
+                               self.scheduleSearch)
+        QtCore.QObject.connect(self.searchTimer, QtCore.SIGNAL('timeout()'),
+                               self.search)
+        QtCore.QObject.connect(
+            self.main.queryExecutor,
+            QtCore.SIGNAL('resultsReady(int, PyQt_PyObject)'),
+            self.searchFinished)
+        QtCore.QObject.connect(
+            self.main.queryExecutor,
+            QtCore.SIGNAL('queryFailed(int, QString)'),
+            self.searchFailed)
+        QtCore.QObject.connect(self, QtCore.SIGNAL('finished(int)'),
+                               self.exit)
 
     def _getRawProducentnr(self, string):
         return str(self.reProducentnr.match(
             string).group(1)).translate(None, '.-')
 
+    def _getProducentnrIndex(self):
+        """Get the index of producer numbers for the current layer.
+
+        Starts loading the index in the background if it is not available
+        yet, or if it is outdated.
+
+        Returns
+        -------
+        ngramindex.ProducentnrIndex or None
+            The index, or `None` if it is not ready to be searched yet.
+
+        """
+        database = SpatialiteIterator(self.layer).ds.database()
+        index = self.main.producentnrIndex
+        if index is None or index.database != database:
+            if index is not None:
+                index.unload()
+            index = ProducentnrIndex(database)
+            self.main.producentnrIndex = index
+
+        index.watchLayer(self.layer)
+
+        if not index.isReady():
+            index.load(self.main.queryExecutor)
+            return None
+        return index
+
+    def _getMatchExpression(self, string):
+        """Get the full text search expression for the given search text.
+
+        Search for words starting with the last word of the search text, so
+        results are found while the user is still typing.
+
+        Parameters
+        ----------
+        string : str
+            Search text entered by the user.
+
+        Returns
+        -------
+        str
+            Expression to use with MATCH in the full text search.
+
+        """
+        if self.reWordEnd.search(string):
+            return string + '*'
+        return string
+
+    def scheduleSearch(self, *args):
+        """Search after the user stopped typing for a short while.
+
+        Restarts the debounce timer on every change of the search criteria.
+
+        Parameters
+        ----------
+        *args : list
+            Catchall parameter. All parameters are ignored. This way we make
+            sure the function can be called with any (number of) arguments.
+
+        """
+        self.searchTimer.start()
+
     def search(self):
         """Search for a farmer.
 
-        Get the search query from the textedit, perform search in the database
-        and populate the result widget with the results.
+        Get the search query from the textedit and start the search in the
+        database in the background. Called when the user pressed the search
+        button or after the user stopped typing for a short while.
+
+        The result widget is updated with the results in searchFinished, a
+        newer search cancels the running one.
         """
-        self.btn_search.setEnabled(False)
-        self.farmerResultWidget.clear()
-        QtCore.QCoreApplication.processEvents()
-        self.btn_search.repaint()
+        self.searchTimer.stop()
 
-        searchText = self.ldt_searchfield.text()
+        searchText = self.ldt_searchfield.text().strip()
         if not searchText:
-            self.btn_search.setEnabled(True)
+            self._cancelSearch()
             self.farmerResultWidget.setNoResult()
             return
 
         self.layer = self.main.utils.getLayerByName(
             self.main.settings.getValue('layers/bezwaren'))
         if not self.layer:
-            self.btn_search.setEnabled(True)
+            self._cancelSearch()
+            self.farmerResultWidget.setNoResult()
+            return
+
+        if self.reNumber.match(searchText) and \
+                not self.reProducentnr.match(searchText):
+            # only leading zeros or separators typed so far
+            self._cancelSearch()
             self.farmerResultWidget.setNoResult()
             return
 
         self.onlyObjections = self.withObjection[
             self.cmb_searchType.currentText()]
+        self.searchRowids = None
         if self.reNumber.match(searchText):
+            index = self._getProducentnrIndex()
+            if index:
+                self.searchRowids = index.search(
+                    self._getRawProducentnr(searchText), self.onlyObjections)
+            # normalised like the index, so the results are the same
+            # before and after the index is ready
             stmt = ["SELECT producentnr_zo, naam, straat_met_nr, postcode, " +
                     "gemeente FROM fts_landbouwers WHERE bezwaren = ? AND " +
-                    "producentnr_zo like ? LIMIT 500",
+                    "replace(replace(producentnr_zo, '.', ''), '-', '') " +
+                    "like ?",
                     [self.onlyObjections,
                      '%%%s%%' % self._getRawProducentnr(searchText)]]
         else:
             stmt = ["SELECT producentnr_zo, naam, straat_met_nr, postcode, " +
                     "gemeente FROM fts_landbouwers WHERE bezwaren = ? AND " +
-                    "naam MATCH ? LIMIT 500",
-                    [self.onlyObjections, searchText]]
+                    "naam MATCH ?",
+                    [self.onlyObjections,
+                     self._getMatchExpression(searchText)]]
+
+        self.searchStatement = stmt
+        self.fetchMoreTicket = None
+        self.searchTicket = self._queryPage(0)
+        if self.searchTicket is None:
+            self._cancelSearch()
+            self.farmerResultWidget.setNoResult()
+
+    def _queryPage(self, offset):
+        """Start the query for a page of results of the current search.
+
+        When the producer number index was used, get the farmers of the page
+        by their rowid. Otherwise run the search statement for the page.
+        Both are ordered by rowid, so the pages are stable and the order is
+        the same with and without the index.
+
+        Parameters
+        ----------
+        offset : int
+            Number of results to skip.
+
+        Returns
+        -------
+        int or None
+            Ticket of the query, or `None` if there are no more results.
 
+        """
         s = SpatialiteIterator(self.layer)
-        self.farmerResultWidget.addFromQuery(s.rawQuery(stmt[0], stmt[1]))
+        if self.searchRowids is not None:
+            rowids = self.searchRowids[offset:offset+self.PAGE_SIZE]
+            if len(rowids) < 1:
+                return None
+            return s.rawQueryAsync(
+                self.main.queryExecutor,
+                "SELECT producentnr_zo, naam, straat_met_nr, postcode, " +
+                "gemeente FROM fts_landbouwers WHERE rowid IN (%s) " %
+                ', '.join(['?'] * len(rowids)) + "ORDER BY rowid", rowids,
+                group=id(self))
+
+        return s.rawQueryAsync(
+            self.main.queryExecutor,
+            self.searchStatement[0] + " ORDER BY rowid LIMIT ? OFFSET ?",
+            self.searchStatement[1] + [self.PAGE_SIZE, offset],
+            group=id(self))
+
+    def fetchMore(self, offset):
+        """Start fetching the next page of results of the current search.
+
+        Called by the result model when the user scrolls to the end of the
+        results.
 
-        if len(self.farmerResultWidget.resultSet) < 1:
-            self.farmerResultWidget.setNoResult()
+        Parameters
+        ----------
+        offset : int
+            Number of result rows already fetched.
+
+        """
+        if self.searchStatement is None or self.searchTicket is not None:
+            self.farmerResultWidget.appendResults([])
+            return
+        self.fetchMoreTicket = self._queryPage(offset)
+        if self.fetchMoreTicket is None:
+            self.farmerResultWidget.appendResults([])
+
+    def searchFinished(self, ticket, results):
+        """Update the result widget with the results of the search.
+
+        Listener for the resultsReady signal of the query executor.
+
+        Parameters
+        ----------
+        ticket : int
+            Ticket of the finished query.
+        results : list of tuple
+            Results of the query.
+
+        """
+        hasMore = len(results) >= self.PAGE_SIZE
+        if ticket == self.searchTicket:
+            self.searchTicket = None
+            self.farmerResultWidget.setResults(results, hasMore)
+        elif ticket == self.fetchMoreTicket:
+            self.fetchMoreTicket = None
+            self.farmerResultWidget.appendResults(results, hasMore)
 
-        self.btn_search.setEnabled(True)
+    def searchFailed(self, ticket, message):
+        """Show that there are no results when the search failed.
+
+        Listener for the queryFailed signal of the query executor.
+
+        Parameters
+        ----------
+        ticket : int
+            Ticket of the failed query.
+        message : str
+            Error message of the query.
+
+        """
+        if ticket == self.searchTicket:
+            self.searchTicket = None
+            self.farmerResultWidget.setNoResult()
+        elif ticket == self.fetchMoreTicket:
+            self.fetchMoreTicket = None
+            self.farmerResultWidget.appendResults([])
+
+    def _cancelSearch(self):
+        """Cancel the pending or running search, if any."""
+        self.searchTimer.stop()
+        self.main.queryExecutor.cancel(id(self))
+        self.searchTicket = None
+        self.fetchMoreTicket = None
+        self.searchStatement = None
+        self.searchRowids = None
+
+    def exit(self):
+        """Cancel the running search and stop listening to the executor.
+
+        Called upon closing the dialog.
+        """
+        self._cancelSearch()
+        QtCore.QObject.disconnect(
+            self.main.queryExecutor,
+            QtCore.SIGNAL('resultsReady(int, PyQt_PyObject)'),
+            self.searchFinished)
+        QtCore.QObject.disconnect(
+            self.main.queryExecutor,
+            QtCore.SIGNAL('queryFailed(int, QString)'),
+            self.searchFailed)
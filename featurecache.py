@@ -0,0 +1,386 @@
+# -*- coding: utf-8 -*-
+"""Module for an in-memory cache of features.
+
+Contains the FeatureCache class.
+"""
+
+#  DOV Erosiebezwaren, QGis plugin to assess field erosion on tablets
+#  Copyright (C) 2015-2017  Roel Huybrechts
+#
+#  This program is free software; you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation; either version 2 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License along
+#  with this program; if not, write to the Free Software Foundation, Inc.,
+#  51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+
+import PyQt4.QtCore as QtCore
+import qgis.core as QGisCore
+
+from collections import OrderedDict
+
+from qgsutils import SpatialiteIterator
+from qgsutils import getFeaturesByFids
+
+
+class FeatureCache(QtCore.QObject):
+    """Least recently used cache of complete features, by layer and fid.
+
+    Features can also be looked up by their 'uniek_id' attribute. The total
+    (estimated) size of the cached features is kept below the memory budget
+    from the setting 'cache/featureMemory', least recently used features are
+    dropped first.
+
+    Features are copied when they enter and leave the cache, so callers are
+    free to change the features they get.
+
+    Entries are invalidated explicitly when a feature has been saved and for
+    the whole layer when editing of a layer stops.
+    """
+
+    def __init__(self, main):
+        """Initialisation.
+
+        Parameters
+        ----------
+        main : erosiebezwaren.Erosiebezwaren
+            Instance of main class.
+
+        """
+        QtCore.QObject.__init__(self)
+        self.main = main
+        self.maxSize = self.main.settings.getValue('cache/featureMemory')
+
+        self.features = OrderedDict()
+        self.uniekIds = {}
+        self.queries = {}
+        self.layers = {}
+        self.size = 0
+
+    def _watchLayer(self, layer):
+        """Invalidate the cached features of the layer when editing stops.
+
+        Parameters
+        ----------
+        layer : QGisCore.QgsVectorLayer
+            Layer to watch.
+
+        """
+        if layer.id() in self.layers:
+            return
+
+        layerId = layer.id()
+        self.layers[layerId] = layer
+        QtCore.QObject.connect(layer, QtCore.SIGNAL('editingStopped()'),
+                               lambda: self._invalidateLayerId(layerId))
+        QtCore.QObject.connect(layer, QtCore.SIGNAL('layerDeleted()'),
+                               lambda: self._forgetLayer(layerId))
+
+    def _forgetLayer(self, layerId):
+        """Remove everything about the deleted layer from the cache.
+
+        Parameters
+        ----------
+        layerId : str
+            Id of the layer.
+
+        """
+        self._invalidateLayerId(layerId)
+        if layerId in self.layers:
+            del(self.layers[layerId])
+
+    def _estimateSize(self, feature):
+        """Estimate the memory used by the feature.
+
+        Parameters
+        ----------
+        feature : QGisCore.QgsFeature
+            Feature to estimate the size of.
+
+        Returns
+        -------
+        int
+            Estimated size in bytes.
+
+        """
+        size = 64
+        if feature.geometry():
+            size += feature.geometry().wkbSize()
+        for value in feature.attributes():
+            size += 16
+            if isinstance(value, basestring):
+                size += 2 * len(value)
+        return size
+
+    def _remove(self, key):
+        """Remove the entry with the given key from the cache.
+
+        Parameters
+        ----------
+        key : tuple
+            Tuple of the layer id and the fid of the feature.
+
+        """
+        feature, size = self.features.pop(key)
+        self.size -= size
+
+        uniekKey = (key[0], self._getUniekId(feature))
+        if self.uniekIds.get(uniekKey, None) == key[1]:
+            del(self.uniekIds[uniekKey])
+
+    def _getUniekId(self, feature):
+        """Get the 'uniek_id' attribute of the feature, if it has one.
+
+        Parameters
+        ----------
+        feature : QGisCore.QgsFeature
+            Feature to get the attribute of.
+
+        Returns
+        -------
+        value or None
+            The value of the 'uniek_id' attribute, or `None` if the feature
+            does not have this attribute.
+
+        """
+        if feature.fields().indexFromName('uniek_id') < 0:
+            return None
+        return feature.attribute('uniek_id')
+
+    def addFeature(self, layer, feature):
+        """Add a complete feature of the layer to the cache.
+
+        Parameters
+        ----------
+        layer : QGisCore.QgsVectorLayer
+            Layer of the feature.
+        feature : QGisCore.QgsFeature
+            Feature to add, including its geometry and all its attributes.
+
+        """
+        self._watchLayer(layer)
+        key = (layer.id(), feature.id())
+        if key in self.features:
+            self._remove(key)
+
+        size = self._estimateSize(feature)
+        if size > self.maxSize:
+            return
+
+        self.features[key] = (QGisCore.QgsFeature(feature), size)
+        self.size += size
+
+        uniekId = self._getUniekId(feature)
+        if uniekId is not None:
+            self.uniekIds[(layer.id(), uniekId)] = feature.id()
+
+        while self.size > self.maxSize:
+            self._remove(self.features.iterkeys().next())
+
+    def _getCached(self, layer, fid):
+        """Get a copy of the cached feature, marking it as recently used.
+
+        Parameters
+        ----------
+        layer : QGisCore.QgsVectorLayer
+            Layer of the feature.
+        fid : int
+            Feature id of the feature.
+
+        Returns
+        -------
+        QGisCore.QgsFeature or None
+            Copy of the cached feature, or `None` if it is not in the cache.
+
+        """
+        key = (layer.id(), fid)
+        entry = self.features.pop(key, None)
+        if entry is None:
+            return None
+        self.features[key] = entry
+        return QGisCore.QgsFeature(entry[0])
+
+    def getFeature(self, layer, fid):
+        """Get the feature with the given fid.
+
+        Parameters
+        ----------
+        layer : QGisCore.QgsVectorLayer
+            Layer of the feature.
+        fid : int
+            Feature id of the feature.
+
+        Returns
+        -------
+        QGisCore.QgsFeature or None
+            The feature, or `None` if the layer has no feature with this fid.
+
+        """
+        features = self.getFeatures(layer, [fid])
+        if len(features) > 0:
+            return features[0]
+
+    def getFeatures(self, layer, fids):
+        """Get the features with the given fids.
+
+        Fetch the features missing from the cache from the layer in as few
+        requests as possible.
+
+        Parameters
+        ----------
+        layer : QGisCore.QgsVectorLayer
+            Layer of the features.
+        fids : list of int
+            Feature ids of the features.
+
+        Returns
+        -------
+        list of QGisCore.QgsFeature
+            The features in the order of the given fids, leaving out fids
+            that are not available in the layer.
+
+        """
+        result = {}
+        missing = []
+        for fid in fids:
+            feature = self._getCached(layer, fid)
+            if feature is not None:
+                result[fid] = feature
+            else:
+                missing.append(fid)
+
+        if len(missing) > 0:
+            for feature in getFeaturesByFids(layer, missing):
+                self.addFeature(layer, feature)
+                result[feature.id()] = QGisCore.QgsFeature(feature)
+
+        return [result[fid] for fid in fids if fid in result]
+
+    def getFeatureByUniekId(self, layer, uniekId):
+        """Get the feature with the given value of the 'uniek_id' attribute.
+
+        Parameters
+        ----------
+        layer : QGisCore.QgsVectorLayer
+            Layer of the feature.
+        uniekId : str
+            Value of the 'uniek_id' attribute of the feature.
+
+        Returns
+        -------
+        QGisCore.QgsFeature or None
+            The feature, or `None` if the layer has no feature with this
+            'uniek_id'.
+
+        """
+        fid = self.uniekIds.get((layer.id(), uniekId), None)
+        if fid is not None:
+            feature = self._getCached(layer, fid)
+            if feature is not None:
+                return feature
+
+        fts = self.queryWhere(layer, [('uniek_id', '=', uniekId)])
+        if len(fts) > 0:
+            return fts[0]
+
+    def queryWhere(self, layer, where):
+        """Get the features of a Spatialite layer matching the conditions.
+
+        The fids of the matching features are remembered until features of
+        the layer are invalidated, so repeated queries only need the cache.
+
+        Parameters
+        ----------
+        layer : QGisCore.QgsVectorLayer
+            Spatialite layer to query.
+        where : list of tuple
+            Conditions as accepted by qgsutils.SpatialiteIterator.queryWhere.
+
+        Returns
+        -------
+        list of QGisCore.QgsFeature
+            The matching features.
+
+        """
+        key = (layer.id(), repr(where))
+        if key in self.queries:
+            fids = self.queries[key]
+            features = self.getFeatures(layer, fids)
+            if len(features) == len(fids):
+                return features
+
+        self._watchLayer(layer)
+        features = SpatialiteIterator(layer).queryWhere(where)
+        for feature in features:
+            self.addFeature(layer, feature)
+        self.queries[key] = [f.id() for f in features]
+        return features
+
+    def invalidate(self, layer, fid):
+        """Remove the feature with the given fid from the cache.
+
+        Also forget the results of the queries of the layer, since these
+        might have changed too.
+
+        Parameters
+        ----------
+        layer : QGisCore.QgsVectorLayer
+            Layer of the feature.
+        fid : int
+            Feature id of the feature.
+
+        """
+        key = (layer.id(), fid)
+        if key in self.features:
+            self._remove(key)
+        self._invalidateQueries(layer.id())
+
+    def invalidateLayer(self, layer):
+        """Remove all features of the layer from the cache.
+
+        Parameters
+        ----------
+        layer : QGisCore.QgsVectorLayer
+            Layer of the features.
+
+        """
+        self._invalidateLayerId(layer.id())
+
+    def _invalidateLayerId(self, layerId):
+        """Remove all features of the layer with the given id from the cache.
+
+        Parameters
+        ----------
+        layerId : str
+            Id of the layer.
+
+        """
+        for key in [k for k in self.features if k[0] == layerId]:
+            self._remove(key)
+        self._invalidateQueries(layerId)
+
+    def _invalidateQueries(self, layerId):
+        """Forget the results of the queries of the layer.
+
+        Parameters
+        ----------
+        layerId : str
+            Id of the layer.
+
+        """
+        for key in [k for k in self.queries if k[0] == layerId]:
+            del(self.queries[key])
+
+    def clear(self):
+        """Remove all features from the cache."""
+        self.features.clear()
+        self.uniekIds.clear()
+        self.queries.clear()
+        self.size = 0
@@ -0,0 +1,272 @@
+# -*- coding: utf-8 -*-
+"""Module for in-memory indexes of the contents of directories.
+
+Contains the DirectoryIndex and FileIndex classes.
+"""
+
+#  DOV Erosiebezwaren, QGis plugin to assess field erosion on tablets
+#  Copyright (C) 2015-2017  Roel Huybrechts
+#
+#  This program is free software; you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation; either version 2 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License along
+#  with this program; if not, write to the Free Software Foundation, Inc.,
+#  51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+
+import PyQt4.QtCore as QtCore
+
+import os
+import threading
+
+
+def _listDirectory(path):
+    """List the entries of the given directory.
+
+    Parameters
+    ----------
+    path : str
+        Path of the directory.
+
+    Returns
+    -------
+    list of str or None
+        Names of the entries of the directory, or `None` if the directory does
+        not exist.
+
+    """
+    try:
+        return os.listdir(path)
+    except OSError:
+        return None
+
+
+class DirectoryIndex(QtCore.QObject):
+    """Index of the entries of the subdirectories of a root directory.
+
+    The index of the subdirectories of the root is built in the background.
+    Subdirectories are listed when they are first looked up, at which point
+    they are watched too. The index is kept up to date using a
+    QFileSystemWatcher on the root directory and on the subdirectories that
+    have been looked up.
+    """
+
+    def __init__(self, root):
+        """Initialisation.
+
+        Parameters
+        ----------
+        root : str
+            Path of the root directory.
+
+        """
+        QtCore.QObject.__init__(self)
+        self.root = os.path.normpath(root)
+        self.entries = None
+        self.thread = None
+        # incremented by stop(), builds of an older generation are discarded
+        self.generation = 0
+
+        self.watcher = QtCore.QFileSystemWatcher(self)
+        QtCore.QObject.connect(self.watcher,
+                               QtCore.SIGNAL('directoryChanged(QString)'),
+                               self.directoryChanged)
+
+    def start(self):
+        """Start building the index in a background thread.
+
+        The thread is a daemon thread, so it does not keep QGis from exiting
+        while it is listing a slow (network) directory.
+        """
+        def build(index, generation):
+            entries = {}
+            for name in _listDirectory(index.root) or []:
+                if index.generation != generation:
+                    return
+                if os.path.isdir(os.path.join(index.root, name)):
+                    # list lazily, when it is watched as well
+                    entries[os.path.normcase(name)] = None
+            if index.generation == generation:
+                index.entries = entries
+
+        if os.path.isdir(self.root):
+            self.watcher.addPath(self.root)
+        self.thread = threading.Thread(target=build,
+                                       args=(self, self.generation))
+        self.thread.daemon = True
+        self.thread.start()
+
+    def stop(self):
+        """Stop building and watching, discarding the index."""
+        self.generation += 1
+        self.entries = None
+        directories = self.watcher.directories()
+        if len(directories) > 0:
+            self.watcher.removePaths(directories)
+
+    def listDirectory(self, name):
+        """Get the entries of the subdirectory with the given name.
+
+        Falls back to listing the directory if the index is not built yet.
+
+        Parameters
+        ----------
+        name : str
+            Name of the subdirectory of the root directory.
+
+        Returns
+        -------
+        list of str or None
+            Names of the entries of the subdirectory, or `None` if the
+            subdirectory does not exist.
+
+        """
+        path = os.path.join(self.root, name)
+        entries = self.entries
+        if entries is None:
+            return _listDirectory(path)
+
+        key = os.path.normcase(name)
+        if key not in entries:
+            return None
+        # watch before listing, so no change in between is missed
+        if path not in self.watcher.directories():
+            self.watcher.addPath(path)
+        if entries[key] is None:
+            entries[key] = _listDirectory(path)
+        return entries[key]
+
+    def refresh(self, name):
+        """Update the entries of the subdirectory with the given name.
+
+        Parameters
+        ----------
+        name : str
+            Name of the subdirectory of the root directory.
+
+        """
+        if self.entries is None:
+            return
+
+        key = os.path.normcase(name)
+        path = os.path.join(self.root, name)
+        entries = _listDirectory(path)
+        if entries is not None and os.path.isdir(path):
+            self.entries[key] = entries
+        elif key in self.entries:
+            del(self.entries[key])
+
+    def directoryChanged(self, path):
+        """Update the index after a change to a watched directory.
+
+        Listener for the directoryChanged signal of the watcher.
+
+        Parameters
+        ----------
+        path : str
+            Path of the changed directory.
+
+        """
+        if self.entries is None:
+            return
+
+        path = os.path.normpath(path)
+        if path != self.root:
+            self.refresh(os.path.basename(path))
+            return
+
+        names = set()
+        for name in _listDirectory(self.root) or []:
+            if os.path.isdir(os.path.join(self.root, name)):
+                names.add(os.path.normcase(name))
+
+        for key in self.entries.keys():
+            if key not in names:
+                del(self.entries[key])
+        for key in names:
+            if key not in self.entries:
+                # list lazily
+                self.entries[key] = None
+
+
+class FileIndex(object):
+    """Collection of DirectoryIndexes, created when first needed."""
+
+    def __init__(self, main):
+        """Initialisation.
+
+        Parameters
+        ----------
+        main : erosiebezwaren.Erosiebezwaren
+            Instance of main class.
+
+        """
+        self.main = main
+        self.indexes = {}
+
+    def _getIndex(self, root):
+        """Get the index of the given root directory, create it if needed.
+
+        Parameters
+        ----------
+        root : str
+            Path of the root directory.
+
+        Returns
+        -------
+        DirectoryIndex
+            Index of the root directory.
+
+        """
+        root = os.path.normpath(root)
+        if root not in self.indexes:
+            self.indexes[root] = DirectoryIndex(root)
+            self.indexes[root].start()
+        return self.indexes[root]
+
+    def listDirectory(self, path):
+        """Get the entries of the directory with the given path.
+
+        Parameters
+        ----------
+        path : str
+            Path of the directory, the parent directory is used as root of the
+            index.
+
+        Returns
+        -------
+        list of str or None
+            Names of the entries of the directory, or `None` if the directory
+            does not exist.
+
+        """
+        path = os.path.normpath(path)
+        return self._getIndex(os.path.dirname(path)).listDirectory(
+            os.path.basename(path))
+
+    def refresh(self, path):
+        """Update the entries of the directory with the given path.
+
+        Parameters
+        ----------
+        path : str
+            Path of the directory.
+
+        """
+        path = os.path.normpath(path)
+        root = os.path.dirname(path)
+        if root in self.indexes:
+            self.indexes[root].refresh(os.path.basename(path))
+
+    def clear(self):
+        """Stop and remove all indexes."""
+        for index in self.indexes.values():
+            index.stop()
+        self.indexes = {}
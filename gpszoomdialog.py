@@ -97,17 +97,10 @@ class GpsZoomDialog(QtGui.QDialog, Ui_GpsZoomDialog):
         self.led_lonDecDeg.setValidator(RoundingDoubleValidator(
             self.led_lonDecDeg, -180.0, 180.0, 10))
 
-        self.transform_31370_to_4326 = QGisCore.QgsCoordinateTransform(
-            QGisCore.QgsCoordinateReferenceSystem(
-                31370, QGisCore.QgsCoordinateReferenceSystem.EpsgCrsId),
-            QGisCore.QgsCoordinateReferenceSystem(
-                4326, QGisCore.QgsCoordinateReferenceSystem.EpsgCrsId))
-
-        self.transform_4326_to_31370 = QGisCore.QgsCoordinateTransform(
-            QGisCore.QgsCoordinateReferenceSystem(
-                4326, QGisCore.QgsCoordinateReferenceSystem.EpsgCrsId),
-            QGisCore.QgsCoordinateReferenceSystem(
-                31370, QGisCore.QgsCoordinateReferenceSystem.EpsgCrsId))
+        self.transform_31370_to_4326 = self.main.transformCache.getTransform(
+            31370, 4326)
+        self.transform_4326_to_31370 = self.main.transformCache.getTransform(
+            4326, 31370)
 
         point = self.main.iface.mapCanvas().extent().center()
         self.point = self.transform_31370_to_4326.transform(point)
@@ -23,6 +23,8 @@ import PyQt4.QtCore as QtCore
 import PyQt4.QtGui as QtGui
 import qgis.core as QGisCore
 
+import numpy as np
+
 from ui_mapswitchdialog import Ui_MapSwitchDialog
 
 
@@ -63,46 +65,72 @@ class MapSwitchDialog(QtGui.QDialog, Ui_MapSwitchDialog):
                               'grasbuffers_efficientie_2017',
                               'grasbuffers_percelen_upstream_efficientie_2017'])
         self.activeDem = None
-
-        QtCore.QObject.connect(self.btn_routekaart,
-                               QtCore.SIGNAL('clicked(bool)'),
-                               self.toMapRoutekaart)
-        QtCore.QObject.connect(self.btn_orthofoto,
-                               QtCore.SIGNAL('clicked(bool)'),
-                               self.toMapOrthofoto)
-        QtCore.QObject.connect(self.btn_erosie2016,
-                               QtCore.SIGNAL('clicked(bool)'),
-                               self.toMapErosie2016)
-        QtCore.QObject.connect(self.btn_erosie2017,
-                               QtCore.SIGNAL('clicked(bool)'),
-                               self.toMapErosie2017)
-        QtCore.QObject.connect(self.btn_erosie2018,
-                               QtCore.SIGNAL('clicked(bool)'),
-                               self.toMapErosie2018)
-        QtCore.QObject.connect(self.btn_erosie2019,
-                               QtCore.SIGNAL('clicked(bool)'),
-                               self.toMapErosie2019)
-        QtCore.QObject.connect(self.btn_watererosie_30,
-                               QtCore.SIGNAL('clicked(bool)'),
-                               self.toMapWatererosie30)
-        QtCore.QObject.connect(self.btn_afstromingskaart,
-                               QtCore.SIGNAL('clicked(bool)'),
-                               self.toMapAfstromingskaart)
-        QtCore.QObject.connect(self.btn_dem_kul,
-                               QtCore.SIGNAL('clicked(bool)'),
-                               self.toMapDEMKul)
-        QtCore.QObject.connect(self.btn_dem_agiv,
-                               QtCore.SIGNAL('clicked(bool)'),
-                               self.toMapDEMAgiv)
-        QtCore.QObject.connect(self.btn_bodemkaart,
-                               QtCore.SIGNAL('clicked(bool)'),
-                               self.toMapBodemkaart)
-        QtCore.QObject.connect(self.btn_erosiebestrijding,
-                               QtCore.SIGNAL('clicked(bool)'),
-                               self.toMapErosiebestrijding)
-        QtCore.QObject.connect(self.btn_grasbuffers,
-                               QtCore.SIGNAL('clicked(bool)'),
-                               self.toMapGrasbuffers)
+        self.colorRange = None
+
+        # map views by the name of their button, every map view shows the
+        # layers or layergroups in 'enabledLayers' and hides the others of
+        # allLayers. Optionally it has a 'dem' to stretch the colours of and
+        # enables the 'pixelMeasure' action.
+        self.mapViews = {
+            'btn_routekaart': {
+                'label': 'Routekaart',
+                'enabledLayers': self.visibleBase},
+            'btn_orthofoto': {
+                'label': 'Orthofoto',
+                'enabledLayers': (self.visibleBase - set(
+                    ['Topokaart'])).union(['Orthofoto'])},
+            'btn_erosie2016': {
+                'label': 'Erosiekaart 2016',
+                'enabledLayers': self.visibleBase.union(
+                    ['2016 potentiele bodemerosie'])},
+            'btn_erosie2017': {
+                'label': 'Erosiekaart 2017',
+                'enabledLayers': self.visibleBase.union(
+                    ['2017 potentiele bodemerosie'])},
+            'btn_erosie2018': {
+                'label': 'Erosiekaart 2018',
+                'enabledLayers': self.visibleBase.union(
+                    ['2018 potentiele bodemerosie'])},
+            'btn_erosie2019': {
+                'label': 'Erosiekaart 2019',
+                'enabledLayers': self.visibleBase.union(
+                    ['2019 potentiele bodemerosie'])},
+            'btn_watererosie_30': {
+                'label': 'Watererosie 30',
+                'enabledLayers': self.visibleBase.union(['watererosie30']),
+                'pixelMeasure': True},
+            'btn_afstromingskaart': {
+                'label': 'Afstromingskaart',
+                'enabledLayers': (self.visibleBase - set(
+                    ['percelenkaart_table', 'Overzichtskaart'])).union(
+                        ['Afstromingskaart'])},
+            'btn_dem_kul': {
+                'label': 'DEM KULeuven',
+                'enabledLayers': self.visibleBase.union(['dem_kul']),
+                'dem': 'dem_kul'},
+            'btn_dem_agiv': {
+                'label': 'DEM AGIV',
+                'enabledLayers': self.visibleBase.union(['dem_agiv']),
+                'dem': 'dem_agiv'},
+            'btn_bodemkaart': {
+                'label': 'Bodemkaart',
+                'enabledLayers': (self.visibleBase - set(
+                    ['Topokaart'])).union(['Bodemkaart'])},
+            'btn_erosiebestrijding': {
+                'label': 'Erosiebestrijdingswerken',
+                'enabledLayers': self.visibleBase.union(
+                    ['Erosiebestrijdingswerken'])},
+            'btn_grasbuffers': {
+                'label': 'Grasbuffers',
+                'enabledLayers': self.visibleBase.union(
+                    ['grasbuffers_efficientie_2017',
+                     'grasbuffers_percelen_upstream_efficientie_2017'])}
+        }
+
+        for buttonName, mapView in self.mapViews.items():
+            QtCore.QObject.connect(getattr(self, buttonName),
+                                   QtCore.SIGNAL('clicked(bool)'),
+                                   lambda c, v=mapView: self.toMapView(v))
 
         self.populate()
 
@@ -127,53 +155,63 @@ class MapSwitchDialog(QtGui.QDialog, Ui_MapSwitchDialog):
         disable: list, optional
             Names of layers or layergroups to disable.
 
-        """
-        legendInterface = self.main.iface.legendInterface()
-
-        groups = legendInterface.groups()
-        for i in range(0, len(groups)):
-            if groups[i] in enable:
-                legendInterface.setGroupVisible(i, True)
-            if groups[i] in disable:
-                legendInterface.setGroupVisible(i, False)
+        Returns
+        -------
+        int
+            Number of layers and layergroups of which the visibility changed.
 
-        for l in legendInterface.layers():
-            if l.name() in enable:
-                legendInterface.setLayerVisible(l, True)
-            if l.name() in disable:
-                legendInterface.setLayerVisible(l, False)
+        """
+        return self.main.utils.toggleLayersGroups(enable, disable)
 
     def toMapView(self, mapView):
         """Switch to a certain map view.
 
+        Only the layers and layergroups of which the visibility differs from
+        the map view are changed, while the map canvas is frozen. The map
+        canvas is refreshed once afterwards.
+
         Parameters
         ----------
         mapView : dict
             Dictionary describing the map view to use, including:
-            'autoDisable' : boolean
-                Automatically disable the layers or layergroups that are not in
-                enabledLayers.
-            'enabledLayers' : list
-                Names of layers or layergroups to enable.
-            'disabledLayers' : list
-                Names of layers or layergroups to disable.
+            'enabledLayers' : set
+                Names of layers or layergroups to enable, the other layers and
+                layergroups of allLayers are disabled.
             'label' : str
                 Label to use on the MapSwitchButton to indicate this map view
                 is active.
+            'dem' : str, optional
+                Name of the DEM layer of which to update the colours to the
+                current extent.
+            'pixelMeasure' : boolean, optional
+                Enable the pixel measure action, defaults to `False`.
 
         """
-        QtCore.QObject.disconnect(
-            self.main.iface.mapCanvas(), QtCore.SIGNAL('extentsChanged()'),
-            self.updateRasterColors)
-
-        if mapView['autoDisable']:
-            mapView['disabledLayers'] = self.allLayers - mapView[
-                'enabledLayers']
-        self.toggleLayersGroups(enable=mapView['enabledLayers'],
-                                disable=mapView['disabledLayers'])
+        self.main.viewportDispatcher.removeListener(self.updateRasterColors)
+
+        mapCanvas = self.main.iface.mapCanvas()
+        mapCanvas.freeze(True)
+        try:
+            if mapView.get('dem', None):
+                self.activeDem = self.main.utils.getLayerByName(
+                    mapView['dem'])
+                self.updateRasterColors()
+
+            changed = self.toggleLayersGroups(
+                enable=mapView['enabledLayers'],
+                disable=self.allLayers - mapView['enabledLayers'])
+        finally:
+            mapCanvas.freeze(False)
+
+        if changed > 0 or mapView.get('dem', None):
+            mapCanvas.refresh()
+
+        if mapView.get('dem', None):
+            self.main.viewportDispatcher.addListener(self.updateRasterColors)
+
         self.action.setText(mapView['label'])
 
-        if mapView['label'] == 'Watererosie 30':
+        if mapView.get('pixelMeasure', False):
             self.main.actions.pixelMeasureAction.setRasterLayerActive(True)
         else:
             self.main.actions.pixelMeasureAction.setRasterLayerActive(False)
@@ -181,135 +219,35 @@ class MapSwitchDialog(QtGui.QDialog, Ui_MapSwitchDialog):
 
         self.accept()
 
-    def toMapRoutekaart(self):
-        """Switch to the map view 'Routekaart'."""
-        self.toMapView({
-            'enabledLayers': self.visibleBase,
-            'autoDisable': True,
-            'label': 'Routekaart'
-        })
-
-    def toMapOrthofoto(self):
-        """Switch to the map view 'Orthofoto'."""
-        self.toMapView({
-            'enabledLayers': (self.visibleBase - set(['Topokaart'])).union(
-                ['Orthofoto']),
-            'autoDisable': True,
-            'label': 'Orthofoto'
-        })
-
-    def toMapErosie2016(self):
-        """Switch to the map view 'Erosiekaart 2016'."""
-        self.toMapView({
-            'enabledLayers': self.visibleBase.union(
-                ['2016 potentiele bodemerosie']),
-            'autoDisable': True,
-            'label': 'Erosiekaart 2016'
-        })
-
-    def toMapErosie2017(self):
-        """Switch to the map view 'Erosiekaart 2017'."""
-        self.toMapView({
-            'enabledLayers': self.visibleBase.union(
-                ['2017 potentiele bodemerosie']),
-            'autoDisable': True,
-            'label': 'Erosiekaart 2017'
-        })
-
-    def toMapErosie2018(self):
-        """Switch to the map view 'Erosiekaart 2018'."""
-        self.toMapView({
-            'enabledLayers': self.visibleBase.union(
-                ['2018 potentiele bodemerosie']),
-            'autoDisable': True,
-            'label': 'Erosiekaart 2018'
-        })
-
-    def toMapErosie2019(self):
-        """Switch to the map view 'Erosiekaart 2019'."""
-        self.toMapView({
-            'enabledLayers': self.visibleBase.union(
-                ['2019 potentiele bodemerosie']),
-            'autoDisable': True,
-            'label': 'Erosiekaart 2019'
-        })
-
-    def toMapWatererosie30(self):
-        """Switch to the map view 'Watererosie 30'."""
-        self.toMapView({
-            'enabledLayers': self.visibleBase.union(
-                ['watererosie30']),
-            'autoDisable': True,
-            'label': 'Watererosie 30'
-        })
-
-    def toMapAfstromingskaart(self):
-        """Switch to the map view 'Afstromingskaart'."""
-        self.toMapView({
-            'enabledLayers': (self.visibleBase - set(
-                ['percelenkaart_table', 'Overzichtskaart'])).union(
-                    ['Afstromingskaart']),
-            'autoDisable': True,
-            'label': 'Afstromingskaart'
-        })
-
-    def toMapDEMKul(self):
-        """Switch to the map view 'DEM KULeuven'."""
-        self.activeDem = self.main.utils.getLayerByName('dem_kul')
-        self.updateRasterColors()
-
-        self.toMapView({
-            'enabledLayers': self.visibleBase.union(['dem_kul']),
-            'autoDisable': True,
-            'label': 'DEM KULeuven'
-        })
-
-        QtCore.QObject.connect(self.main.iface.mapCanvas(),
-                               QtCore.SIGNAL('extentsChanged()'),
-                               self.updateRasterColors)
-
-    def toMapDEMAgiv(self):
-        """Switch to the map view 'DEM AGIV'."""
-        self.activeDem = self.main.utils.getLayerByName('dem_agiv')
-        self.updateRasterColors()
-
-        self.toMapView({
-            'enabledLayers': self.visibleBase.union(['dem_agiv']),
-            'autoDisable': True,
-            'label': 'DEM AGIV'
-        })
-
-        QtCore.QObject.connect(self.main.iface.mapCanvas(),
-                               QtCore.SIGNAL('extentsChanged()'),
-                               self.updateRasterColors)
-
-    def toMapBodemkaart(self):
-        """Switch to the map view 'Bodemkaart'."""
-        self.toMapView({
-            'enabledLayers': (self.visibleBase - set(['Topokaart'])).union(
-                ['Bodemkaart']),
-            'autoDisable': True,
-            'label': 'Bodemkaart'
-        })
-
-    def toMapErosiebestrijding(self):
-        """Switch to the map view 'Erosiebestrijdingswerken'."""
-        self.toMapView({
-            'enabledLayers': self.visibleBase.union(
-                ['Erosiebestrijdingswerken']),
-            'autoDisable': True,
-            'label': 'Erosiebestrijdingswerken'
-        })
-
-    def toMapGrasbuffers(self):
-        """Switch to the map view 'Grasbuffers'."""
-        self.toMapView({
-            'enabledLayers': self.visibleBase.union(
-                ['grasbuffers_efficientie_2017',
-                 'grasbuffers_percelen_upstream_efficientie_2017']),
-            'autoDisable': True,
-            'label': 'Grasbuffers'
-        })
+    def _getOverviewMinMax(self, extent):
+        """Get the minimum and maximum value of the DEM from its overview.
+
+        Used while the MinMaxPyramid of the DEM is not available.
+
+        Parameters
+        ----------
+        extent : QGisCore.QgsRectangle
+            Extent to get the values of.
+
+        Returns
+        -------
+        tuple or None
+            Tuple of the minimum and maximum value, or `None` if there are
+            no values within the extent.
+
+        """
+        values = self.main.rasterBlockCache.getOverview(
+            self.activeDem, 1, extent)
+        if values is None:
+            return None
+
+        values = values[~np.isnan(values)]
+        provider = self.activeDem.dataProvider()
+        if provider.srcHasNoDataValue(1):
+            values = values[values != provider.srcNoDataValue(1)]
+        if len(values) < 1:
+            return None
+        return float(values.min()), float(values.max())
 
     def updateRasterColors(self):
         """Update the style of the currently active DEM.
@@ -317,20 +255,26 @@ class MapSwitchDialog(QtGui.QDialog, Ui_MapSwitchDialog):
         If the current map view show a DEM, this method is triggered when the
         map canvas is changed by zooming or panning. It updates the style of
         the DEM to the minimum and maximum value of the DEM in the extent of
-        the current map canvas.
+        the current map canvas, as found in its MinMaxPyramid. The renderer
+        is only replaced when these values changed.
 
         """
         if not self.activeDem:
             return
 
         currentExtent = self.main.iface.mapCanvas().extent()
-        bandStats = self.activeDem.dataProvider() \
-            .bandStatistics(1,
-                            QGisCore.QgsRasterBandStats.Max |
-                            QGisCore.QgsRasterBandStats.Min,
-                            currentExtent, 1000)
-        vmax = bandStats.maximumValue
-        vmin = bandStats.minimumValue
+        minMax = self.main.minMaxPyramids.getMinMax(self.activeDem,
+                                                    currentExtent)
+        if minMax is None:
+            minMax = self._getOverviewMinMax(currentExtent)
+        if minMax is None:
+            return
+
+        colorRange = (self.activeDem.id(), minMax)
+        if colorRange == self.colorRange:
+            return
+        self.colorRange = colorRange
+        vmin, vmax = minMax
 
         colorList = [QGisCore.QgsColorRampShader.ColorRampItem(
                          ((vmax-vmin)/4.0)*0+vmin, QtGui.QColor('#2b83ba')),
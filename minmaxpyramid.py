@@ -0,0 +1,324 @@
+# -*- coding: utf-8 -*-
+"""Module for precomputed minimum and maximum values of raster layers.
+
+Contains the MinMaxPyramid and MinMaxPyramidIndex classes.
+"""
+
+#  DOV Erosiebezwaren, QGis plugin to assess field erosion on tablets
+#  Copyright (C) 2015-2017  Roel Huybrechts
+#
+#  This program is free software; you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation; either version 2 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License along
+#  with this program; if not, write to the Free Software Foundation, Inc.,
+#  51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+
+import math
+import os
+import threading
+
+import numpy as np
+from osgeo import gdal
+
+
+def _reduceLevel(values, reduce):
+    """Combine every 2 by 2 tiles of a level into one tile of the next level.
+
+    Parameters
+    ----------
+    values : numpy.ndarray
+        Values of the tiles of the level, NaN for tiles without data.
+    reduce : numpy.ufunc
+        Function to combine the values with, numpy.fmin or numpy.fmax.
+
+    Returns
+    -------
+    numpy.ndarray
+        Values of the tiles of the next level.
+
+    """
+    rows, columns = values.shape
+    padded = np.empty((rows + rows % 2, columns + columns % 2))
+    padded.fill(np.nan)
+    padded[:rows, :columns] = values
+    return reduce(reduce(padded[0::2, 0::2], padded[1::2, 0::2]),
+                  reduce(padded[0::2, 1::2], padded[1::2, 1::2]))
+
+
+class MinMaxPyramid(object):
+    """Quadtree of the minimum and maximum values of the tiles of a raster.
+
+    Level 0 holds the minimum and maximum value of every tile of
+    `tileSize` by `tileSize` cells, every next level combines 2 by 2 tiles
+    of the previous level, up to a single tile for the whole raster.
+    """
+
+    def __init__(self, info, mins, maxs):
+        """Initialisation.
+
+        Parameters
+        ----------
+        info : sequence of float
+            Minimum x and maximum y coordinate of the raster, the width and
+            height of a cell, the number of columns and rows of the raster
+            and the size of the tiles of level 0 (in cells).
+        mins : list of numpy.ndarray
+            Minimum values of the tiles of every level.
+        maxs : list of numpy.ndarray
+            Maximum values of the tiles of every level.
+
+        """
+        (self.xMin, self.yMax, self.pixelSizeX, self.pixelSizeY, self.width,
+         self.height, self.tileSize) = info
+        self.tileSize = int(self.tileSize)
+        self.mins = mins
+        self.maxs = maxs
+
+    @classmethod
+    def build(cls, path, tileSize=16):
+        """Build the pyramid of the first band of a raster file.
+
+        The raster is read in strips of `tileSize` rows.
+
+        Parameters
+        ----------
+        path : str
+            Path of the raster file.
+        tileSize : int, optional
+            Size of the tiles of level 0 (in cells). Defaults to 16.
+
+        Returns
+        -------
+        MinMaxPyramid or None
+            The new pyramid, or `None` if the file could not be read.
+
+        """
+        dataset = gdal.Open(path)
+        if dataset is None:
+            return None
+
+        band = dataset.GetRasterBand(1)
+        noData = band.GetNoDataValue()
+        width = dataset.RasterXSize
+        height = dataset.RasterYSize
+        columns = int(math.ceil(width / float(tileSize)))
+        rows = int(math.ceil(height / float(tileSize)))
+
+        mins = np.empty((rows, columns))
+        maxs = np.empty((rows, columns))
+        strip = np.empty((tileSize, columns * tileSize))
+        for row in range(rows):
+            stripHeight = min(tileSize, height - row*tileSize)
+            values = band.ReadAsArray(0, row*tileSize, width,
+                                      stripHeight).astype(np.float64)
+            if noData is not None:
+                values[values == noData] = np.nan
+
+            strip.fill(np.nan)
+            strip[:stripHeight, :width] = values
+            tiles = strip.reshape(tileSize, columns, tileSize).transpose(
+                1, 0, 2).reshape(columns, tileSize * tileSize)
+            mins[row] = np.fmin.reduce(tiles, axis=1)
+            maxs[row] = np.fmax.reduce(tiles, axis=1)
+
+        geoTransform = dataset.GetGeoTransform()
+        info = (geoTransform[0], geoTransform[3], geoTransform[1],
+                abs(geoTransform[5]), width, height, tileSize)
+
+        mins = [mins]
+        maxs = [maxs]
+        while mins[-1].shape[0] > 1 or mins[-1].shape[1] > 1:
+            mins.append(_reduceLevel(mins[-1], np.fmin))
+            maxs.append(_reduceLevel(maxs[-1], np.fmax))
+        return cls(info, mins, maxs)
+
+    @classmethod
+    def load(cls, path):
+        """Load a pyramid saved with save().
+
+        Parameters
+        ----------
+        path : str
+            Path of the file.
+
+        Returns
+        -------
+        MinMaxPyramid
+            The loaded pyramid.
+
+        """
+        data = np.load(path)
+        levels = len([k for k in data.files if k.startswith('min')])
+        return cls(data['info'], [data['min%i' % i] for i in range(levels)],
+                   [data['max%i' % i] for i in range(levels)])
+
+    def save(self, path):
+        """Save the pyramid to a file.
+
+        Parameters
+        ----------
+        path : str
+            Path of the file, should end with '.npz'.
+
+        """
+        arrays = {'info': np.array([self.xMin, self.yMax, self.pixelSizeX,
+                                    self.pixelSizeY, self.width, self.height,
+                                    self.tileSize])}
+        for i in range(len(self.mins)):
+            arrays['min%i' % i] = self.mins[i]
+            arrays['max%i' % i] = self.maxs[i]
+        np.savez(path, **arrays)
+
+    def getMinMax(self, xMin, yMin, xMax, yMax, maxTiles=64):
+        """Get the minimum and maximum value within a rectangle.
+
+        Uses the finest level at which the rectangle covers at most
+        `maxTiles` tiles. Tiles partly within the rectangle are counted
+        completely, so the range can be slightly wider than the exact one.
+
+        Parameters
+        ----------
+        xMin : float
+            Minimum x coordinate of the rectangle.
+        yMin : float
+            Minimum y coordinate of the rectangle.
+        xMax : float
+            Maximum x coordinate of the rectangle.
+        yMax : float
+            Maximum y coordinate of the rectangle.
+        maxTiles : int, optional
+            Maximum number of tiles to combine. Defaults to 64.
+
+        Returns
+        -------
+        tuple or None
+            Tuple of the minimum and maximum value, or `None` if there are
+            no values within the rectangle.
+
+        """
+        for level in range(len(self.mins)):
+            rows, columns = self.mins[level].shape
+            sizeX = self.tileSize * 2**level * self.pixelSizeX
+            sizeY = self.tileSize * 2**level * self.pixelSizeY
+
+            c0 = max(0, int(math.floor((xMin - self.xMin) / sizeX)))
+            c1 = min(columns, int(math.floor((xMax - self.xMin) / sizeX)) + 1)
+            r0 = max(0, int(math.floor((self.yMax - yMax) / sizeY)))
+            r1 = min(rows, int(math.floor((self.yMax - yMin) / sizeY)) + 1)
+            if c1 <= c0 or r1 <= r0:
+                return None
+
+            if (c1-c0) * (r1-r0) <= maxTiles or level == len(self.mins)-1:
+                vmin = np.fmin.reduce(self.mins[level][r0:r1, c0:c1], None)
+                vmax = np.fmax.reduce(self.maxs[level][r0:r1, c0:c1], None)
+                if np.isnan(vmin) or np.isnan(vmax):
+                    return None
+                return float(vmin), float(vmax)
+
+
+class MinMaxPyramidIndex(object):
+    """Collection of MinMaxPyramids of raster layers.
+
+    The pyramid of a raster file is stored next to it as
+    '<raster>.minmax.npz'. When it is missing or older than the raster, it
+    is built in a background thread and saved.
+    """
+
+    def __init__(self, main):
+        """Initialisation.
+
+        Parameters
+        ----------
+        main : erosiebezwaren.Erosiebezwaren
+            Instance of main class.
+
+        """
+        self.main = main
+        self.pyramids = {}
+        self.threads = {}
+        # incremented by clear(), results of older threads are discarded
+        self.generation = 0
+
+    def _start(self, path):
+        """Load or build the pyramid of the raster file in the background.
+
+        The thread is a daemon thread, so it does not keep QGis from exiting
+        while it is building a large pyramid.
+
+        Parameters
+        ----------
+        path : str
+            Path of the raster file.
+
+        """
+        def build(index, path, generation):
+            pyramidPath = path + '.minmax.npz'
+            pyramid = None
+            if os.path.isfile(pyramidPath) and (os.path.getmtime(
+                    pyramidPath) >= os.path.getmtime(path)):
+                try:
+                    pyramid = MinMaxPyramid.load(pyramidPath)
+                except (IOError, KeyError, ValueError):
+                    pass
+
+            if pyramid is None:
+                pyramid = MinMaxPyramid.build(path)
+                if pyramid is not None:
+                    try:
+                        pyramid.save(pyramidPath)
+                    except (IOError, OSError):
+                        # keep it in memory only
+                        pass
+            if index.generation == generation:
+                index.pyramids[path] = pyramid
+
+        self.threads[path] = threading.Thread(
+            target=build, args=(self, path, self.generation))
+        self.threads[path].daemon = True
+        self.threads[path].start()
+
+    def getMinMax(self, layer, rect):
+        """Get the minimum and maximum value of the layer within a rectangle.
+
+        Parameters
+        ----------
+        layer : QGisCore.QgsRasterLayer
+            Raster layer, its source should be a raster file.
+        rect : QGisCore.QgsRectangle
+            Rectangle, in the coordinates of the layer.
+
+        Returns
+        -------
+        tuple or None
+            Tuple of the minimum and maximum value, or `None` if these are
+            not available (yet).
+
+        """
+        path = layer.source()
+        if path not in self.threads:
+            if not os.path.isfile(path):
+                return None
+            self._start(path)
+
+        pyramid = self.pyramids.get(path, None)
+        if pyramid is None:
+            return None
+        return pyramid.getMinMax(rect.xMinimum(), rect.yMinimum(),
+                                 rect.xMaximum(), rect.yMaximum())
+
+    def clear(self):
+        """Remove all loaded pyramids.
+
+        Pyramids still being built by threads started before are discarded.
+        """
+        self.generation += 1
+        self.pyramids = {}
+        self.threads = {}
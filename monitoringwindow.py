@@ -57,6 +57,9 @@ class MonitoringWidget(ElevatedFeatureWidget, Ui_MonitoringWidget):
         self.layer = layer
         self.setupUi(self)
 
+        QtCore.QObject.connect(
+            self, QtCore.SIGNAL('featureSaved(QgsVectorLayer, qint64)'),
+            self.main.featureCache.invalidate)
         QtCore.QObject.connect(self.btn_save, QtCore.SIGNAL('clicked()'),
                                self.save)
         QtCore.QObject.connect(self.btn_cancel, QtCore.SIGNAL('clicked()'),
@@ -0,0 +1,313 @@
+# -*- coding: utf-8 -*-
+"""Module for substring search using an n-gram index.
+
+Contains the NGramIndex and ProducentnrIndex classes.
+"""
+
+#  DOV Erosiebezwaren, QGis plugin to assess field erosion on tablets
+#  Copyright (C) 2015-2017  Roel Huybrechts
+#
+#  This program is free software; you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation; either version 2 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License along
+#  with this program; if not, write to the Free Software Foundation, Inc.,
+#  51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+
+import PyQt4.QtCore as QtCore
+
+
+class NGramIndex(object):
+    """In-memory index to find values containing a given substring.
+
+    Every value is split in its n-grams (substrings of length n). To search
+    for a substring, only the values sharing all n-grams with the substring
+    are checked.
+    """
+
+    def __init__(self, n=3):
+        """Initialisation.
+
+        Parameters
+        ----------
+        n : int, optional
+            Length of the n-grams. Defaults to 3.
+
+        """
+        self.n = n
+        self.values = {}
+        self.postings = {}
+
+    def _getNGrams(self, value):
+        """Get the set of n-grams of the given value.
+
+        Parameters
+        ----------
+        value : str
+            Value to split.
+
+        Returns
+        -------
+        set of str
+            All n-grams of the value.
+
+        """
+        return set([value[i:i+self.n] for i in
+                    range(len(value) - self.n + 1)])
+
+    def add(self, key, value):
+        """Add a value to the index.
+
+        Parameters
+        ----------
+        key : hashable
+            Key identifying the value, returned by search.
+        value : str
+            Value to index.
+
+        """
+        self.values[key] = value
+        for ngram in self._getNGrams(value):
+            self.postings.setdefault(ngram, set()).add(key)
+
+    def search(self, substring):
+        """Find the values containing the given substring.
+
+        Parameters
+        ----------
+        substring : str
+            Substring to search for.
+
+        Returns
+        -------
+        list
+            Sorted list of the keys of the values containing the substring.
+
+        """
+        if len(substring) < self.n:
+            candidates = self.values.keys()
+        else:
+            postings = sorted([self.postings.get(ngram, set()) for ngram in
+                               self._getNGrams(substring)], key=len)
+            candidates = set(postings[0])
+            for p in postings[1:]:
+                if len(candidates) < 1:
+                    break
+                candidates &= p
+
+        return sorted([k for k in candidates if substring in self.values[k]])
+
+
+class ProducentnrIndex(object):
+    """Index of the producer numbers of the farmers in fts_landbouwers.
+
+    Producer numbers are normalised by removing dots and dashes. There is an
+    NGramIndex per value of the 'bezwaren' column, mapping to the rowid of
+    the farmer.
+
+    The index is outdated when editing stops in one of the watched layers.
+    The modification time of the database is not used, since it also
+    changes with every edit of the parcels.
+    """
+
+    # Query to get the data to build the index from.
+    SQL = "SELECT rowid, producentnr_zo, bezwaren FROM fts_landbouwers"
+
+    def __init__(self, database):
+        """Initialisation.
+
+        Parameters
+        ----------
+        database : str
+            Path of the Spatialite database containing fts_landbouwers.
+
+        """
+        self.database = database
+        self.indexes = {}
+        self.executor = None
+        self.ticket = None
+        self.ready = False
+        # layer id -> (layer, listener for its layerDeleted signal)
+        self.layers = {}
+
+    def watchLayer(self, layer):
+        """Invalidate the index when editing of the layer stops.
+
+        Parameters
+        ----------
+        layer : QGisCore.QgsVectorLayer
+            Layer containing (data derived from) the farmers.
+
+        """
+        if layer.id() in self.layers:
+            return
+
+        layerId = layer.id()
+        layerDeleted = lambda: self.layers.pop(layerId, None)
+        self.layers[layerId] = (layer, layerDeleted)
+        QtCore.QObject.connect(layer, QtCore.SIGNAL('editingStopped()'),
+                               self.invalidate)
+        QtCore.QObject.connect(layer, QtCore.SIGNAL('layerDeleted()'),
+                               layerDeleted)
+
+    def unload(self):
+        """Stop listening to the executor and the layers, discard the index.
+
+        Call before dropping the index.
+        """
+        self.invalidate()
+        for layer, layerDeleted in self.layers.values():
+            QtCore.QObject.disconnect(layer,
+                                      QtCore.SIGNAL('editingStopped()'),
+                                      self.invalidate)
+            QtCore.QObject.disconnect(layer, QtCore.SIGNAL('layerDeleted()'),
+                                      layerDeleted)
+        self.layers = {}
+
+    def invalidate(self):
+        """Discard the index, it is loaded again when needed."""
+        if self.ticket is not None:
+            self._disconnect()
+        self.indexes = {}
+        self.ready = False
+
+    def load(self, executor):
+        """Start loading the index in the background.
+
+        The index is built once the query has finished, until then isReady
+        returns `False`.
+
+        Parameters
+        ----------
+        executor : qgsutils.SpatialiteQueryExecutor
+            Executor to use to run the query.
+
+        """
+        if self.ticket is not None or self.ready:
+            return
+
+        self.executor = executor
+        QtCore.QObject.connect(
+            self.executor, QtCore.SIGNAL('resultsReady(int, PyQt_PyObject)'),
+            self._loaded)
+        QtCore.QObject.connect(
+            self.executor, QtCore.SIGNAL('queryFailed(int, QString)'),
+            self._loadFailed)
+        self.ticket = self.executor.submit(self.database, self.SQL)
+
+    def _disconnect(self):
+        """Stop listening to the signals of the executor."""
+        QtCore.QObject.disconnect(
+            self.executor, QtCore.SIGNAL('resultsReady(int, PyQt_PyObject)'),
+            self._loaded)
+        QtCore.QObject.disconnect(
+            self.executor, QtCore.SIGNAL('queryFailed(int, QString)'),
+            self._loadFailed)
+        self.ticket = None
+
+    def _loaded(self, ticket, rows):
+        """Build the index from the loaded rows.
+
+        Listener for the resultsReady signal of the executor.
+
+        Parameters
+        ----------
+        ticket : int
+            Ticket of the finished query.
+        rows : list of tuple
+            Results of the query.
+
+        """
+        if ticket != self.ticket:
+            return
+        self._disconnect()
+        self.build(rows)
+
+    def _loadFailed(self, ticket, message):
+        """Allow loading to be retried after a failure.
+
+        Listener for the queryFailed signal of the executor.
+
+        Parameters
+        ----------
+        ticket : int
+            Ticket of the failed query.
+        message : str
+            Error message of the query.
+
+        """
+        if ticket != self.ticket:
+            return
+        self._disconnect()
+
+    def isReady(self):
+        """Check whether the index has been built.
+
+        Returns
+        -------
+        boolean
+            `True` if the index can be searched, `False` otherwise.
+
+        """
+        return self.ready
+
+    def _normalise(self, producentnr):
+        """Normalise the given producer number.
+
+        Parameters
+        ----------
+        producentnr : str or int
+            Producer number.
+
+        Returns
+        -------
+        str
+            Producer number without dots and dashes.
+
+        """
+        return unicode(producentnr).replace('.', '').replace('-', '')
+
+    def build(self, rows):
+        """Build the index from the results of the query in SQL.
+
+        Parameters
+        ----------
+        rows : iterable
+            Rows with the rowid, producentnr_zo and bezwaren of the farmers.
+
+        """
+        self.indexes = {}
+        for rowid, producentnr, bezwaren in rows:
+            if not producentnr:
+                continue
+            if bezwaren not in self.indexes:
+                self.indexes[bezwaren] = NGramIndex()
+            self.indexes[bezwaren].add(rowid, self._normalise(producentnr))
+        self.ready = True
+
+    def search(self, producentnr, bezwaren):
+        """Find the farmers whose producer number contains the given one.
+
+        Parameters
+        ----------
+        producentnr : str
+            (Part of) the producer number, without dots and dashes.
+        bezwaren : int
+            Value of the 'bezwaren' column of the farmers to search.
+
+        Returns
+        -------
+        list of int
+            Sorted list of the rowids of the matching farmers.
+
+        """
+        if bezwaren not in self.indexes:
+            return []
+        return self.indexes[bezwaren].search(producentnr)
@@ -1,7 +1,8 @@
 # -*- coding: utf-8 -*-
 """Module for the parcel identify maptool.
 
-Contains the classes MapToolParcelIdentifier and ParcelIdentifyAction.
+Contains the classes ParcelIdentifyEngine, MapToolParcelIdentifier and
+ParcelIdentifyAction.
 """
 
 #  DOV Erosiebezwaren, QGis plugin to assess field erosion on tablets
@@ -26,6 +27,152 @@ import PyQt4.QtGui as QtGui
 import qgis.core as QGisCore
 import qgis.gui as QGisGui
 
+from qgsutils import getFeaturesByFids
+
+
+class ParcelIdentifyEngine(object):
+    """Find the parcel at a given point using an in-memory spatial index.
+
+    The spatial index of the bounding boxes of the parcels is built the first
+    time it is needed and rebuilt when the layer was edited. Only the
+    candidates from the index are fetched from the layer and tested to
+    contain the point, the complete feature of the identified parcel comes
+    from the feature cache.
+    """
+
+    def __init__(self, main):
+        """Initialisation.
+
+        Parameters
+        ----------
+        main : erosiebezwaren.Erosiebezwaren
+            Instance of main class.
+
+        """
+        self.main = main
+        self.layer = None
+        self.index = None
+
+    def setLayer(self, layer):
+        """Set the layer containing the parcels.
+
+        Invalidates the spatial index if the layer changed.
+
+        Parameters
+        ----------
+        layer : QGisCore.QgsVectorLayer
+            Layer containing the parcels.
+
+        """
+        if layer == self.layer:
+            return
+
+        if self.layer:
+            try:
+                QtCore.QObject.disconnect(
+                    self.layer, QtCore.SIGNAL('editingStopped()'),
+                    self.invalidate)
+            except RuntimeError:
+                # layer has already been deleted
+                pass
+
+        self.layer = layer
+        self.invalidate()
+
+        if self.layer:
+            QtCore.QObject.connect(self.layer,
+                                   QtCore.SIGNAL('editingStopped()'),
+                                   self.invalidate)
+
+    def invalidate(self):
+        """Discard the spatial index, it will be rebuilt when needed."""
+        self.index = None
+
+    def _getIndex(self):
+        """Get the spatial index of the layer, build it if necessary.
+
+        The index is bulk loaded from a feature iterator if possible, older
+        QGis versions (before 2.8) insert the features one by one.
+
+        Returns
+        -------
+        QGisCore.QgsSpatialIndex
+            Spatial index of the parcels of the layer.
+
+        """
+        if self.index is None:
+            request = QGisCore.QgsFeatureRequest()
+            request.setSubsetOfAttributes([])
+            try:
+                self.index = QGisCore.QgsSpatialIndex(
+                    self.layer.getFeatures(request))
+            except TypeError:
+                self.index = QGisCore.QgsSpatialIndex()
+                for feature in self.layer.getFeatures(request):
+                    self.index.insertFeature(feature)
+        return self.index
+
+    def identify(self, point):
+        """Find the parcel containing the given point.
+
+        If there are overlapping parcels at the point, prefer the one that
+        has an objection. If none of them has an objection, select the one
+        with the lowest 'uniek_id'. If more than one has an objection, none
+        is selected.
+
+        Parameters
+        ----------
+        point : QGisCore.QgsPoint
+            Point in the coordinate reference system of the layer.
+
+        Returns
+        -------
+        QGisCore.QgsFeature or None
+            The parcel at the point, or `None` if there is none.
+
+        """
+        if not self.layer:
+            return None
+
+        fids = self._getIndex().intersects(
+            QGisCore.QgsRectangle(point, point))
+        if len(fids) < 1:
+            return None
+
+        # only the geometry and the attributes to choose between overlapping
+        # parcels are needed to test the candidates
+        fields = self.layer.pendingFields()
+        features = getFeaturesByFids(
+            self.layer, fids, [fields.indexFromName('uniek_id'),
+                               fields.indexFromName('datum_bezwaar')])
+        if len(features) < len(fids):
+            # index is out of date, rebuild next time
+            self.invalidate()
+
+        fts = sorted([f for f in features if f.geometry() and
+                      f.geometry().contains(point)],
+                     key=lambda x: x.attribute('uniek_id'))
+
+        # Check for overlapping features:
+        #   - if one of them is an objection, select that
+        #   - if none of them is an objection, sort them to always select
+        #     the same feature
+        parcel = None
+        if len(fts) == 1:
+            parcel = fts[0]
+        elif len(fts) > 1:
+            fts_objections = [ft for ft in fts if ft.attribute(
+                'datum_bezwaar')]
+
+            if len(fts_objections) == 1:
+                parcel = fts_objections[0]
+            elif len(fts_objections) == 0:
+                parcel = fts[0]
+
+        if parcel is None:
+            return None
+        return self.main.featureCache.getFeature(self.layer, parcel.id())
+
 
 class MapToolParcelIdentifier(QGisGui.QgsMapToolIdentify):
     """Custom QgsMapToolIdentify to identify parcels."""
@@ -41,7 +188,7 @@ class MapToolParcelIdentifier(QGisGui.QgsMapToolIdentify):
         """
         self.main = main
         QGisGui.QgsMapToolIdentify.__init__(self, self.main.iface.mapCanvas())
-        self.previousActiveLayer = None
+        self.engine = ParcelIdentifyEngine(self.main)
 
     def activate(self):
         """Activate the selectionmanager and the maptool."""
@@ -65,43 +212,20 @@ class MapToolParcelIdentifier(QGisGui.QgsMapToolIdentify):
             Event describing the point on the map canvas the user clicked.
 
         """
-        table = self.main.utils.getLayerByName('percelenkaart_table')
         view = self.main.utils.getLayerByName('percelenkaart_view')
-        if table and view:
-            self.main.iface.setActiveLayer(table)
-            results = self.identify(mouseEvent.x(), mouseEvent.y(),
-                                    self.ActiveLayer, self.VectorLayer)
-            resultFid = None
-
-            # Check for overlapping features:
-            #   - if one of them is an objection, select that
-            #   - if none of them is an objection, sort them to always select
-            #     the same feature
-            if len(results) == 1:
-                resultFid = results[0].mFeature.id()
-            elif len(results) > 1:
-                fts = sorted([r.mFeature for r in results],
-                             key=lambda x: x.attribute('uniek_id'))
-                fts_objections = [ft for ft in fts if ft.attribute(
-                    'datum_bezwaar')]
-
-                if len(fts_objections) == 1:
-                    resultFid = fts_objections[0].id()
-                elif len(fts_objections) == 0:
-                    resultFid = fts[0].id()
-
-            if resultFid:
-                fr = QGisCore.QgsFeatureRequest()
-                fr.setFilterFid(resultFid)
-                feature = view.getFeatures(fr).next()
-                self.main.parcelInfoWidget.setLayer(view)
-                self.main.parcelInfoWidget.setFeature(feature)
-                self.main.parcelInfoWidget.parent.show()
-            else:
-                self.main.parcelInfoWidget.clear()
-
-        if self.previousActiveLayer:
-            self.main.iface.setActiveLayer(self.previousActiveLayer)
+        if not view:
+            return
+
+        self.engine.setLayer(view)
+        feature = self.engine.identify(
+            self.toLayerCoordinates(view, mouseEvent.pos()))
+
+        if feature:
+            self.main.parcelInfoWidget.setLayer(view)
+            self.main.parcelInfoWidget.setFeature(feature)
+            self.main.parcelInfoWidget.parent.show()
+        else:
+            self.main.parcelInfoWidget.clear()
 
 
 class ParcelIdentifyAction(QtGui.QAction):
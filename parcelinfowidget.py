@@ -32,7 +32,6 @@ import PyQt4.QtGui as QtGui
 import qgis.core as QGisCore
 
 import os
-import re
 import socket
 import subprocess
 
@@ -43,7 +42,6 @@ from monitoringwindow import MonitoringWindow
 from parcellistdialog import ParcelListDialog
 from parcelwindow import ParcelWindow
 from photodialog import PhotoDialog
-from qgsutils import SpatialiteIterator
 from widgets.elevatedfeaturewidget import ElevatedFeatureWidget
 
 
@@ -196,10 +194,11 @@ class ParcelButtonBar(QtGui.QWidget):
                 QGisCore.QgsProject.instance().fileName()),
                 self.main.settings.getValue('paths/bezwaren'),
                 str(self.feature.attribute('producentnr'))])
+            fileList = self.main.fileIndex.listDirectory(objectionPath)
             objectionPath = objectionPath.replace('/', '\\')
             self.parent.objectionPath = []
-            if os.path.exists(objectionPath):
-                fileList = [i.lower() for i in os.listdir(objectionPath)]
+            if fileList is not None:
+                fileList = [i.lower() for i in fileList]
                 exts = set([f[f.rfind('.')+1:] for f in fileList])
                 if len(exts) == 1 and 'pdf' in exts:
                     # only pdfs
@@ -249,6 +248,8 @@ class ParcelButtonBar(QtGui.QWidget):
         """
         d = PhotoDialog(self.main.iface, str(self.feature.attribute(
             'uniek_id')))
+        QtCore.QObject.connect(d, QtCore.SIGNAL('saved()'),
+                               lambda: self.main.fileIndex.refresh(d.savePath))
         QtCore.QObject.connect(d, QtCore.SIGNAL('saved()'),
                                self.parent.contentWidget.populateShowPhotos)
         d.show()
@@ -269,10 +270,10 @@ class ParcelButtonBar(QtGui.QWidget):
 
         def reloadFeature(layer, uniek_id):
             self.parent.setLayer(layer)
-            s = SpatialiteIterator(layer)
-            fts = s.queryExpression("uniek_id = '%s'" % uniek_id)
-            if len(fts) > 0:
-                self.parent.setFeature(fts[0])
+            feature = self.main.featureCache.getFeatureByUniekId(
+                layer, uniek_id)
+            if feature:
+                self.parent.setFeature(feature)
             tableLayer = self.main.utils.getLayerByName('percelenkaart_table')
             tableLayer.triggerRepaint()
 
@@ -367,28 +368,33 @@ class ParcelInfoWidget(ElevatedFeatureWidget, Ui_ParcelInfoWidget):
     def populate(self):
         """Populate the contents of this widget and child widgets.
 
-        Based on information in the attribute values of the parcel.
+        Based on information in the attribute values of the parcel. Updates
+        of the widget are disabled meanwhile, to repaint only once.
         """
-        ElevatedFeatureWidget.populate(self)
-        if self.feature:
-            self.showInfo()
-            self.main.selectionManagerPolygons.clear()
-            if self.feature.attribute('advies_behandeld'):
-                s = SpatialiteIterator(self.layer)
-                fts = s.queryExpression(
-                    "producentnr_zo = '%s' and datum_bezwaar is not null" %
-                    self.feature.attribute('producentnr_zo'), attributes=[])
-                for f in fts:
-                    self.main.selectionManagerPolygons.select(
-                        f, mode=1, toggleRendering=False)
-            self.main.selectionManagerPolygons.select(self.feature, mode=0,
-                                                      toggleRendering=True)
-        else:
-            self.clear()
+        self.setUpdatesEnabled(False)
+        try:
+            ElevatedFeatureWidget.populate(self)
+            if self.feature:
+                self.showInfo()
+                self.main.selectionManagerPolygons.clear()
+                if self.feature.attribute('advies_behandeld'):
+                    fts = self.main.featureCache.queryWhere(
+                        self.layer,
+                        [('producentnr_zo', '=',
+                          self.feature.attribute('producentnr_zo')),
+                         ('datum_bezwaar', 'IS NOT', None)])
+                    self.main.selectionManagerPolygons.selectMany(
+                        fts, mode=1, toggleRendering=False)
+                self.main.selectionManagerPolygons.select(self.feature, mode=0,
+                                                          toggleRendering=True)
+            else:
+                self.clear()
 
-        self.buttonBar.setLayer(self.layer)
-        self.buttonBar.setFeature(self.feature)
-        self.contentWidget.setFeature(self.feature)
+            self.buttonBar.setLayer(self.layer)
+            self.buttonBar.setFeature(self.feature)
+            self.contentWidget.setFeature(self.feature)
+        finally:
+            self.setUpdatesEnabled(True)
 
     def clear(self):
         """Clear the contents of this widget.
@@ -433,6 +439,8 @@ class ParcelInfoContentWidget(ElevatedFeatureWidget,
                               Ui_ParcelInfoContentWidget):
     """Class for the content widget that represents a single parcel."""
 
+    incrementalPopulate = True
+
     def __init__(self, parent, main, parcel=None):
         """Initialisation.
 
@@ -453,6 +461,9 @@ class ParcelInfoContentWidget(ElevatedFeatureWidget,
         self.main = main
 
         self.photoPath = None
+        self.adviesState = None
+        self.gpsState = None
+        self.adviesFields = None
 
         self.setupUi(self)
 
@@ -537,31 +548,31 @@ class ParcelInfoContentWidget(ElevatedFeatureWidget,
 
         if self.feature:
             if self.feature.attribute('advies_aanvaarding') == 0:
-                self.lbv_advies.setText("Niet aanvaard", forceText=True)
                 color = self.lbv_advies.colorMap.get(
                     self.feature.attribute('advies_nieuwe_kleur'),
                     ('#5d5d5d',))[0]
-                self.lbv_advies.setStyleSheet(style % ('#5d5d5d', '#ffffff',
-                                                       color))
+                state = ("Niet aanvaard", True,
+                         style % ('#5d5d5d', '#ffffff', color))
             elif self.feature.attribute('advies_aanvaarding') == 1 or \
                 (self.feature.attribute('advies_aanvaarding') == None and
                  self.feature.attribute('datum_bezwaar') == None):
                 color, textcolor = self.lbv_advies.colorMap.get(
                     self.feature.attribute('advies_nieuwe_kleur'), ('#c6c6c6',
                                                                     '#000000'))
-                self.lbv_advies.setText("Advies", forceText=True)
-                self.lbv_advies.setStyleSheet(style % (color, textcolor,
-                                                       color))
+                state = ("Advies", True, style % (color, textcolor, color))
             else:
-                self.lbv_advies.setText("Advies")
                 color = self.lbv_advies.colorMap.get(self.feature.attribute(
                     'advies_nieuwe_kleur'), ('#c6c6c6',))[0]
-                self.lbv_advies.setStyleSheet(style % ('#c6c6c6', '#000000',
-                                                       color))
+                state = ("Advies", False,
+                         style % ('#c6c6c6', '#000000', color))
         else:
-            self.lbv_advies.setText("Advies")
-            self.lbv_advies.setStyleSheet(style % ('#c6c6c6', '#000000',
-                                                   '#c6c6c6'))
+            state = ("Advies", False, style % ('#c6c6c6', '#000000',
+                                               '#c6c6c6'))
+
+        if state != self.adviesState:
+            self.lbv_advies.setText(state[0], forceText=state[1])
+            self.lbv_advies.setStyleSheet(state[2])
+            self.adviesState = state
 
     def populateGps(self):
         """Populate the labels with the GPS coordinates of this parcel.
@@ -575,21 +586,24 @@ class ParcelInfoContentWidget(ElevatedFeatureWidget,
             return r
 
         if self.feature:
-            gpsGeom = QGisCore.QgsGeometry(self.feature.geometry().centroid())
-            gpsGeom.transform(QGisCore.QgsCoordinateTransform(
-                QGisCore.QgsCoordinateReferenceSystem(
-                    31370, QGisCore.QgsCoordinateReferenceSystem.EpsgCrsId),
-                QGisCore.QgsCoordinateReferenceSystem(
-                    4326, QGisCore.QgsCoordinateReferenceSystem.EpsgCrsId)))
+            centroid = self.feature.geometry().centroid().asPoint()
             dms = self.main.qsettings.value(
                 '/Qgis/plugins/Erosiebezwaren/gps_dms', 'false')
+            state = (centroid.x(), centroid.y(), dms)
+            if state == self.gpsState:
+                return
+            self.gpsState = state
+
+            gpsPoint = self.main.transformCache.transformPoint(
+                31370, 4326, centroid)
             if dms == 'true':
                 self.lbv_gps.setText(rewriteText(
-                    gpsGeom.asPoint().toDegreesMinutesSeconds(2)))
+                    gpsPoint.toDegreesMinutesSeconds(2)))
             else:
                 self.lbv_gps.setText(rewriteText(
-                    gpsGeom.asPoint().toDegreesMinutes(3)))
+                    gpsPoint.toDegreesMinutes(3)))
         else:
+            self.gpsState = None
             self.lbv_gps.clear()
 
     def populateArea(self):
@@ -635,9 +649,9 @@ class ParcelInfoContentWidget(ElevatedFeatureWidget,
                 photoPath = '/'.join([os.path.dirname(
                     QGisCore.QgsProject.instance().fileName()),
                                       'fotos', str(fid)])
+                photos = self.main.fileIndex.listDirectory(photoPath)
                 photoPath = photoPath.replace('/', '\\')
-                if os.path.exists(photoPath) \
-                        and len(os.listdir(photoPath)) > 0:
+                if photos:
                     self.photoPath = photoPath
                     showPhotos(True)
                 else:
@@ -670,17 +684,32 @@ class ParcelInfoContentWidget(ElevatedFeatureWidget,
                 return
 
             fields = self.feature.fields()
+            for name in self._getAdviesFields():
+                if fields.indexFromName(name) > -1 and \
+                        self.feature.attribute(name):
+                    enableTabAdvies(True)
+                    return
+
+        enableTabAdvies(False)
+
+    def _getAdviesFields(self):
+        """Get the names of the fields shown on the tab 'advies'.
+
+        Returns
+        -------
+        list of str
+            Names of the fields of the subwidgets on the tab 'advies'.
+
+        """
+        if self.adviesFields is None:
+            self.adviesFields = []
             for i in range(self.scrollContentsAdvies.layout().count()):
                 w = self.scrollContentsAdvies.layout().itemAt(i).widget()
                 if w:
-                    m = re.match(r'^efw[^_]*_(.*)$', w.objectName())
+                    m = self.reWidgetName.match(w.objectName())
                     if m:
-                        if fields.indexFromName(m.group(1)) > -1 and \
-                                self.feature.attribute(m.group(1)):
-                            enableTabAdvies(True)
-                            return
-
-        enableTabAdvies(False)
+                        self.adviesFields.append(m.group(1))
+        return self.adviesFields
 
     def clear(self):
         """Set the current feature to `None`."""
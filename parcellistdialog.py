@@ -23,8 +23,8 @@ import PyQt4.QtGui as QtGui
 import qgis.core as QGisCore
 
 from ui_parcellistdialog import Ui_ParcelListDialog
+from zonalstats import ZonalStatistics
 
-from qgsutils import SpatialiteIterator
 from widgets import valuelabel
 
 
@@ -67,17 +67,15 @@ class ParcelListWidget(QtGui.QWidget):
             `False` list all the parcels of the farmer. Defaults to `False`.
 
         """
-        parcelList = []
-        stmt = "producentnr_zo = '%s'" % producentnr_zo
+        where = [('producentnr_zo', '=', producentnr_zo)]
         if onlyObjections:
-            stmt += " AND datum_bezwaar IS NOT NULL"
-        s = SpatialiteIterator(self.layer)
-
-        parcelList = s.queryExpression(stmt)
+            where.append(('datum_bezwaar', 'IS NOT', None))
+        parcelList = self.main.featureCache.queryWhere(self.layer, where)
         for p in sorted(parcelList,
                         key=lambda x: int(x.attribute('perceelsnr_va_2019'))):
             p.layer = self.layer
             self._addParcel(p)
+        self.main.selectionManagerPolygons.selectMany(parcelList, mode=1)
 
     def goToParcel(self, parcel):
         """Show the information of this parcel in the parcelInfoWidget.
@@ -88,8 +86,11 @@ class ParcelListWidget(QtGui.QWidget):
             Feature of the parcel to show the info of.
 
         """
+        feature = self.main.featureCache.getFeature(parcel.layer, parcel.id())
+        if not feature:
+            return
         self.parcelListDialog.parcelInfoWidget.setLayer(parcel.layer)
-        self.parcelListDialog.parcelInfoWidget.setFeature(parcel)
+        self.parcelListDialog.parcelInfoWidget.setFeature(feature)
         self.parcelListDialog.parcelInfoWidget.parent.show()
 
     def zoomExtent(self):
@@ -103,6 +104,17 @@ class ParcelListWidget(QtGui.QWidget):
         self.main.iface.mapCanvas().setExtent(extent.buffer(10))
         self.main.iface.mapCanvas().refresh()
 
+    def zonalStats(self):
+        """Calculate the erosion statistics of the listed parcels.
+
+        The results are shown in a new table.
+        """
+        if len(self.parcelList) < 1:
+            return
+        ZonalStatistics(self.main).run(
+            self.parcelList, 'Erosiestatistieken %s' %
+            self.parcelList[0].attribute('producentnr_zo'))
+
     def _addParcel(self, parcel):
         """Add the parcel to the list of parcels.
 
@@ -113,7 +125,6 @@ class ParcelListWidget(QtGui.QWidget):
         """
         row = self.layout.rowCount()
         self.parcelList.append(parcel)
-        self.main.selectionManagerPolygons.select(parcel, mode=1)
 
         btn = QtGui.QPushButton(str(parcel.attribute('perceelsnr_va_2019')),
                                 self)
@@ -185,6 +196,9 @@ class ParcelListDialog(QtGui.QDialog, Ui_ParcelListDialog):
         QtCore.QObject.connect(self.btn_zoomExtent,
                                QtCore.SIGNAL('clicked(bool)'),
                                self.listWidget.zoomExtent)
+        QtCore.QObject.connect(self.btn_zonalStats,
+                               QtCore.SIGNAL('clicked(bool)'),
+                               self.listWidget.zonalStats)
         self.scrollAreaLayout.insertWidget(0, self.listWidget)
         self.listWidget.populate(producentnr_zo, bezwaren)
 
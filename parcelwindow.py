@@ -51,6 +51,10 @@ class ParcelEditWidget(ElevatedFeatureWidget, Ui_ParcelEditWidget):
         self.layer = layer
         self.setupUi(self)
 
+        QtCore.QObject.connect(
+            self, QtCore.SIGNAL('featureSaved(QgsVectorLayer, qint64)'),
+            self.main.featureCache.invalidate)
+
         self.efwCmb_advies_behandeld.initialValues = []
         self.efwCmb_advies_behandeld.setValues([
             'Te behandelen',
@@ -26,11 +26,18 @@ import PyQt4.QtCore as QtCore
 import PyQt4.QtGui as QtGui
 import qgis.core as QGisCore
 
+import numpy as np
+
+import rastercoverage
+
+from rasterblockcache import blockToArray
+
 
 class RasterBlockWrapper(QtCore.QObject):
     """Class to align a vector geometry to the grid of a raster layer."""
 
-    def __init__(self, rasterLayer, band, geometry):
+    def __init__(self, rasterLayer, band, geometry, process=True,
+                 cache=None):
         """Initialisation.
 
         Aligns the given geometry to the grid of the raster layer.
@@ -44,6 +51,14 @@ class RasterBlockWrapper(QtCore.QObject):
             for the new geometry.
         geometry : QGisCore.QgsGeometry
             Geometry to align to the raster grid.
+        process : boolean, optional
+            Align the geometry and calculate the statistics immediately.
+            Use `False` to only read the raster block, for example to
+            calculate the statistics in another process using getTask().
+            Defaults to `True`.
+        cache : rasterblockcache.RasterBlockCache, optional
+            Cache to read the values of the raster block from. Defaults to
+            reading the block from the data provider of the raster layer.
 
         """
         self.rasterLayer = rasterLayer
@@ -61,15 +76,19 @@ class RasterBlockWrapper(QtCore.QObject):
         self.blockBbox = self._alignRectangleToGrid(self.geomBbox)
         self.blockWidth = int(self.blockBbox.width()/self.pixelSizeX)
         self.blockHeight = int(self.blockBbox.height()/self.pixelSizeY)
-        self.block = self.rasterLayer.dataProvider().block(self.band,
-                                                           self.blockBbox,
-                                                           self.blockWidth,
-                                                           self.blockHeight)
+        self.cache = cache
+        self.block = None
+        if self.cache is None:
+            self.block = self.rasterLayer.dataProvider().block(
+                self.band, self.blockBbox, self.blockWidth, self.blockHeight)
+        self.blockYMinimum = self.blockBbox.yMaximum() - (
+            self.blockHeight*self.pixelSizeY)
 
         self.newGeometry = None
         self.stats = {}
 
-        self._process()
+        if process:
+            self._process()
 
     def _alignRectangleToGrid(self, rect):
         """Aligns the given rectangle to the grid of the raster layer.
@@ -99,77 +118,134 @@ class RasterBlockWrapper(QtCore.QObject):
             rect.height()/self.pixelSizeY)*self.pixelSizeY))
         return newRect
 
-    def _rasterCellMatchesGeometry(self, rect):
-        """Check whether a given raster cell belongs to the geometry.
+    def _getPolygons(self):
+        """Get the coordinates of the rings of the polygon(s) of the geometry.
+
+        Returns
+        -------
+        list of list of numpy.ndarray
+            List of polygons, which are lists of rings. Every ring is an array
+            of shape (n, 2) with the coordinates of its vertices.
+
+        """
+        if self.geometry.isMultipart():
+            polygons = self.geometry.asMultiPolygon()
+        else:
+            polygons = [self.geometry.asPolygon()]
+        return [[np.array([(p.x(), p.y()) for p in ring]) for ring in polygon]
+                for polygon in polygons]
+
+    def _getBlockValues(self):
+        """Get the values of the raster block as a NumPy array.
 
-        In casu: a raster cell belongs to the geometry if at least 50 percent
-        of the area of the raster cell falls inside the geometry.
+        Returns
+        -------
+        numpy.ndarray
+            Array of shape (blockHeight, blockWidth) with the cell values.
+
+        """
+        if self.cache is not None:
+            return self.cache.getValues(self.rasterLayer, self.band,
+                                        self.blockBbox, self.blockWidth,
+                                        self.blockHeight)
+        return blockToArray(self.block, self.blockWidth, self.blockHeight)
+
+    def _maskToGeometry(self, mask):
+        """Build the geometry covering the selected raster cells.
+
+        The boundaries of the selected cells are traced directly, instead of
+        merging the geometries of the cells.
 
         Parameters
         ----------
-        rect : QGisCore.QgsRectangle
-            The rectangle representing the raster cell.
+        mask : numpy.ndarray
+            Boolean array of the shape of the block, `True` for the selected
+            cells.
 
         Returns
         -------
-        boolean
-            `True` if the raster cell belongs to the geometry, `False`
-            otherwise.
+        QGisCore.QgsGeometry or None
+            Geometry covering the selected cells, or `None` if there are none.
 
         """
-        # 50% overlap
-        return self.geometry.intersection(
-            QGisCore.QgsGeometry.fromRect(rect)).area() >= (self.pixelArea*0.5)
+        polygons = rastercoverage.maskToPolygons(
+            mask, self.blockBbox.xMinimum(), self.blockYMinimum,
+            self.pixelSizeX, self.pixelSizeY)
+
+        if len(polygons) < 1:
+            return None
+
+        polygons = [[[QGisCore.QgsPoint(x, y) for x, y in ring.tolist()]
+                     for ring in polygon] for polygon in polygons]
+        if len(polygons) == 1:
+            return QGisCore.QgsGeometry.fromPolygon(polygons[0])
+        return QGisCore.QgsGeometry.fromMultiPolygon(polygons)
+
+    def _getNoData(self):
+        """Get the noData value of the band of the raster layer.
+
+        Returns
+        -------
+        float or None
+            The noData value, or `None` if the band has no noData value.
+
+        """
+        provider = self.rasterLayer.dataProvider()
+        if provider.srcHasNoDataValue(self.band):
+            return provider.srcNoDataValue(self.band)
 
     def _process(self):
         """Calculate the new, aligned, geometry.
 
-        Loop over all raster cells within the bounding box of the geometry and
-        check for each of them if they should be part of the new geometry.
-        Build a new QgsGeometry from the matching cells.
+        Calculate the fraction of every raster cell within the bounding box
+        of the geometry that is covered by the geometry, a raster cell
+        belongs to the new geometry if at least 50 percent of its area is
+        covered. Build a new QgsGeometry from the matching cells.
 
         Also builds a dictionary of statistics for the new QgsGeometry: listing
         the count, sum and average (mean) values of the raster cells it
         contains.
         """
-        valSum = 0
-        valCnt = 0
-
-        noData = None
-        if self.rasterLayer.dataProvider().srcHasNoDataValue(self.band):
-            noData = self.rasterLayer.dataProvider().srcNoDataValue(self.band)
-
-        for r in range(self.blockHeight):
-            for c in range(self.blockWidth):
-                cellRect = QGisCore.QgsRectangle()
-                cellRect.setXMinimum(self.blockBbox.xMinimum() +
-                                     (c*self.pixelSizeX))
-                cellRect.setYMinimum(self.blockBbox.yMaximum() -
-                                     (r*self.pixelSizeY)-self.pixelSizeY)
-                cellRect.setXMaximum(self.blockBbox.xMinimum() +
-                                     (c*self.pixelSizeX)+self.pixelSizeX)
-                cellRect.setYMaximum(self.blockBbox.yMaximum() -
-                                     (r*self.pixelSizeY))
-                if self._rasterCellMatchesGeometry(cellRect):
-                    value = self.block.value(r, c)
-
-                    if noData and value == noData:
-                        continue
-
-                    valSum += self.block.value(r, c)
-                    valCnt += 1
-                    if not self.newGeometry:
-                        self.newGeometry = QGisCore.QgsGeometry.fromRect(
-                            cellRect)
-                    else:
-                        self.newGeometry = self.newGeometry.combine(
-                            QGisCore.QgsGeometry.fromRect(cellRect))
-
-        if valCnt > 0:
+        if self.blockWidth < 1 or self.blockHeight < 1:
+            return
+
+        # 50% overlap
+        mask = rastercoverage.matchingCells(
+            self._getPolygons(), self.blockBbox.xMinimum(),
+            self.blockYMinimum, self.pixelSizeX, self.pixelSizeY,
+            self.blockWidth, self.blockHeight, 0.5)
+
+        mask, stats = rastercoverage.blockStats(self._getBlockValues(), mask,
+                                                self._getNoData())
+        self.newGeometry = self._maskToGeometry(mask)
+        if len(stats) > 0:
             self.stats.clear()
-            self.stats['sum'] = valSum
-            self.stats['count'] = valCnt
-            self.stats['avg'] = valSum/float(valCnt)
+            self.stats.update(stats)
+
+    def getTask(self, key):
+        """Get the arguments to calculate the statistics elsewhere.
+
+        The result only contains picklable values, to be passed to
+        rastercoverage.parcelStats in another process.
+
+        Parameters
+        ----------
+        key : object
+            Picklable key to identify the result of the task.
+
+        Returns
+        -------
+        tuple or None
+            Arguments for rastercoverage.parcelStats, or `None` if the raster
+            block is empty.
+
+        """
+        if self.blockWidth < 1 or self.blockHeight < 1:
+            return None
+
+        return (key, self._getPolygons(), self._getBlockValues(),
+                self.blockBbox.xMinimum(), self.blockYMinimum,
+                self.pixelSizeX, self.pixelSizeY, self._getNoData())
 
     def getRasterizedGeometry(self):
         """Get the rasterized, aligned, version of the input geometry.
@@ -297,7 +373,8 @@ class PixelisedVectorLayer(QGisCore.QgsVectorLayer):
 
         """
         ft = self.getFeatures(QGisCore.QgsFeatureRequest(fid)).next()
-        block = RasterBlockWrapper(self.rasterLayer, 1, ft.geometry())
+        block = RasterBlockWrapper(self.rasterLayer, 1, ft.geometry(),
+                                   cache=self.main.rasterBlockCache)
 
         if not block.isEmpty():
             self.changeGeometry(fid, block.getRasterizedGeometry())
@@ -336,9 +413,8 @@ class PixelMeasureAction(QtGui.QAction):
                                parent)
 
         self.mapCanvas = self.main.iface.mapCanvas()
-        QtCore.QObject.connect(self.mapCanvas,
-                               QtCore.SIGNAL('extentsChanged()'),
-                               self.populateVisible)
+        # cheap, update the toolbar before slower listeners run
+        self.main.viewportDispatcher.addListener(self.populateVisible, 10)
 
         self.rasterLayer = self.main.utils.getLayerByName(self.rasterLayerName)
         self.rasterLayerActive = False
@@ -432,8 +508,6 @@ class PixelMeasureAction(QtGui.QAction):
     def deactivate(self):
         """Deactivate by disconnecting signals and stopping measurement."""
         QtCore.QObject.disconnect(
-            self, QtCore.SIGNAL('triggered(bool)'), self.startMeasure)
-        QtCore.QObject.connect(
-            self.mapCanvas, QtCore.SIGNAL('extentsChanged()'),
-            self.populateVisible)
+            self, QtCore.SIGNAL('triggered(bool)'), self.activate)
+        self.main.viewportDispatcher.removeListener(self.populateVisible)
         self.stopMeasure()
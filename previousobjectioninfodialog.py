@@ -86,9 +86,9 @@ class PreviousObjectionInfoDialog(QtGui.QDialog,
                 photoPath = '/'.join([os.path.dirname(
                     QGisCore.QgsProject.instance().fileName()),
                                       'fotos_%i' % self.jaar, str(fid)])
+                photos = self.main.fileIndex.listDirectory(photoPath)
                 photoPath = photoPath.replace('/', '\\')
-                if os.path.exists(photoPath) and \
-                        len(os.listdir(photoPath)) > 0:
+                if photos:
                     self.photoPath = photoPath
                     self.btn_showPhotos = QtGui.QPushButton()
                     self.btn_showPhotos.setIcon(
@@ -119,10 +119,11 @@ class PreviousObjectionInfoDialog(QtGui.QDialog,
                                       'bezwaren_%i' % self.jaar,
                                       str(self.feature.attribute(
                                           'producentnr'))])
+            fileList = self.main.fileIndex.listDirectory(objectionPath)
             objectionPath = objectionPath.replace('/', '\\')
             self.objectionPath = []
-            if os.path.exists(objectionPath):
-                fileList = [i.lower() for i in os.listdir(objectionPath)]
+            if fileList is not None:
+                fileList = [i.lower() for i in fileList]
                 exts = set([f[f.rfind('.')+1:] for f in fileList])
                 if len(exts) == 1 and 'pdf' in exts:
                     # only pdfs
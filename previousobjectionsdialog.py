@@ -160,8 +160,8 @@ class PreviousObjectionsWidget(QtGui.QWidget):
 
         s = SpatialiteIterator(self.main.utils.getLayerByName(
             'bezwaren_%i' % feature.attribute('jaar')))
-        oldFt = s.queryExpression("uniek_id = '%s'" %
-                                  feature.attribute('oud_bezwaar_id'))[0]
+        oldFt = s.queryWhere(
+            [('uniek_id', '=', feature.attribute('oud_bezwaar_id'))])[0]
 
         d = PreviousObjectionInfoDialog(self.parent, self.main, oldFt,
                                         feature.attribute('jaar'))
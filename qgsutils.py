@@ -1,7 +1,8 @@
 # -*- coding: utf-8 -*-
 """Module for utilities extending QGis capabilities.
 
-Contains the SpatialiteIterator class.
+Contains the SpatialiteConnectionPool, SpatialiteQueryExecutor,
+SpatialiteIterator and CoordinateTransformCache classes.
 """
 
 #  DOV Erosiebezwaren, QGis plugin to assess field erosion on tablets
@@ -21,14 +22,375 @@ Contains the SpatialiteIterator class.
 #  with this program; if not, write to the Free Software Foundation, Inc.,
 #  51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
 
+import PyQt4.QtCore as QtCore
 import qgis.core as QGisCore
 
+import Queue
+import threading
+
 from pyspatialite import dbapi2 as sl
 
 
+def getFeaturesByFids(layer, fids, attributes=None, geometry=True,
+                      chunkSize=500):
+    """Get the features with the given feature ids from the layer.
+
+    Fetches the features in as few requests as possible, the result is in
+    the same order as the given feature ids. Feature ids that are not
+    available in the layer are left out.
+
+    Parameters
+    ----------
+    layer : QGisCore.QgsVectorLayer
+        Layer to get the features from.
+    fids : list of int
+        Feature ids of the features to get.
+    attributes : list, optional
+        Subset of attributes to include in the returned QgsFeature's.
+        Defaults to all attributes.
+    geometry : boolean, optional
+        Include the geometry in the returned QgsFeature's. Defaults to
+        `True`.
+    chunkSize : int, optional
+        Maximum number of feature ids to request at once. Defaults to 500.
+
+    Returns
+    -------
+    list of QgsFeature
+        List of QgsFeatures with the given feature ids.
+
+    """
+    fr = QGisCore.QgsFeatureRequest()
+    # setFlags replaces all flags, set it before setSubsetOfAttributes
+    if not geometry:
+        fr.setFlags(QGisCore.QgsFeatureRequest.NoGeometry)
+    if attributes is not None:
+        fr.setSubsetOfAttributes(attributes)
+
+    featureMap = {}
+    if not hasattr(fr, 'setFilterFids'):
+        # QGis < 2.10 has no support for requesting a set of fids
+        for fid in fids:
+            fr.setFilterFid(fid)
+            for feature in layer.getFeatures(fr):
+                featureMap[feature.id()] = feature
+    else:
+        for i in range(0, len(fids), chunkSize):
+            fr.setFilterFids(set(fids[i:i+chunkSize]))
+            for feature in layer.getFeatures(fr):
+                featureMap[feature.id()] = feature
+
+    return [featureMap[fid] for fid in fids if fid in featureMap]
+
+
+class SpatialiteConnectionPool(object):
+    """Pool of persistent connections to Spatialite databases.
+
+    Connections are kept open per database path and per thread, since a
+    Spatialite connection can only be used in the thread that created it.
+    This saves the cost of setting up the connection and initialising the
+    Spatialite extension for every query.
+
+    Each connection keeps the default LRU cache of 100 prepared statements,
+    keyed by the SQL text of the statement, which is more than the number
+    of distinct statements the plugin issues. Use parameterised queries with
+    a constant SQL text to benefit from it.
+    """
+
+    def __init__(self):
+        """Initialisation."""
+        self.connections = {}
+        self.lock = threading.Lock()
+
+    def _isHealthy(self, connection):
+        """Check whether the given connection is still usable.
+
+        Parameters
+        ----------
+        connection : pyspatialite.dbapi2.Connection
+            Connection to check.
+
+        Returns
+        -------
+        boolean
+            `True` if the connection can still execute queries, `False`
+            otherwise.
+
+        """
+        try:
+            connection.execute('SELECT 1').fetchall()
+        except sl.Error:
+            return False
+        return True
+
+    def _pruneDeadThreads(self):
+        """Forget the connections of threads that are no longer running.
+
+        These connections cannot be closed from another thread, dropping the
+        reference allows them to be garbage collected.
+        """
+        alive = set([t.ident for t in threading.enumerate()])
+        with self.lock:
+            for key in list(self.connections.keys()):
+                if key[1] not in alive:
+                    del(self.connections[key])
+
+    def getConnection(self, database):
+        """Get a connection to the given database for the current thread.
+
+        Reuses an existing connection if there is a healthy one available,
+        opens a new connection otherwise.
+
+        Parameters
+        ----------
+        database : str
+            Path of the Spatialite database.
+
+        Returns
+        -------
+        pyspatialite.dbapi2.Connection
+            Open connection to the database, only to be used in the current
+            thread.
+
+        """
+        key = (database, threading.current_thread().ident)
+        with self.lock:
+            connection = self.connections.get(key, None)
+
+        if connection is not None:
+            if self._isHealthy(connection):
+                return connection
+            self._close(connection)
+
+        self._pruneDeadThreads()
+        connection = sl.connect(database)
+        with self.lock:
+            self.connections[key] = connection
+        return connection
+
+    def _close(self, connection):
+        """Close the given connection, ignoring errors.
+
+        Parameters
+        ----------
+        connection : pyspatialite.dbapi2.Connection
+            Connection to close.
+
+        """
+        try:
+            connection.close()
+        except sl.Error:
+            pass
+
+    def closeThreadConnections(self):
+        """Close the pooled connections of the current thread.
+
+        Threads using the pool should call this before they exit.
+        """
+        ident = threading.current_thread().ident
+        with self.lock:
+            keys = [k for k in self.connections if k[1] == ident]
+            connections = [self.connections.pop(k) for k in keys]
+
+        for connection in connections:
+            self._close(connection)
+
+    def closeAll(self):
+        """Close all pooled connections.
+
+        Called when unloading the plugin.
+        """
+        with self.lock:
+            connections = self.connections.values()
+            self.connections = {}
+
+        for connection in connections:
+            self._close(connection)
+
+
+connectionPool = SpatialiteConnectionPool()
+
+
+class SpatialiteQueryExecutor(QtCore.QThread):
+    """Thread executing Spatialite queries outside of the GUI thread.
+
+    Queries are submitted with an optional group. Submitting a new query in
+    a group cancels the older queries of the same group: pending ones are
+    skipped and a running one is interrupted. Results are only delivered for
+    queries that have not been cancelled.
+
+    Signals
+    -------
+    resultsReady : QtCore.pyqtSignal(int, object)
+        Emitted when a query has finished. Includes the ticket of the query
+        and the list of resulting rows.
+    queryFailed : QtCore.pyqtSignal(int, 'QString')
+        Emitted when a query has failed. Includes the ticket of the query and
+        the error message.
+
+    """
+
+    resultsReady = QtCore.pyqtSignal(int, object)
+    queryFailed = QtCore.pyqtSignal(int, 'QString')
+
+    def __init__(self, parent=None):
+        """Initialisation.
+
+        Parameters
+        ----------
+        parent : QtCore.QObject, optional
+            Parent object of the thread.
+
+        """
+        QtCore.QThread.__init__(self, parent)
+        self.queue = Queue.Queue()
+        self.lock = threading.Lock()
+        self.lastTicket = 0
+        self.latestTickets = {}
+        self.running = None
+
+    def _isCancelled(self, ticket, group):
+        """Check whether the query with the given ticket has been cancelled.
+
+        Parameters
+        ----------
+        ticket : int
+            Ticket of the query.
+        group : hashable
+            Group of the query.
+
+        Returns
+        -------
+        boolean
+            `True` if the query has been cancelled, `False` otherwise.
+
+        """
+        with self.lock:
+            return group is not None and \
+                self.latestTickets.get(group, None) != ticket
+
+    def _interruptGroup(self, group):
+        """Interrupt the running query if it belongs to the given group.
+
+        Should be called while holding the lock.
+
+        Parameters
+        ----------
+        group : hashable
+            Group of queries to interrupt.
+
+        """
+        if self.running and self.running[1] == group:
+            self.running[2].interrupt()
+
+    def submit(self, database, sql, params=None, group=None):
+        """Submit a query to be executed in the background.
+
+        Parameters
+        ----------
+        database : str
+            Path of the Spatialite database.
+        sql : str
+            Query to execute.
+        params : list, optional
+            Parameter values to use inside the query.
+        group : hashable, optional
+            Group of the query. Previous queries of the same group are
+            cancelled.
+
+        Returns
+        -------
+        int
+            Ticket of the query, used to identify its results.
+
+        """
+        with self.lock:
+            self.lastTicket += 1
+            ticket = self.lastTicket
+            if group is not None:
+                self.latestTickets[group] = ticket
+                self._interruptGroup(group)
+
+        self.queue.put((ticket, group, database, sql, params))
+        if not self.isRunning():
+            self.start()
+        return ticket
+
+    def cancel(self, group):
+        """Cancel all pending and running queries of the given group.
+
+        Parameters
+        ----------
+        group : hashable
+            Group of queries to cancel.
+
+        """
+        with self.lock:
+            self.latestTickets.pop(group, None)
+            self._interruptGroup(group)
+
+    def run(self):
+        """Execute the submitted queries until the executor is stopped."""
+        while True:
+            job = self.queue.get()
+            if job is None:
+                break
+
+            ticket, group, database, sql, params = job
+            if self._isCancelled(ticket, group):
+                continue
+
+            try:
+                conn = connectionPool.getConnection(database)
+                with self.lock:
+                    self.running = (ticket, group, conn)
+                if params:
+                    cursor = conn.execute(sql, params)
+                else:
+                    cursor = conn.execute(sql)
+                rows = cursor.fetchall()
+                cursor.close()
+            except sl.Error as e:
+                if not self._isCancelled(ticket, group):
+                    self.queryFailed.emit(ticket, str(e))
+                continue
+            finally:
+                with self.lock:
+                    self.running = None
+
+            if not self._isCancelled(ticket, group):
+                self.resultsReady.emit(ticket, rows)
+
+        connectionPool.closeThreadConnections()
+
+    def stop(self):
+        """Stop the executor, cancelling the running query.
+
+        Blocks until the thread has finished.
+        """
+        with self.lock:
+            self.latestTickets.clear()
+            if self.running:
+                self.running[2].interrupt()
+
+        if self.isRunning():
+            self.queue.put(None)
+            self.wait()
+
+
 class SpatialiteIterator(object):
     """Class to query a Spatialite layer through a direct db connection."""
 
+    # Maximum number of feature ids to request from the provider at once.
+    FID_CHUNK_SIZE = 500
+
+    # Default number of rows to fetch at once when streaming results.
+    FETCH_SIZE = 250
+
+    # Operators allowed in the conditions of buildSelect.
+    OPERATORS = ('=', '!=', '<>', '<', '<=', '>', '>=', 'LIKE', 'MATCH', 'IS',
+                 'IS NOT', 'IN')
+
     def __init__(self, layer):
         """Initialisation.
 
@@ -42,6 +404,47 @@ class SpatialiteIterator(object):
         self.layer = layer
         self.ds = QGisCore.QgsDataSourceURI(self.layer.source())
 
+    def iterRaw(self, sql, params=None, batchSize=None):
+        """Execute a SQL query and iterate over the raw results.
+
+        Rows are fetched from the database in batches, so only one batch is
+        kept in memory at any time. Call close() on the generator when
+        stopping before the end, to close the cursor immediately.
+
+        Parameters
+        ----------
+        sql : str
+            Query to execute.
+        params : list of str, optional
+            Parameter values to use inside the query.
+        batchSize : int, optional
+            Number of rows to fetch at once. Defaults to FETCH_SIZE.
+
+        Yields
+        ------
+        tuple
+            The next row of the results of the query.
+
+        """
+        conn = connectionPool.getConnection(self.ds.database())
+
+        if params:
+            cursor = conn.execute(sql, params)
+        else:
+            cursor = conn.execute(sql)
+
+        # the cursor is closed when the generator is closed, also when the
+        # caller stops iterating early
+        try:
+            while True:
+                rows = cursor.fetchmany(batchSize or self.FETCH_SIZE)
+                if not rows:
+                    break
+                for row in rows:
+                    yield row
+        finally:
+            cursor.close()
+
     def rawQuery(self, sql, params=None):
         """Execute a SQL query and return the raw results.
 
@@ -58,7 +461,7 @@ class SpatialiteIterator(object):
             All results of the query.
 
         """
-        conn = sl.connect(self.ds.database())
+        conn = connectionPool.getConnection(self.ds.database())
 
         if params:
             cursor = conn.execute(sql, params)
@@ -67,10 +470,112 @@ class SpatialiteIterator(object):
 
         r = cursor.fetchall()
         cursor.close()
-        conn.close()
         return r
 
-    def query(self, sql, attributes=None):
+    def rawQueryAsync(self, executor, sql, params=None, group=None):
+        """Execute a SQL query in the background.
+
+        The raw results are delivered by the resultsReady signal of the
+        executor.
+
+        Parameters
+        ----------
+        executor : SpatialiteQueryExecutor
+            Executor to run the query.
+        sql : str
+            Query to execute.
+        params : list of str, optional
+            Parameter values to use inside the query.
+        group : hashable, optional
+            Group of the query. Previous queries of the same group are
+            cancelled.
+
+        Returns
+        -------
+        int
+            Ticket of the query, used to identify its results.
+
+        """
+        return executor.submit(self.ds.database(), sql, params, group)
+
+    def _getFeatures(self, fids, attributes=None, geometry=True):
+        """Get the features with the given feature ids from the layer.
+
+        Fetches the features in as few requests as possible, the result is
+        in the same order as the given feature ids.
+
+        Parameters
+        ----------
+        fids : list of int
+            Feature ids of the features to get.
+        attributes : list, optional
+            Subset of attributes to include in the returned QgsFeature's.
+            Defaults to all attributes.
+        geometry : boolean, optional
+            Include the geometry in the returned QgsFeature's. Defaults to
+            `True`.
+
+        Returns
+        -------
+        list of QgsFeature
+            List of QgsFeatures with the given feature ids.
+
+        """
+        return getFeaturesByFids(self.layer, fids, attributes, geometry,
+                                 self.FID_CHUNK_SIZE)
+
+    def iterFeatures(self, sql, attributes=None, geometry=True,
+                     batchSize=None, params=None):
+        """Execute a SQL query and iterate over the results as QGis Features.
+
+        The feature ids returned by the query are read in batches, and the
+        features of each batch are fetched from the layer at once. Call
+        close() on the generator when stopping before the end, to close the
+        cursor immediately.
+
+        Parameters
+        ----------
+        sql : str
+            Query to execute, returning the feature ids as first column.
+        attributes : list, optional
+            Subset of attributes to include in the returned QgsFeature's.
+            Defaults to all attributes.
+        geometry : boolean, optional
+            Include the geometry in the returned QgsFeature's. Defaults to
+            `True`.
+        batchSize : int, optional
+            Number of features to fetch at once. Defaults to FETCH_SIZE.
+        params : list, optional
+            Parameter values to use inside the query.
+
+        Yields
+        ------
+        QgsFeature
+            The next QgsFeature matching the query, in the order returned by
+            the query.
+
+        """
+        batchSize = batchSize or self.FETCH_SIZE
+        rows = self.iterRaw(sql, params, batchSize)
+        try:
+            fids = []
+            for row in rows:
+                fids.append(row[0])
+                if len(fids) >= batchSize:
+                    for feature in self._getFeatures(fids, attributes,
+                                                     geometry):
+                        yield feature
+                    fids = []
+
+            if len(fids) > 0:
+                for feature in self._getFeatures(fids, attributes, geometry):
+                    yield feature
+        finally:
+            # close the cursor now when the caller stops iterating early,
+            # instead of holding the read lock until garbage collection
+            rows.close()
+
+    def query(self, sql, attributes=None, geometry=True, params=None):
         """Execute a SQL query and return the results as QGis Features.
 
         Parameters
@@ -80,29 +585,26 @@ class SpatialiteIterator(object):
         attributes : list, optional
             Subset of attributes to include in the returned QgsFeature's.
             Defaults to all attributes.
+        geometry : boolean, optional
+            Include the geometry in the returned QgsFeature's. Defaults to
+            `True`.
+        params : list, optional
+            Parameter values to use inside the query.
 
         Returns
         -------
         list of QgsFeature
-            List of QgsFeatures matching the query.
+            List of QgsFeatures matching the query, in the order returned by
+            the query.
 
         """
-        fids = [i[0] for i in self.rawQuery(sql)]
+        fids = [i[0] for i in self.rawQuery(sql, params)]
         if len(fids) < 1:
             return []
 
-        fr = QGisCore.QgsFeatureRequest()
-        fts = []
-        if attributes is not None:
-            fr.setSubsetOfAttributes(attributes)
-
-        for fid in fids:
-            fr.setFilterFid(fid)
-            fts.append(self.layer.getFeatures(fr).next())
+        return self._getFeatures(fids, attributes, geometry)
 
-        return fts
-
-    def queryExpression(self, expression, attributes=None):
+    def queryExpression(self, expression, attributes=None, geometry=True):
         """Execute an expression and return the results as QGis Features.
 
         Parameters
@@ -112,6 +614,9 @@ class SpatialiteIterator(object):
         attributes : list, optional
             Subset of attributes to include in the returned QgsFeature's.
             Defaults to all attributes.
+        geometry : boolean, optional
+            Include the geometry in the returned QgsFeature's. Defaults to
+            `True`.
 
         Returns
         -------
@@ -121,4 +626,256 @@ class SpatialiteIterator(object):
         """
         stmt = "SELECT ogc_fid FROM %s WHERE " % self.ds.table()
         stmt += expression
-        return self.query(stmt, attributes)
+        return self.query(stmt, attributes, geometry)
+
+    def _quoteIdentifier(self, name):
+        """Quote the given name to be used as an identifier in SQL.
+
+        Parameters
+        ----------
+        name : str
+            Name of a column or table.
+
+        Returns
+        -------
+        str
+            Quoted version of the name.
+
+        """
+        return '"%s"' % name.replace('"', '""')
+
+    def buildSelect(self, columns, where=None, orderBy=None, distinct=False,
+                    limit=None):
+        """Build a parameterised SELECT statement on the table of the layer.
+
+        Values are never formatted into the statement, so the SQL text only
+        depends on the structure of the query and the prepared statement can
+        be reused from the statement cache of the connection.
+
+        Parameters
+        ----------
+        columns : list of str
+            Names of the columns to select.
+        where : list of tuple, optional
+            Conditions that should all be true, as a list of tuples
+            (column, operator, value). Operator should be one of OPERATORS.
+            Use the value `None` with 'IS' or 'IS NOT' to test for NULL and a
+            list of values with 'IN'.
+        orderBy : list of str, optional
+            Names of the columns to sort the results by.
+        distinct : boolean, optional
+            Only return distinct rows. Defaults to `False`.
+        limit : int, optional
+            Maximum number of rows to return.
+
+        Returns
+        -------
+        (sql, params) : tuple
+            The SQL text of the statement and the list of parameter values to
+            use with it.
+
+        Raises
+        ------
+        ValueError
+            If one of the conditions uses an unknown operator.
+
+        """
+        params = []
+        sql = 'SELECT '
+        if distinct:
+            sql += 'DISTINCT '
+        sql += ', '.join([self._quoteIdentifier(c) for c in columns])
+        sql += ' FROM %s' % self._quoteIdentifier(self.ds.table())
+
+        if where:
+            conditions = []
+            for column, operator, value in where:
+                operator = operator.upper()
+                if operator not in self.OPERATORS:
+                    raise ValueError("Unknown operator: '%s'" % operator)
+
+                if operator in ('IS', 'IS NOT') and value is None:
+                    conditions.append('%s %s NULL' % (
+                        self._quoteIdentifier(column), operator))
+                elif operator == 'IN':
+                    conditions.append('%s IN (%s)' % (
+                        self._quoteIdentifier(column),
+                        ', '.join(['?'] * len(value))))
+                    params.extend(value)
+                else:
+                    conditions.append('%s %s ?' % (
+                        self._quoteIdentifier(column), operator))
+                    params.append(value)
+            sql += ' WHERE ' + ' AND '.join(conditions)
+
+        if orderBy:
+            sql += ' ORDER BY ' + ', '.join(
+                [self._quoteIdentifier(c) for c in orderBy])
+
+        if limit is not None:
+            sql += ' LIMIT ?'
+            params.append(limit)
+
+        return (sql, params)
+
+    def select(self, columns, where=None, orderBy=None, distinct=False,
+               limit=None):
+        """Select columns from the table of the layer and return raw results.
+
+        See buildSelect for a description of the parameters.
+
+        Returns
+        -------
+        results : iterable
+            All results of the query.
+
+        """
+        sql, params = self.buildSelect(columns, where, orderBy, distinct,
+                                       limit)
+        return self.rawQuery(sql, params)
+
+    def queryWhere(self, where, attributes=None, geometry=True, orderBy=None):
+        """Query the layer with the given conditions and return QGis Features.
+
+        Parameters
+        ----------
+        where : list of tuple
+            Conditions that should all be true, as a list of tuples
+            (column, operator, value). See buildSelect.
+        attributes : list, optional
+            Subset of attributes to include in the returned QgsFeature's.
+            Defaults to all attributes.
+        geometry : boolean, optional
+            Include the geometry in the returned QgsFeature's. Defaults to
+            `True`.
+        orderBy : list of str, optional
+            Names of the columns to sort the results by.
+
+        Returns
+        -------
+        list of QgsFeature
+            List of QgsFeatures matching the conditions.
+
+        """
+        sql, params = self.buildSelect(['ogc_fid'], where, orderBy)
+        return self.query(sql, attributes, geometry, params)
+
+
+class CoordinateTransformCache(object):
+    """Cache of coordinate transformations, by source and destination CRS.
+
+    Coordinate reference systems can be given as EPSG code or as
+    QGisCore.QgsCoordinateReferenceSystem.
+    """
+
+    def __init__(self):
+        """Initialisation."""
+        self.epsg = {}
+        self.crs = {}
+        self.transforms = {}
+
+    def _getCrs(self, crs):
+        """Get the key and the coordinate reference system.
+
+        The key is the PROJ.4 definition of the coordinate reference system.
+        Its authority identifier can not be used, since that is empty for
+        custom coordinate reference systems, or can be the same for
+        different ones.
+
+        Parameters
+        ----------
+        crs : int or QGisCore.QgsCoordinateReferenceSystem
+            EPSG code or coordinate reference system.
+
+        Returns
+        -------
+        tuple
+            Tuple of the key of the coordinate reference system and the
+            QgsCoordinateReferenceSystem.
+
+        """
+        if isinstance(crs, QGisCore.QgsCoordinateReferenceSystem):
+            key = crs.toProj4()
+            if key not in self.crs:
+                self.crs[key] = QGisCore.QgsCoordinateReferenceSystem(crs)
+        else:
+            if crs not in self.epsg:
+                self.epsg[crs] = QGisCore.QgsCoordinateReferenceSystem(
+                    crs, QGisCore.QgsCoordinateReferenceSystem.EpsgCrsId)
+            key = self.epsg[crs].toProj4()
+            if key not in self.crs:
+                self.crs[key] = self.epsg[crs]
+        return key, self.crs[key]
+
+    def getTransform(self, source, destination):
+        """Get the transformation between the coordinate reference systems.
+
+        Parameters
+        ----------
+        source : int or QGisCore.QgsCoordinateReferenceSystem
+            Source EPSG code or coordinate reference system.
+        destination : int or QGisCore.QgsCoordinateReferenceSystem
+            Destination EPSG code or coordinate reference system.
+
+        Returns
+        -------
+        QGisCore.QgsCoordinateTransform
+            The (shared) transformation from source to destination.
+
+        """
+        sourceKey, sourceCrs = self._getCrs(source)
+        destinationKey, destinationCrs = self._getCrs(destination)
+        key = (sourceKey, destinationKey)
+        if key not in self.transforms:
+            self.transforms[key] = QGisCore.QgsCoordinateTransform(
+                sourceCrs, destinationCrs)
+        return self.transforms[key]
+
+    def transformPoint(self, source, destination, point):
+        """Transform a point between the coordinate reference systems.
+
+        Parameters
+        ----------
+        source : int or QGisCore.QgsCoordinateReferenceSystem
+            Source EPSG code or coordinate reference system.
+        destination : int or QGisCore.QgsCoordinateReferenceSystem
+            Destination EPSG code or coordinate reference system.
+        point : QGisCore.QgsPoint
+            Point in the source coordinate reference system.
+
+        Returns
+        -------
+        QGisCore.QgsPoint
+            The point in the destination coordinate reference system.
+
+        """
+        return self.getTransform(source, destination).transform(point)
+
+    def transformPoints(self, source, destination, points):
+        """Transform many points between the coordinate reference systems.
+
+        All points are transformed at once, as a single multipoint geometry.
+
+        Parameters
+        ----------
+        source : int or QGisCore.QgsCoordinateReferenceSystem
+            Source EPSG code or coordinate reference system.
+        destination : int or QGisCore.QgsCoordinateReferenceSystem
+            Destination EPSG code or coordinate reference system.
+        points : list of QGisCore.QgsPoint
+            Points in the source coordinate reference system.
+
+        Returns
+        -------
+        list of QGisCore.QgsPoint
+            The points in the destination coordinate reference system, in
+            the same order.
+
+        """
+        if len(points) < 1:
+            return []
+
+        geometry = QGisCore.QgsGeometry.fromMultiPoint(
+            [QGisCore.QgsPoint(p) for p in points])
+        geometry.transform(self.getTransform(source, destination))
+        return geometry.asMultiPoint()
@@ -0,0 +1,334 @@
+# -*- coding: utf-8 -*-
+"""Module for an in-memory cache of decoded raster blocks.
+
+Contains the function blockToArray and the RasterBlockCache class.
+"""
+
+#  DOV Erosiebezwaren, QGis plugin to assess field erosion on tablets
+#  Copyright (C) 2015-2017  Roel Huybrechts
+#
+#  This program is free software; you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation; either version 2 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License along
+#  with this program; if not, write to the Free Software Foundation, Inc.,
+#  51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+
+import PyQt4.QtCore as QtCore
+import qgis.core as QGisCore
+
+import math
+from collections import OrderedDict
+
+import numpy as np
+
+
+def blockToArray(block, width, height):
+    """Get the values of a raster block as a NumPy array.
+
+    Uses the raw data of the block if possible, otherwise falls back to
+    reading the values one by one.
+
+    Parameters
+    ----------
+    block : QGisCore.QgsRasterBlock
+        Raster block to convert.
+    width : int
+        Number of columns of the block.
+    height : int
+        Number of rows of the block.
+
+    Returns
+    -------
+    numpy.ndarray
+        Array of shape (height, width) with the cell values. The first row
+        is the top row.
+
+    """
+    dataTypes = {
+        QGisCore.QGis.Byte: np.uint8,
+        QGisCore.QGis.UInt16: np.uint16,
+        QGisCore.QGis.Int16: np.int16,
+        QGisCore.QGis.UInt32: np.uint32,
+        QGisCore.QGis.Int32: np.int32,
+        QGisCore.QGis.Float32: np.float32,
+        QGisCore.QGis.Float64: np.float64
+    }
+
+    try:
+        values = np.frombuffer(bytes(block.data()),
+                               dtype=dataTypes[block.dataType()])
+        return values.reshape((height, width)).astype(np.float64)
+    except (AttributeError, KeyError, TypeError, ValueError):
+        return np.array([[block.value(r, c) for c in range(width)]
+                         for r in range(height)], dtype=np.float64)
+
+
+class RasterBlockCache(QtCore.QObject):
+    """Least recently used cache of decoded raster tiles.
+
+    Raster layers are divided in square tiles aligned to the grid of the
+    layer, starting at its top left corner. Tiles are cached by layer, band,
+    level and tile index. Level 0 is the native resolution of the layer,
+    every next level halves the resolution.
+
+    The total size of the cached tiles is kept below the memory budget from
+    the setting 'cache/rasterMemory', the size of the tiles (in cells) is
+    read from 'cache/rasterTileSize'.
+    """
+
+    def __init__(self, main):
+        """Initialisation.
+
+        Parameters
+        ----------
+        main : erosiebezwaren.Erosiebezwaren
+            Instance of main class.
+
+        """
+        QtCore.QObject.__init__(self)
+        self.main = main
+        self.maxSize = self.main.settings.getValue('cache/rasterMemory')
+        self.tileSize = self.main.settings.getValue('cache/rasterTileSize')
+
+        self.tiles = OrderedDict()
+        self.layers = {}
+        self.size = 0
+
+    def _watchLayer(self, layer):
+        """Forget the tiles of the layer when its data changes or is removed.
+
+        Parameters
+        ----------
+        layer : QGisCore.QgsRasterLayer
+            Layer to watch.
+
+        """
+        if layer.id() in self.layers:
+            return
+
+        layerId = layer.id()
+        self.layers[layerId] = layer
+        QtCore.QObject.connect(layer, QtCore.SIGNAL('dataChanged()'),
+                               lambda: self._invalidateLayerId(layerId))
+        QtCore.QObject.connect(layer, QtCore.SIGNAL('layerDeleted()'),
+                               lambda: self._forgetLayer(layerId))
+
+    def _forgetLayer(self, layerId):
+        """Remove everything about the deleted layer from the cache.
+
+        Parameters
+        ----------
+        layerId : str
+            Id of the layer.
+
+        """
+        self._invalidateLayerId(layerId)
+        if layerId in self.layers:
+            del(self.layers[layerId])
+
+    def _getTile(self, layer, band, level, tileX, tileY):
+        """Get the values of a tile, reading it from the layer if needed.
+
+        Parameters
+        ----------
+        layer : QGisCore.QgsRasterLayer
+            Layer of the tile.
+        band : int
+            Band of the layer.
+        level : int
+            Level of the tile.
+        tileX : int
+            Column index of the tile.
+        tileY : int
+            Row index of the tile.
+
+        Returns
+        -------
+        numpy.ndarray
+            Array of shape (tileSize, tileSize) with the cell values.
+
+        """
+        key = (layer.id(), band, level, tileX, tileY)
+        values = self.tiles.pop(key, None)
+        if values is not None:
+            self.tiles[key] = values
+            return values
+
+        self._watchLayer(layer)
+        extent = layer.extent()
+        sizeX = layer.rasterUnitsPerPixelX() * 2**level * self.tileSize
+        sizeY = layer.rasterUnitsPerPixelY() * 2**level * self.tileSize
+        rect = QGisCore.QgsRectangle(
+            extent.xMinimum() + tileX*sizeX,
+            extent.yMaximum() - (tileY+1)*sizeY,
+            extent.xMinimum() + (tileX+1)*sizeX,
+            extent.yMaximum() - tileY*sizeY)
+
+        block = layer.dataProvider().block(band, rect, self.tileSize,
+                                           self.tileSize)
+        values = blockToArray(block, self.tileSize, self.tileSize)
+
+        self.tiles[key] = values
+        self.size += values.nbytes
+        while self.size > self.maxSize and len(self.tiles) > 1:
+            self.size -= self.tiles.popitem(last=False)[1].nbytes
+        return values
+
+    def _getCells(self, layer, band, level, column, row, width, height):
+        """Get the values of a range of cells, combining the cached tiles.
+
+        Parameters
+        ----------
+        layer : QGisCore.QgsRasterLayer
+            Layer to get the values of.
+        band : int
+            Band of the layer.
+        level : int
+            Level to get the values of.
+        column : int
+            Column of the top left cell, relative to the top left corner of
+            the layer.
+        row : int
+            Row of the top left cell, relative to the top left corner of the
+            layer.
+        width : int
+            Number of columns.
+        height : int
+            Number of rows.
+
+        Returns
+        -------
+        numpy.ndarray
+            Array of shape (height, width) with the cell values.
+
+        """
+        size = self.tileSize
+        values = np.empty((height, width), dtype=np.float64)
+        for tileY in range(row // size, (row+height-1) // size + 1):
+            for tileX in range(column // size, (column+width-1) // size + 1):
+                tile = self._getTile(layer, band, level, tileX, tileY)
+                r0 = max(row, tileY*size)
+                r1 = min(row+height, (tileY+1)*size)
+                c0 = max(column, tileX*size)
+                c1 = min(column+width, (tileX+1)*size)
+                values[r0-row:r1-row, c0-column:c1-column] = tile[
+                    r0-tileY*size:r1-tileY*size, c0-tileX*size:c1-tileX*size]
+        return values
+
+    def getValues(self, layer, band, rect, width, height):
+        """Get the values of the cells of the rectangle.
+
+        Replaces reading a block from the data provider of the layer.
+
+        Parameters
+        ----------
+        layer : QGisCore.QgsRasterLayer
+            Layer to get the values of.
+        band : int
+            Band of the layer.
+        rect : QGisCore.QgsRectangle
+            Rectangle to get the values of, aligned to the grid of the layer.
+        width : int
+            Number of columns of the rectangle.
+        height : int
+            Number of rows of the rectangle.
+
+        Returns
+        -------
+        numpy.ndarray
+            Array of shape (height, width) with the cell values. The first
+            row is the top row.
+
+        """
+        extent = layer.extent()
+        column = int(round((rect.xMinimum() - extent.xMinimum()) /
+                           layer.rasterUnitsPerPixelX()))
+        row = int(round((extent.yMaximum() - rect.yMaximum()) /
+                        layer.rasterUnitsPerPixelY()))
+        return self._getCells(layer, band, 0, column, row, width, height)
+
+    def getOverview(self, layer, band, rect, maxCells=64):
+        """Get the values of the rectangle at a reduced resolution.
+
+        Uses the first level at which the rectangle is at most the given
+        number of cells wide and high, limited to the extent of the layer.
+
+        Parameters
+        ----------
+        layer : QGisCore.QgsRasterLayer
+            Layer to get the values of.
+        band : int
+            Band of the layer.
+        rect : QGisCore.QgsRectangle
+            Rectangle to get the values of.
+        maxCells : int, optional
+            Maximum number of columns and rows. Defaults to 64.
+
+        Returns
+        -------
+        numpy.ndarray or None
+            Array with the cell values, or `None` if the rectangle does not
+            intersect with the layer.
+
+        """
+        extent = layer.extent()
+        pixelSizeX = layer.rasterUnitsPerPixelX()
+        pixelSizeY = layer.rasterUnitsPerPixelY()
+
+        cells = max(rect.width() / pixelSizeX, rect.height() / pixelSizeY)
+        level = 0
+        if cells > maxCells:
+            level = int(math.ceil(math.log(cells / maxCells, 2)))
+        sizeX = pixelSizeX * 2**level
+        sizeY = pixelSizeY * 2**level
+
+        columns = int(math.ceil(layer.width() / 2.0**level))
+        rows = int(math.ceil(layer.height() / 2.0**level))
+        c0 = max(0, int(math.floor(
+            (rect.xMinimum() - extent.xMinimum()) / sizeX)))
+        c1 = min(columns, int(math.ceil(
+            (rect.xMaximum() - extent.xMinimum()) / sizeX)))
+        r0 = max(0, int(math.floor(
+            (extent.yMaximum() - rect.yMaximum()) / sizeY)))
+        r1 = min(rows, int(math.ceil(
+            (extent.yMaximum() - rect.yMinimum()) / sizeY)))
+
+        if c1 <= c0 or r1 <= r0:
+            return None
+        return self._getCells(layer, band, level, c0, r0, c1-c0, r1-r0)
+
+    def invalidateLayer(self, layer):
+        """Remove all tiles of the layer from the cache.
+
+        Parameters
+        ----------
+        layer : QGisCore.QgsRasterLayer
+            Layer of the tiles.
+
+        """
+        self._invalidateLayerId(layer.id())
+
+    def _invalidateLayerId(self, layerId):
+        """Remove all tiles of the layer with the given id from the cache.
+
+        Parameters
+        ----------
+        layerId : str
+            Id of the layer.
+
+        """
+        for key in [k for k in self.tiles if k[0] == layerId]:
+            self.size -= self.tiles.pop(key).nbytes
+
+    def clear(self):
+        """Remove all tiles from the cache."""
+        self.tiles.clear()
+        self.size = 0
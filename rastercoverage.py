@@ -0,0 +1,536 @@
+# -*- coding: utf-8 -*-
+"""Module to calculate the coverage of raster cells by polygons.
+
+Contains functions working on NumPy arrays, independent of QGis, to
+calculate the coverage of raster cells by polygons and to convert a mask of
+raster cells back to polygons.
+"""
+
+#  DOV Erosiebezwaren, QGis plugin to assess field erosion on tablets
+#  Copyright (C) 2015-2017  Roel Huybrechts
+#
+#  This program is free software; you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation; either version 2 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License along
+#  with this program; if not, write to the Free Software Foundation, Inc.,
+#  51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+
+import numpy as np
+
+
+def _signedArea(ring):
+    """Calculate the signed area of a ring.
+
+    Parameters
+    ----------
+    ring : numpy.ndarray
+        Array of shape (n, 2) with the coordinates of the ring.
+
+    Returns
+    -------
+    float
+        Area of the ring, positive if the ring is counterclockwise and
+        negative if it is clockwise.
+
+    """
+    x = ring[:, 0]
+    y = ring[:, 1]
+    return 0.5 * (np.dot(x, np.roll(y, -1)) - np.dot(np.roll(x, -1), y))
+
+
+def _getEdges(polygons):
+    """Get the edges of the polygons, with normalised orientation.
+
+    Exterior rings are made counterclockwise and interior rings (holes)
+    clockwise.
+
+    Parameters
+    ----------
+    polygons : list of list of numpy.ndarray
+        List of polygons, which are lists of rings. The first ring is the
+        exterior ring, the others are holes. Rings are arrays of shape (n, 2).
+
+    Returns
+    -------
+    tuple of numpy.ndarray
+        Arrays with the x and y coordinates of the start and end points of
+        the edges.
+
+    """
+    starts = []
+    ends = []
+    for polygon in polygons:
+        for i, ring in enumerate(polygon):
+            ring = np.asarray(ring, dtype=np.float64)
+            if len(ring) < 3:
+                continue
+            area = _signedArea(ring)
+            if (i == 0 and area < 0) or (i > 0 and area > 0):
+                ring = ring[::-1]
+            starts.append(ring)
+            ends.append(np.roll(ring, -1, axis=0))
+
+    if len(starts) < 1:
+        empty = np.zeros(0)
+        return empty, empty, empty, empty
+
+    starts = np.concatenate(starts)
+    ends = np.concatenate(ends)
+    return starts[:, 0], starts[:, 1], ends[:, 0], ends[:, 1]
+
+
+def _integral(s):
+    """Integrate the function clamp(t, 0, 1) from minus infinity to s.
+
+    Parameters
+    ----------
+    s : numpy.ndarray
+        Upper bounds of the integral.
+
+    Returns
+    -------
+    numpy.ndarray
+        Values of the integral.
+
+    """
+    return np.where(s <= 0, 0.0,
+                    np.where(s < 1, 0.5 * s * s, s - 0.5))
+
+
+def cellCoverage(polygons, xMin, yMin, pixelSizeX, pixelSizeY, width,
+                 height):
+    """Calculate the fraction of every raster cell covered by the polygons.
+
+    The coverage is exact: for every edge piece within a column of cells the
+    area between the edge and the bottom of every cell is integrated
+    analytically (Green's theorem), cells below the piece get the full width
+    of the piece.
+
+    Parameters
+    ----------
+    polygons : list of list of numpy.ndarray
+        List of polygons, which are lists of rings. The first ring is the
+        exterior ring, the others are holes. Rings are arrays of shape (n, 2)
+        with map coordinates. Polygons should not overlap.
+    xMin : float
+        Minimum x coordinate of the raster block.
+    yMin : float
+        Minimum y coordinate of the raster block.
+    pixelSizeX : float
+        Width of a raster cell.
+    pixelSizeY : float
+        Height of a raster cell.
+    width : int
+        Number of columns of the raster block.
+    height : int
+        Number of rows of the raster block.
+
+    Returns
+    -------
+    numpy.ndarray
+        Array of shape (height, width) with the covered fraction of every
+        cell, the first row being the top row of the block.
+
+    """
+    coverage = np.zeros((height, width))
+    full = np.zeros((height + 1, width))
+
+    x0, y0, x1, y1 = _getEdges(polygons)
+
+    # to pixel units, relative to the bottom left corner of the block
+    x0 = (x0 - xMin) / pixelSizeX
+    x1 = (x1 - xMin) / pixelSizeX
+    y0 = (y0 - yMin) / pixelSizeY
+    y1 = (y1 - yMin) / pixelSizeY
+
+    # vertical edges do not contribute
+    keep = x0 != x1
+    x0, y0, x1, y1 = x0[keep], y0[keep], x1[keep], y1[keep]
+    if len(x0) < 1:
+        return coverage
+
+    # integrate from left to right, remember the direction
+    sign = np.where(x1 > x0, -1.0, 1.0)
+    left = x1 > x0
+    xl = np.where(left, x0, x1)
+    xr = np.where(left, x1, x0)
+    yl = np.where(left, y0, y1)
+    yr = np.where(left, y1, y0)
+    slope = (yr - yl) / (xr - xl)
+
+    # split the edges in pieces per column
+    firstColumn = np.floor(xl).astype(np.int64)
+    pieces = np.maximum(np.ceil(xr).astype(np.int64) - firstColumn, 1)
+    edge = np.repeat(np.arange(len(xl)), pieces)
+    column = firstColumn[edge] + (
+        np.arange(len(edge)) - np.repeat(np.cumsum(pieces) - pieces, pieces))
+
+    px0 = np.maximum(xl[edge], column)
+    px1 = np.minimum(xr[edge], column + 1)
+    py0 = yl[edge] + slope[edge] * (px0 - xl[edge])
+    py1 = yl[edge] + slope[edge] * (px1 - xl[edge])
+    w = (px1 - px0) * sign[edge]
+
+    inside = (column >= 0) & (column < width) & (px1 > px0)
+    column, py0, py1, w = column[inside], py0[inside], py1[inside], w[inside]
+
+    # cells below the piece are covered for the full width of the piece
+    rowLow = np.floor(np.minimum(py0, py1)).astype(np.int64)
+    rowHigh = np.floor(np.maximum(py0, py1)).astype(np.int64)
+    np.add.at(full, (np.clip(rowLow, 0, height), column), w)
+
+    # cells crossed by the piece are covered partially
+    first = np.maximum(rowLow, 0)
+    last = np.minimum(rowHigh, height - 1)
+    rows = np.maximum(last - first + 1, 0)
+    piece = np.repeat(np.arange(len(column)), rows)
+    row = first[piece] + (
+        np.arange(len(piece)) - np.repeat(np.cumsum(rows) - rows, rows))
+
+    a = py0[piece] - row
+    b = py1[piece] - row
+    flat = a == b
+    dy = np.where(flat, 1.0, b - a)
+    partial = np.where(flat, np.clip(a, 0, 1),
+                       (_integral(b) - _integral(a)) / dy)
+    np.add.at(coverage, (row, column[piece]), w[piece] * partial)
+
+    # add the full contributions of the pieces above every cell
+    coverage += np.cumsum(full[::-1], axis=0)[::-1][1:]
+
+    # first row is the top row
+    return coverage[::-1]
+
+
+def matchingCells(polygons, xMin, yMin, pixelSizeX, pixelSizeY, width,
+                  height, fraction=0.5):
+    """Get the raster cells that are covered enough by the polygons.
+
+    Parameters
+    ----------
+    polygons : list of list of numpy.ndarray
+        List of polygons, see cellCoverage.
+    xMin : float
+        Minimum x coordinate of the raster block.
+    yMin : float
+        Minimum y coordinate of the raster block.
+    pixelSizeX : float
+        Width of a raster cell.
+    pixelSizeY : float
+        Height of a raster cell.
+    width : int
+        Number of columns of the raster block.
+    height : int
+        Number of rows of the raster block.
+    fraction : float, optional
+        Minimal fraction of the area of a cell that should be covered.
+        Defaults to 0.5.
+
+    Returns
+    -------
+    numpy.ndarray
+        Boolean array of shape (height, width), `True` for the cells covered
+        by at least the given fraction. The first row is the top row.
+
+    """
+    coverage = cellCoverage(polygons, xMin, yMin, pixelSizeX, pixelSizeY,
+                            width, height)
+    return coverage >= fraction - 1e-9
+
+
+def blockStats(values, mask, noData=None):
+    """Calculate the statistics of the values of the selected cells.
+
+    Parameters
+    ----------
+    values : numpy.ndarray
+        Values of the raster cells.
+    mask : numpy.ndarray
+        Boolean array of the same shape, `True` for the selected cells.
+    noData : float, optional
+        Cells having this value are not selected.
+
+    Returns
+    -------
+    tuple
+        Tuple of the updated mask, without the cells containing noData, and
+        a dictionary with the 'sum', 'count' and 'avg' of the values. The
+        dictionary is empty if there are no cells left.
+
+    """
+    if noData:
+        mask = mask & (values != noData)
+
+    stats = {}
+    count = int(np.count_nonzero(mask))
+    if count > 0:
+        total = float(values[mask].sum())
+        stats['sum'] = total
+        stats['count'] = count
+        stats['avg'] = total / count
+    return mask, stats
+
+
+def parcelStats(task):
+    """Calculate the statistics of the cells covered by a parcel.
+
+    Applies the same rules as pixelmeasure.RasterBlockWrapper: a cell is
+    selected if at least half of its area is covered. Only uses picklable
+    arguments, to be used as the function of a multiprocessing pool.
+
+    Parameters
+    ----------
+    task : tuple
+        Tuple of the key of the task, the polygons of the parcel (see
+        cellCoverage), the values of the raster block (first row is the top
+        row), the minimum x and y coordinates of the block, the width and
+        height of a raster cell and the noData value (or `None`).
+
+    Returns
+    -------
+    tuple
+        Tuple of the key of the task and the dictionary of statistics, see
+        blockStats.
+
+    """
+    key, polygons, values, xMin, yMin, pixelSizeX, pixelSizeY, noData = task
+    height, width = values.shape
+    mask = matchingCells(polygons, xMin, yMin, pixelSizeX, pixelSizeY, width,
+                         height, 0.5)
+    mask, stats = blockStats(values, mask, noData)
+    return key, stats
+
+
+def _labelCells(mask):
+    """Label the groups of selected cells connected by their edges.
+
+    Parameters
+    ----------
+    mask : numpy.ndarray
+        Boolean array, `True` for the selected cells.
+
+    Returns
+    -------
+    numpy.ndarray
+        Integer array of the same shape, with the same positive label for
+        all cells of a group and 0 for cells that are not selected.
+
+    """
+    height, width = mask.shape
+    labels = np.zeros(mask.shape, dtype=np.int32)
+    label = 0
+    for i, j in zip(*np.nonzero(mask)):
+        if labels[i, j] != 0:
+            continue
+        label += 1
+        labels[i, j] = label
+        stack = [(i, j)]
+        while len(stack) > 0:
+            i, j = stack.pop()
+            for n, m in ((i-1, j), (i+1, j), (i, j-1), (i, j+1)):
+                if 0 <= n < height and 0 <= m < width and mask[n, m] and \
+                        labels[n, m] == 0:
+                    labels[n, m] = label
+                    stack.append((n, m))
+    return labels
+
+
+def _traceRings(mask):
+    """Trace the boundaries of the selected cells of the mask.
+
+    Boundary edges are directed with the selected cells on their left, so
+    outer boundaries are counterclockwise and boundaries of holes clockwise.
+
+    When two boundaries touch in a corner, the turn depends on the two
+    selected cells touching diagonally in that corner. If they are part of
+    the same (edge connected) group of cells, the boundary turns right: the
+    hole closes off as its own ring, touching the outer boundary or another
+    hole in a single point. Otherwise it turns left, keeping the cells in
+    separate rings. This way no ring touches itself, as required for valid
+    polygons.
+
+    Parameters
+    ----------
+    mask : numpy.ndarray
+        Boolean array, `True` for the selected cells. The first row is the
+        top row.
+
+    Returns
+    -------
+    list of list of tuple
+        Rings as lists of (column, row) vertices, with rows counted upwards
+        from the bottom of the mask. Only vertices where the direction
+        changes are included and rings are not closed.
+
+    """
+    height, width = mask.shape
+    padded = np.zeros((height + 2, width + 2), dtype=bool)
+    padded[1:-1, 1:-1] = mask
+    inner = padded[1:-1, 1:-1]
+
+    outgoing = {}
+
+    def addEdges(selection, startColumn, startRow, direction):
+        rows, columns = np.nonzero(selection)
+        for c, r in zip((columns + startColumn).tolist(),
+                        (height - rows + startRow).tolist()):
+            outgoing.setdefault((c, r), []).append(direction)
+
+    # bottom, right, top and left edges, with the cells on the left
+    addEdges(inner & ~padded[2:, 1:-1], 0, -1, (1, 0))
+    addEdges(inner & ~padded[1:-1, 2:], 1, -1, (0, 1))
+    addEdges(inner & ~padded[:-2, 1:-1], 1, 0, (-1, 0))
+    addEdges(inner & ~padded[1:-1, :-2], 0, 0, (0, -1))
+
+    # corners where two boundaries touch, turning right at those where the
+    # diagonal selected cells are connected
+    rightTurns = set()
+    pinches = [v for v in outgoing if len(outgoing[v]) > 1]
+    if len(pinches) > 0:
+        labels = _labelCells(padded)
+        for c, r in pinches:
+            # padded row and column of the cell to the upper right
+            i = height - r
+            j = c + 1
+            if padded[i, j]:
+                cells = (labels[i, j], labels[i + 1, j - 1])
+            else:
+                cells = (labels[i, j - 1], labels[i + 1, j])
+            if cells[0] == cells[1]:
+                rightTurns.add((c, r))
+
+    def turns(vertex, d):
+        left = (-d[1], d[0])
+        right = (d[1], -d[0])
+        if vertex in rightTurns:
+            return (right, d, left)
+        return (left, d, right)
+
+    rings = []
+    while len(outgoing) > 0:
+        start = next(iter(outgoing))
+        startDirection = outgoing[start].pop()
+        if len(outgoing[start]) < 1:
+            del(outgoing[start])
+
+        ring = []
+        vertex = start
+        direction = startDirection
+        while True:
+            vertex = (vertex[0] + direction[0], vertex[1] + direction[1])
+            candidates = outgoing.get(vertex, [])
+            if vertex == start:
+                candidates = candidates + [startDirection]
+
+            for d in turns(vertex, direction):
+                if d in candidates:
+                    break
+
+            if vertex == start and d == startDirection:
+                if d != direction:
+                    ring.append(vertex)
+                break
+
+            outgoing[vertex].remove(d)
+            if len(outgoing[vertex]) < 1:
+                del(outgoing[vertex])
+            if d != direction:
+                ring.append(vertex)
+            direction = d
+
+        rings.append(ring)
+    return rings
+
+
+def _containsPoint(ring, x, y):
+    """Check if the ring contains the given point, using ray casting.
+
+    Parameters
+    ----------
+    ring : numpy.ndarray
+        Array of shape (n, 2) with the vertices of the ring, not closed.
+    x : float
+        X coordinate of the point.
+    y : float
+        Y coordinate of the point.
+
+    Returns
+    -------
+    boolean
+        `True` if the point is inside the ring, `False` otherwise. The result
+        is undefined for points on the ring.
+
+    """
+    x0 = ring[:, 0]
+    y0 = ring[:, 1]
+    x1 = np.roll(x0, -1)
+    y1 = np.roll(y0, -1)
+    crosses = (y0 > y) != (y1 > y)
+    xCross = x0[crosses] + (y - y0[crosses]) * (
+        x1[crosses] - x0[crosses]) / (y1[crosses] - y0[crosses])
+    return np.count_nonzero(xCross > x) % 2 == 1
+
+
+def maskToPolygons(mask, xMin, yMin, pixelSizeX, pixelSizeY):
+    """Get the polygons covering the selected cells of the mask.
+
+    Parameters
+    ----------
+    mask : numpy.ndarray
+        Boolean array, `True` for the selected cells. The first row is the
+        top row.
+    xMin : float
+        Minimum x coordinate of the raster block.
+    yMin : float
+        Minimum y coordinate of the raster block.
+    pixelSizeX : float
+        Width of a raster cell.
+    pixelSizeY : float
+        Height of a raster cell.
+
+    Returns
+    -------
+    list of list of numpy.ndarray
+        List of polygons, which are lists of closed rings in map coordinates.
+        The first ring of a polygon is its exterior ring, the others are its
+        holes.
+
+    """
+    exteriors = []
+    holes = []
+    for ring in _traceRings(mask):
+        ring = np.array(ring, dtype=np.float64)
+        if _signedArea(ring) > 0:
+            exteriors.append(ring)
+        else:
+            holes.append(ring)
+
+    areas = [_signedArea(r) for r in exteriors]
+    polygons = [[r] for r in exteriors]
+    for hole in holes:
+        # center of a selected cell next to the first edge of the hole
+        d = hole[1] - hole[0]
+        d /= np.abs(d).sum()
+        x = hole[0][0] + 0.5 * d[0] - 0.5 * d[1]
+        y = hole[0][1] + 0.5 * d[1] + 0.5 * d[0]
+
+        containing = [i for i in range(len(exteriors)) if
+                      _containsPoint(exteriors[i], x, y)]
+        if len(containing) > 0:
+            i = min(containing, key=lambda i: areas[i])
+            polygons[i].append(hole)
+
+    def toMap(ring):
+        ring = np.vstack((ring, ring[:1]))
+        return np.column_stack((xMin + ring[:, 0] * pixelSizeX,
+                                yMin + ring[:, 1] * pixelSizeY))
+
+    return [[toMap(r) for r in polygon] for polygon in polygons]
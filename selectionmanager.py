@@ -26,7 +26,8 @@ class SelectionManager(object):
     """Class to manage selection of features or geometries.
 
     Copies to geometry (of features) to a seperate layer to make them stand
-    out on the map.
+    out on the map. Keeps track of the ids of the features in this layer per
+    selection mode, to be able to clear them without scanning the layer.
     """
 
     def __init__(self, main, tempLayerName):
@@ -45,6 +46,9 @@ class SelectionManager(object):
         self.utils = self.main.utils
         self.layerName = tempLayerName
         self.layer = None
+        self.fields = None
+        self.modeFids = {}
+        self.addingMode = None
         self.__getLayer()
 
     def __getLayer(self):
@@ -64,8 +68,94 @@ class SelectionManager(object):
                     'label', QtCore.QVariant.String, 'string', 1, 0))
                 self.layer.commitChanges()
                 self.layer.endEditCommand()
+
+                QtCore.QObject.connect(
+                    self.layer, QtCore.SIGNAL('featureAdded(QgsFeatureId)'),
+                    self._featureAdded)
+                QtCore.QObject.connect(
+                    self.layer, QtCore.SIGNAL('featureDeleted(QgsFeatureId)'),
+                    self._featureDeleted)
+                QtCore.QObject.connect(
+                    self.layer, QtCore.SIGNAL('editingStopped()'),
+                    self._indexModes)
+                self._indexModes()
         return self.layer
 
+    def _indexModes(self):
+        """Rebuild the feature ids per mode from the features of the layer.
+
+        Needed after committing the changes, since this assigns new ids to
+        the added features. Listener for the editingStopped signal of the
+        layer, so it also runs when the changes are committed outside of
+        this selectionmanager, f.ex. when saving the edits or the project.
+        """
+        self.modeFids = {}
+        request = QGisCore.QgsFeatureRequest()
+        request.setFlags(QGisCore.QgsFeatureRequest.NoGeometry)
+        request.setSubsetOfAttributes(['mode'], self.layer.pendingFields())
+        for feature in self.layer.getFeatures(request):
+            self.modeFids.setdefault(feature.attribute('mode'), set()).add(
+                feature.id())
+
+    def _featureAdded(self, fid):
+        """Keep track of the id of an added feature.
+
+        Listener for the featureAdded signal of the layer. Features added by
+        this selectionmanager have the current addingMode, the mode of other
+        features (f.ex. re-added by undo) is read from the layer.
+
+        Parameters
+        ----------
+        fid : int
+            Id of the added feature.
+
+        """
+        mode = self.addingMode
+        if mode is None:
+            request = QGisCore.QgsFeatureRequest()
+            request.setFlags(QGisCore.QgsFeatureRequest.NoGeometry)
+            request.setSubsetOfAttributes(['mode'], self.layer.pendingFields())
+            request.setFilterFid(fid)
+            for feature in self.layer.getFeatures(request):
+                mode = feature.attribute('mode')
+            if mode is None:
+                return
+        self.modeFids.setdefault(mode, set()).add(fid)
+
+    def _featureDeleted(self, fid):
+        """Stop keeping track of the id of a deleted feature.
+
+        Listener for the featureDeleted signal of the layer.
+
+        Parameters
+        ----------
+        fid : int
+            Id of the deleted feature.
+
+        """
+        for fids in self.modeFids.values():
+            fids.discard(fid)
+
+    def _deleteFeatures(self, fids):
+        """Delete the features with the given ids from the layer.
+
+        Uses QgsVectorLayer.deleteFeatures if available, older QGis versions
+        delete the features one by one.
+
+        Parameters
+        ----------
+        fids : iterable of int
+            Ids of the features to delete.
+
+        """
+        if len(fids) < 1:
+            return
+        if hasattr(self.layer, 'deleteFeatures'):
+            self.layer.deleteFeatures(list(fids))
+        else:
+            for fid in fids:
+                self.layer.deleteFeature(fid)
+
     def activate(self):
         """Enable selection by enabling edit mode on the tempLayer."""
         if not self.__getLayer():
@@ -79,9 +169,14 @@ class SelectionManager(object):
             return
 
         if self.layer.isEditable():
+            # the feature ids are rebuilt on editingStopped
             self.layer.commitChanges()
             self.layer.endEditCommand()
 
+    def unload(self):
+        """Nothing to do, the tempLayer is part of the project."""
+        pass
+
     def clear(self, toggleRendering=True):
         """Clear the selection by removing all features from the tempLayer.
 
@@ -96,11 +191,43 @@ class SelectionManager(object):
         if not self.__getLayer():
             return
         self.main.iface.mapCanvas().setRenderFlag(False)
-        self.layer.selectAll()
-        self.layer.deleteSelectedFeatures()
+        self._deleteFeatures(self.layer.allFeatureIds())
+        self.modeFids = {}
         if toggleRendering:
             self.main.iface.mapCanvas().setRenderFlag(True)
 
+    def _createFeature(self, geometry, mode, label):
+        """Create a feature to add to the tempLayer.
+
+        The fields of the features are shared between all created features.
+
+        Parameters
+        ----------
+        geometry : QGisCore.QgsGeometry
+            Geometry of the feature.
+        mode : int
+            Mode to use for the feature.
+        label : str
+            Label to use for the feature.
+
+        Returns
+        -------
+        QGisCore.QgsFeature
+            Feature with the given geometry and attributes.
+
+        """
+        if self.fields is None:
+            self.fields = QGisCore.QgsFields()
+            self.fields.append(QGisCore.QgsField(
+                'mode', QtCore.QVariant.Int, 'int', 1, 0))
+            self.fields.append(QGisCore.QgsField(
+                'label', QtCore.QVariant.String, 'string', 1, 0))
+
+        f = QGisCore.QgsFeature(self.fields)
+        f.setGeometry(geometry)
+        f.setAttributes([mode, label])
+        return f
+
     def selectGeometry(self, geometry, mode=0, label="", toggleRendering=True):
         """Add the given geometry to the selection.
 
@@ -120,15 +247,46 @@ class SelectionManager(object):
         """
         if not self.__getLayer():
             return
-        f = QGisCore.QgsFeature()
-        f.fields().append(QGisCore.QgsField(
-            'mode', QtCore.QVariant.Int, 'int', 1, 0))
-        f.fields().append(QGisCore.QgsField(
-            'label', QtCore.QVariant.String, 'string', 1, 0))
-        f.setGeometry(geometry)
-        f.setAttributes([mode, label])
+        f = self._createFeature(geometry, mode, label)
         self.main.iface.mapCanvas().setRenderFlag(False)
+        self.addingMode = mode
         self.layer.addFeature(f)
+        self.addingMode = None
+        if toggleRendering:
+            self.main.iface.mapCanvas().setRenderFlag(True)
+
+    def selectMany(self, items, mode=0, labels=None, toggleRendering=True):
+        """Add the given geometries or features to the selection at once.
+
+        Parameters
+        ----------
+        items : list of QGisCore.QgsGeometry or QGisCore.QgsFeature
+            Geometries, or features of which to add the geometry, to add to
+            the selection.
+        mode : int, optional
+            Mode to use for the selected geometries. Defaults to 0.
+        labels : list of str, optional
+            Labels to use for the selected geometries, in the same order as
+            the items. Defaults to empty labels.
+        toggleRendering : boolean, optional
+            Redraw the map after changing the tempLayer. Defaults to True.
+
+        """
+        if not self.__getLayer() or len(items) < 1:
+            return
+        if labels is None:
+            labels = [""] * len(items)
+
+        features = []
+        for item, label in zip(items, labels):
+            if isinstance(item, QGisCore.QgsFeature):
+                item = item.geometry()
+            features.append(self._createFeature(item, mode, label))
+
+        self.main.iface.mapCanvas().setRenderFlag(False)
+        self.addingMode = mode
+        self.layer.addFeatures(features, False)
+        self.addingMode = None
         if toggleRendering:
             self.main.iface.mapCanvas().setRenderFlag(True)
 
@@ -168,8 +326,6 @@ class SelectionManager(object):
         if not self.__getLayer():
             return
         self.main.iface.mapCanvas().setRenderFlag(False)
-        for feature in self.layer.getFeatures(QGisCore.QgsFeatureRequest(
-                QGisCore.QgsExpression('mode = %i' % mode))):
-            self.layer.deleteFeature(feature.id())
+        self._deleteFeatures(self.modeFids.pop(mode, set()))
         if toggleRendering:
             self.main.iface.mapCanvas().setRenderFlag(True)
@@ -0,0 +1,331 @@
+# -*- coding: utf-8 -*-
+"""Module for showing selections as an overlay on the map canvas.
+
+Contains the SelectionOverlayItem and OverlaySelectionManager classes.
+"""
+
+#  DOV Erosiebezwaren, QGis plugin to assess field erosion on tablets
+#  Copyright (C) 2015-2017  Roel Huybrechts
+#
+#  This program is free software; you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation; either version 2 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License along
+#  with this program; if not, write to the Free Software Foundation, Inc.,
+#  51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+
+import PyQt4.Qt as Qt
+import PyQt4.QtCore as QtCore
+import PyQt4.QtGui as QtGui
+import qgis.core as QGisCore
+import qgis.gui as QGisGui
+
+
+class SelectionOverlayItem(QGisGui.QgsMapCanvasItem):
+    """Map canvas item drawing the selected geometries.
+
+    Geometries are drawn with a style per selection mode, and with their
+    label (if any) at their centroid.
+    """
+
+    # Outline color, outline width and fill color (or `None`) per mode.
+    STYLES = {
+        0: ('#ffff00', 3, None),
+        1: ('#ff8c00', 2, None),
+        2: ('#00ffff', 2, None)
+    }
+    DEFAULT_STYLE = ('#ff0000', 2, None)
+
+    # Radius in pixels of selected points.
+    POINT_RADIUS = 6
+
+    def __init__(self, mapCanvas):
+        """Initialisation.
+
+        Parameters
+        ----------
+        mapCanvas : QGisGui.QgsMapCanvas
+            Map canvas to draw on.
+
+        """
+        QGisGui.QgsMapCanvasItem.__init__(self, mapCanvas)
+        self.mapCanvas = mapCanvas
+        self.geometries = {}
+        self.setZValue(100)
+
+    def _getStyle(self, mode):
+        """Get the pen and brush to draw geometries of the given mode.
+
+        Parameters
+        ----------
+        mode : int
+            Selection mode.
+
+        Returns
+        -------
+        tuple
+            Tuple of QtGui.QPen and QtGui.QBrush.
+
+        """
+        color, width, fill = self.STYLES.get(mode, self.DEFAULT_STYLE)
+        pen = QtGui.QPen(QtGui.QColor(color))
+        pen.setWidth(width)
+        if fill:
+            brush = QtGui.QBrush(QtGui.QColor(fill))
+        else:
+            brush = QtGui.QBrush(Qt.Qt.NoBrush)
+        return pen, brush
+
+    def _toItem(self, point):
+        """Convert a point in map coordinates to item coordinates.
+
+        Parameters
+        ----------
+        point : QGisCore.QgsPoint
+            Point in map coordinates.
+
+        Returns
+        -------
+        QtCore.QPointF
+            Point in item coordinates.
+
+        """
+        return self.toCanvasCoordinates(point) - self.pos()
+
+    def _toPolygon(self, points):
+        """Convert a list of points in map coordinates to a polygon.
+
+        Parameters
+        ----------
+        points : list of QGisCore.QgsPoint
+            Points in map coordinates.
+
+        Returns
+        -------
+        QtGui.QPolygonF
+            Polygon in item coordinates.
+
+        """
+        return QtGui.QPolygonF([self._toItem(p) for p in points])
+
+    def _paintGeometry(self, painter, geometry):
+        """Paint the given geometry.
+
+        Parameters
+        ----------
+        painter : QtGui.QPainter
+            Painter to use.
+        geometry : QGisCore.QgsGeometry
+            Geometry to paint, in map coordinates.
+
+        """
+        if geometry.type() == QGisCore.QGis.Point:
+            if geometry.isMultipart():
+                points = geometry.asMultiPoint()
+            else:
+                points = [geometry.asPoint()]
+            for p in points:
+                painter.drawEllipse(self._toItem(p), self.POINT_RADIUS,
+                                    self.POINT_RADIUS)
+
+        elif geometry.type() == QGisCore.QGis.Line:
+            if geometry.isMultipart():
+                lines = geometry.asMultiPolyline()
+            else:
+                lines = [geometry.asPolyline()]
+            for line in lines:
+                painter.drawPolyline(self._toPolygon(line))
+
+        elif geometry.type() == QGisCore.QGis.Polygon:
+            if geometry.isMultipart():
+                polygons = geometry.asMultiPolygon()
+            else:
+                polygons = [geometry.asPolygon()]
+            path = QtGui.QPainterPath()
+            path.setFillRule(Qt.Qt.OddEvenFill)
+            for polygon in polygons:
+                for ring in polygon:
+                    path.addPolygon(self._toPolygon(ring))
+                    path.closeSubpath()
+            painter.drawPath(path)
+
+    def paint(self, painter, option=None, widget=None):
+        """Paint the selected geometries and their labels.
+
+        Parameters
+        ----------
+        painter : QtGui.QPainter
+            Painter to use.
+        option : QtGui.QStyleOptionGraphicsItem, optional
+            Style options for the item.
+        widget : QtGui.QWidget, optional
+            Widget being painted on.
+
+        """
+        painter.setRenderHint(QtGui.QPainter.Antialiasing)
+        for mode in sorted(self.geometries.keys(), reverse=True):
+            pen, brush = self._getStyle(mode)
+            painter.setPen(pen)
+            painter.setBrush(brush)
+            for geometry, label in self.geometries[mode]:
+                self._paintGeometry(painter, geometry)
+
+            painter.setPen(QtGui.QPen(QtGui.QColor('#000000')))
+            for geometry, label in self.geometries[mode]:
+                if label:
+                    painter.drawText(
+                        self._toItem(geometry.centroid().asPoint()), label)
+
+    def refresh(self):
+        """Update the extent of the item and repaint it."""
+        extent = None
+        for entries in self.geometries.values():
+            for geometry, label in entries:
+                if extent is None:
+                    extent = QGisCore.QgsRectangle(geometry.boundingBox())
+                else:
+                    extent.combineExtentWith(geometry.boundingBox())
+
+        if extent is None:
+            self.setRect(QGisCore.QgsRectangle())
+        else:
+            # make sure points and outlines are not clipped
+            self.setRect(extent.buffer(
+                self.mapCanvas.mapUnitsPerPixel() * 2 * self.POINT_RADIUS))
+        self.update()
+
+
+class OverlaySelectionManager(object):
+    """Class to manage selection of features or geometries.
+
+    Alternative to selectionmanager.SelectionManager which draws the selected
+    geometries on a map canvas item instead of copying them to a layer in
+    edit mode. Geometries should be in the coordinate reference system of the
+    map canvas.
+    """
+
+    def __init__(self, main, tempLayerName=None):
+        """Initialisation.
+
+        Parameters
+        ----------
+        main : erosiebezwaren.Erosiebezwaren
+            Instance of main class.
+        tempLayerName : str, optional
+            Unused, for compatibility with SelectionManager.
+
+        """
+        self.main = main
+        self.item = SelectionOverlayItem(self.main.iface.mapCanvas())
+
+    def activate(self):
+        """Show the selection."""
+        self.item.show()
+
+    def deactivate(self):
+        """Nothing to do, the selection is not kept in a layer."""
+        pass
+
+    def unload(self):
+        """Remove the overlay from the map canvas."""
+        self.main.iface.mapCanvas().scene().removeItem(self.item)
+
+    def clear(self, toggleRendering=True):
+        """Clear the selection.
+
+        Parameters
+        ----------
+        toggleRendering : boolean, optional
+            Redraw the overlay after changing the selection. Defaults to True.
+
+        """
+        self.item.geometries = {}
+        if toggleRendering:
+            self.item.refresh()
+
+    def selectGeometry(self, geometry, mode=0, label="", toggleRendering=True):
+        """Add the given geometry to the selection.
+
+        Parameters
+        ----------
+        geometry : QGisCore.QgsGeometry
+            Geometry to add to the selection.
+        mode : int, optional
+            Mode to use for the selected geometry. Defaults to 0.
+        label : str, optional
+            Label to use for the selected geometry. Defaults to an empty label.
+        toggleRendering : boolean, optional
+            Redraw the overlay after changing the selection. Defaults to True.
+
+        """
+        self.selectMany([geometry], mode, [label], toggleRendering)
+
+    def selectMany(self, items, mode=0, labels=None, toggleRendering=True):
+        """Add the given geometries or features to the selection at once.
+
+        Parameters
+        ----------
+        items : list of QGisCore.QgsGeometry or QGisCore.QgsFeature
+            Geometries, or features of which to add the geometry, to add to
+            the selection.
+        mode : int, optional
+            Mode to use for the selected geometries. Defaults to 0.
+        labels : list of str, optional
+            Labels to use for the selected geometries, in the same order as
+            the items. Defaults to empty labels.
+        toggleRendering : boolean, optional
+            Redraw the overlay after changing the selection. Defaults to True.
+
+        """
+        if labels is None:
+            labels = [""] * len(items)
+
+        entries = self.item.geometries.setdefault(mode, [])
+        for item, label in zip(items, labels):
+            if isinstance(item, QGisCore.QgsFeature):
+                item = item.geometry()
+            if item:
+                entries.append((QGisCore.QgsGeometry(item), label))
+
+        if toggleRendering:
+            self.item.refresh()
+
+    def select(self, feature, mode=0, label="", toggleRendering=True):
+        """Add the geometry of the given feature to the selection.
+
+        Parameters
+        ----------
+        feature : QGisCore.QgsFeature
+            Add the geometry of this feature to add to the selection.
+        mode : int, optional
+            Mode to use for the selected geometry. Defaults to 0.
+        label : str, optional
+            Label to use for the selected geometry. Defaults to an empty label.
+        toggleRendering : boolean, optional
+            Redraw the overlay after changing the selection. Defaults to True.
+
+        """
+        self.selectGeometry(feature.geometry(), mode=mode, label=label,
+                            toggleRendering=toggleRendering)
+
+    def clearWithMode(self, mode, toggleRendering=True):
+        """Clear the selected geometry that have the given mode.
+
+        Parameters
+        ----------
+        mode : int
+            Clear the geometries that have been selected using this mode.
+        toggleRendering : boolean, optional
+            Redraw the overlay after changing the selection. Defaults to True.
+
+        """
+        self.item.geometries.pop(mode, None)
+        if toggleRendering:
+            self.item.refresh()
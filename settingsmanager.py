@@ -40,7 +40,20 @@ class SettingsManager(object):
             'layers/oudebezwaren': 'oude_bezwaren',
             'layers/pijlen': 'Pijlen',
             'layers/polygonen': 'Polygonen',
-            'paths/bezwaren': 'bezwaren'
+            'paths/bezwaren': 'bezwaren',
+            'search/debounce': 400,
+            'viewport/debounce': 250,
+            'cache/featureMemory': 32 * 1024 * 1024,
+            'cache/rasterMemory': 64 * 1024 * 1024,
+            'cache/rasterTileSize': 256,
+            'selection/backend': 'layer',
+            'zonalstats/rasters': ['watererosie30',
+                                   '2019 potentiele bodemerosie',
+                                   '2018 potentiele bodemerosie',
+                                   '2017 potentiele bodemerosie',
+                                   '2016 potentiele bodemerosie'],
+            # None: one less than the number of CPUs
+            'zonalstats/processes': None
         }
 
     def setValue(self, key, value):
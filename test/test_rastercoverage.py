@@ -0,0 +1,118 @@
+# -*- coding: utf-8 -*-
+"""Tests for the rastercoverage module, these do not need QGis.
+
+Run from the plugin directory with `python -m unittest discover test`.
+"""
+
+#  DOV Erosiebezwaren, QGis plugin to assess field erosion on tablets
+#  Copyright (C) 2015-2017  Roel Huybrechts
+#
+#  This program is free software; you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation; either version 2 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License along
+#  with this program; if not, write to the Free Software Foundation, Inc.,
+#  51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+
+import os
+import sys
+import unittest
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(
+    __file__))))
+
+import rastercoverage  # noqa: E402
+
+
+class MaskToPolygonsTest(unittest.TestCase):
+    """Check that maskToPolygons gives valid polygons covering the mask."""
+
+    def assertValidPolygons(self, mask):
+        """Check the polygons of the mask.
+
+        Every ring should be simple (no vertex visited twice), exteriors
+        counterclockwise and holes clockwise, and the total area should be
+        the number of selected cells.
+
+        Parameters
+        ----------
+        mask : numpy.ndarray
+            Boolean array, `True` for the selected cells.
+
+        """
+        area = 0
+        for polygon in rastercoverage.maskToPolygons(mask, 0, 0, 1, 1):
+            for i, ring in enumerate(polygon):
+                self.assertTrue(np.array_equal(ring[0], ring[-1]))
+                vertices = [tuple(v) for v in ring[:-1].tolist()]
+                self.assertEqual(len(vertices), len(set(vertices)),
+                                 'ring touches itself:\n%s' % mask)
+
+                signedArea = rastercoverage._signedArea(ring[:-1])
+                if i == 0:
+                    self.assertTrue(signedArea > 0)
+                else:
+                    self.assertTrue(signedArea < 0)
+                area += signedArea
+        self.assertAlmostEqual(area, np.count_nonzero(mask))
+
+    def test_holeTouchingOutside(self):
+        """A hole touching the outside in a corner is a separate ring."""
+        mask = np.array([[1, 1, 1],
+                         [1, 0, 1],
+                         [1, 1, 0]], dtype=bool)
+        polygons = rastercoverage.maskToPolygons(mask, 0, 0, 1, 1)
+        self.assertEqual(len(polygons), 1)
+        self.assertEqual(len(polygons[0]), 2)
+        self.assertValidPolygons(mask)
+
+    def test_holesTouchingDiagonally(self):
+        """Two holes touching in a corner are separate rings."""
+        mask = np.array([[1, 1, 1, 1],
+                         [1, 0, 1, 1],
+                         [1, 1, 0, 1],
+                         [1, 1, 1, 1]], dtype=bool)
+        polygons = rastercoverage.maskToPolygons(mask, 0, 0, 1, 1)
+        self.assertEqual(len(polygons), 1)
+        self.assertEqual(len(polygons[0]), 3)
+        self.assertValidPolygons(mask)
+
+    def test_cellsTouchingDiagonally(self):
+        """Cells only touching in a corner are separate polygons."""
+        mask = np.array([[1, 0],
+                         [0, 1]], dtype=bool)
+        polygons = rastercoverage.maskToPolygons(mask, 0, 0, 1, 1)
+        self.assertEqual(len(polygons), 2)
+        self.assertValidPolygons(mask)
+
+    def test_islandTouchingHole(self):
+        """A cell in a hole, touching it in a corner, is a separate polygon."""
+        mask = np.array([[1, 1, 1, 1, 1],
+                         [1, 1, 0, 0, 1],
+                         [1, 0, 1, 0, 1],
+                         [1, 0, 0, 0, 1],
+                         [1, 1, 1, 1, 1]], dtype=bool)
+        polygons = rastercoverage.maskToPolygons(mask, 0, 0, 1, 1)
+        self.assertEqual(sorted(len(p) for p in polygons), [1, 2])
+        self.assertValidPolygons(mask)
+
+    def test_randomMasks(self):
+        """Random masks give valid polygons."""
+        random = np.random.RandomState(0)
+        for i in range(400):
+            height, width = random.randint(1, 12, 2)
+            self.assertValidPolygons(
+                random.rand(height, width) < random.uniform(0.3, 0.8))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -18,10 +18,21 @@
 #  with this program; if not, write to the Free Software Foundation, Inc.,
 #  51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
 
+import PyQt4.QtCore as QtCore
+import qgis.core as QGisCore
+
 
 class Utils(object):
     """General utility methods used in the application."""
 
+    # Signals of the layer tree after which the legend order of the layers
+    # or the groups can have changed. nameChanged is missing from older
+    # QGis versions, connecting to it there has no effect.
+    LAYER_TREE_SIGNALS = ('addedChildren(QgsLayerTreeNode*,int,int)',
+                          'removedChildren(QgsLayerTreeNode*,int,int)',
+                          'nameChanged(QgsLayerTreeNode*,QString)',
+                          'customPropertyChanged(QgsLayerTreeNode*,QString)')
+
     def __init__(self, main):
         """Initialisation.
 
@@ -33,6 +44,138 @@ class Utils(object):
         """
         self.main = main
 
+        # name -> list of layers in legend order and name -> list of group
+        # indexes, built lazily and kept up to date through the signals of
+        # the registry and the layer tree
+        self.layers = None
+        self.groups = None
+        self.watchedLayers = set()
+
+        registry = QGisCore.QgsMapLayerRegistry.instance()
+        QtCore.QObject.connect(
+            registry, QtCore.SIGNAL('layersAdded(QList<QgsMapLayer*>)'),
+            self._layersAdded)
+        QtCore.QObject.connect(
+            registry, QtCore.SIGNAL('layersWillBeRemoved(QStringList)'),
+            self._layersWillBeRemoved)
+        QtCore.QObject.connect(registry, QtCore.SIGNAL('removeAll()'),
+                               self._invalidateIndex)
+
+        root = QGisCore.QgsProject.instance().layerTreeRoot()
+        for signal in self.LAYER_TREE_SIGNALS:
+            QtCore.QObject.connect(root, QtCore.SIGNAL(signal),
+                                   self._invalidateIndex)
+
+    def _invalidateIndex(self):
+        """Rebuild the layer and group indexes when they are used next."""
+        self.layers = None
+        self.groups = None
+
+    def _indexLayer(self, layer):
+        """Add the layer to the layer index.
+
+        Parameters
+        ----------
+        layer : QGisCore.QgsMapLayer
+            Layer to add.
+
+        """
+        self.layers.setdefault(layer.name(), []).append(layer)
+        if layer.id() not in self.watchedLayers:
+            self.watchedLayers.add(layer.id())
+            QtCore.QObject.connect(layer,
+                                   QtCore.SIGNAL('layerNameChanged()'),
+                                   self._invalidateIndex)
+
+    def _getLayerIndex(self):
+        """Get the layer index, build it if needed.
+
+        Returns
+        -------
+        dict
+            Dictionary of the layer name to the list of layers with this
+            name.
+
+        """
+        if self.layers is None:
+            self.layers = {}
+            for layer in self.main.iface.legendInterface().layers():
+                self._indexLayer(layer)
+        return self.layers
+
+    def _getGroupIndex(self):
+        """Get the group index, build it if needed.
+
+        Returns
+        -------
+        dict
+            Dictionary of the group name to the list of indexes of the
+            groups with this name in the legend interface.
+
+        """
+        if self.groups is None:
+            self.groups = {}
+            groups = self.main.iface.legendInterface().groups()
+            for i in range(len(groups)):
+                self.groups.setdefault(groups[i], []).append(i)
+        return self.groups
+
+    def _layersAdded(self, layers):
+        """Rebuild the layer index when it is used next.
+
+        Listener for the layersAdded signal of the map layer registry. The
+        new layers are not simply appended, the index is rebuilt in legend
+        order so a name used by several layers resolves to the first one in
+        the legend.
+
+        Parameters
+        ----------
+        layers : list of QGisCore.QgsMapLayer
+            The added layers.
+
+        """
+        self.layers = None
+
+    def _layersWillBeRemoved(self, layerIds):
+        """Remove the layers from the layer index.
+
+        Listener for the layersWillBeRemoved signal of the map layer
+        registry.
+
+        Parameters
+        ----------
+        layerIds : list of str
+            Ids of the layers that will be removed.
+
+        """
+        layerIds = set(layerIds)
+        self.watchedLayers -= layerIds
+        if self.layers is None:
+            return
+
+        for name in self.layers.keys():
+            self.layers[name] = [l for l in self.layers[name]
+                                 if l.id() not in layerIds]
+            if len(self.layers[name]) < 1:
+                del(self.layers[name])
+
+    def unload(self):
+        """Disconnect the signals of the map layer registry."""
+        registry = QGisCore.QgsMapLayerRegistry.instance()
+        QtCore.QObject.disconnect(
+            registry, QtCore.SIGNAL('layersAdded(QList<QgsMapLayer*>)'),
+            self._layersAdded)
+        QtCore.QObject.disconnect(
+            registry, QtCore.SIGNAL('layersWillBeRemoved(QStringList)'),
+            self._layersWillBeRemoved)
+        QtCore.QObject.disconnect(registry, QtCore.SIGNAL('removeAll()'),
+                                  self._invalidateIndex)
+
+        root = QGisCore.QgsProject.instance().layerTreeRoot()
+        for signal in self.LAYER_TREE_SIGNALS:
+            QtCore.QObject.disconnect(root, QtCore.SIGNAL(signal),
+                                      self._invalidateIndex)
+
     def getLayerByName(self, name):
         """Find a layer by name.
 
@@ -48,9 +191,9 @@ class Utils(object):
             the given name exists.
 
         """
-        for layer in self.main.iface.legendInterface().layers():
-            if layer.name() == name:
-                return layer
+        layers = self._getLayerIndex().get(name, None)
+        if layers:
+            return layers[0]
         return None
 
     def editInLayer(self, name):
@@ -98,18 +241,27 @@ class Utils(object):
             List of the names of layers or layergroups to disable (set
             invisible.)
 
+        Returns
+        -------
+        int
+            Number of layers and layergroups of which the visibility changed.
+
         """
         legendInterface = self.main.iface.legendInterface()
 
-        groups = legendInterface.groups()
-        for i in range(0, len(groups)):
-            if groups[i] in enable:
-                legendInterface.setGroupVisible(i, True)
-            if groups[i] in disable:
-                legendInterface.setGroupVisible(i, False)
-
-        for l in legendInterface.layers():
-            if l.name() in enable:
-                legendInterface.setLayerVisible(l, True)
-            if l.name() in disable:
-                legendInterface.setLayerVisible(l, False)
+        # only change what differs from the current state, every change can
+        # trigger a refresh of the map canvas
+        groups = self._getGroupIndex()
+        layers = self._getLayerIndex()
+        changed = 0
+        for names, visible in ((enable, True), (disable, False)):
+            for name in names:
+                for i in groups.get(name, []):
+                    if legendInterface.isGroupVisible(i) != visible:
+                        legendInterface.setGroupVisible(i, visible)
+                        changed += 1
+                for l in layers.get(name, []):
+                    if legendInterface.isLayerVisible(l) != visible:
+                        legendInterface.setLayerVisible(l, visible)
+                        changed += 1
+        return changed
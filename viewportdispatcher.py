@@ -0,0 +1,110 @@
+# -*- coding: utf-8 -*-
+"""Module to notify listeners of changes of the map canvas extent.
+
+Contains the ViewportDispatcher class.
+"""
+
+#  DOV Erosiebezwaren, QGis plugin to assess field erosion on tablets
+#  Copyright (C) 2015-2017  Roel Huybrechts
+#
+#  This program is free software; you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation; either version 2 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License along
+#  with this program; if not, write to the Free Software Foundation, Inc.,
+#  51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+
+import PyQt4.QtCore as QtCore
+
+
+class ViewportDispatcher(QtCore.QObject):
+    """Coalesce the extent changes of the map canvas for its listeners.
+
+    Instead of reacting to every extentsChanged signal of the map canvas,
+    listeners are called once the extent has not changed for the quiet
+    period from the setting 'viewport/debounce' (in milliseconds). Listeners
+    with a higher priority are called first.
+    """
+
+    def __init__(self, main):
+        """Initialisation.
+
+        Parameters
+        ----------
+        main : erosiebezwaren.Erosiebezwaren
+            Instance of main class.
+
+        """
+        QtCore.QObject.__init__(self)
+        self.main = main
+        self.mapCanvas = self.main.iface.mapCanvas()
+        self.listeners = []
+
+        self.timer = QtCore.QTimer(self)
+        self.timer.setSingleShot(True)
+        self.timer.setInterval(
+            self.main.settings.getValue('viewport/debounce'))
+
+        QtCore.QObject.connect(self.mapCanvas,
+                               QtCore.SIGNAL('extentsChanged()'),
+                               self.extentsChanged)
+        QtCore.QObject.connect(self.timer, QtCore.SIGNAL('timeout()'),
+                               self.dispatch)
+
+    def extentsChanged(self):
+        """Restart the quiet period.
+
+        Listener for the extentsChanged signal of the map canvas.
+        """
+        self.timer.start()
+
+    def addListener(self, listener, priority=0):
+        """Call the listener after the extent of the map canvas changed.
+
+        Adding a listener that has been added before only changes its
+        priority.
+
+        Parameters
+        ----------
+        listener : callable
+            Function to call, without arguments.
+        priority : int, optional
+            Listeners with a higher priority are called first. Defaults to 0.
+
+        """
+        self.removeListener(listener)
+        self.listeners.append((priority, listener))
+        self.listeners.sort(key=lambda x: x[0], reverse=True)
+
+    def removeListener(self, listener):
+        """Stop calling the listener.
+
+        Parameters
+        ----------
+        listener : callable
+            Function that has been added with addListener.
+
+        """
+        self.listeners = [(p, l) for (p, l) in self.listeners
+                          if l != listener]
+
+    def dispatch(self):
+        """Call all listeners, in order of their priority."""
+        self.timer.stop()
+        for priority, listener in list(self.listeners):
+            listener()
+
+    def unload(self):
+        """Stop listening to the map canvas and remove all listeners."""
+        self.timer.stop()
+        QtCore.QObject.disconnect(self.mapCanvas,
+                                  QtCore.SIGNAL('extentsChanged()'),
+                                  self.extentsChanged)
+        self.listeners = []
@@ -119,11 +119,10 @@ class SpatialiteAttributeModel(AttributeModel):
     def updateValues(self):
         """Get the distinct values from attribute of the layer."""
         s = SpatialiteIterator(self.layer)
-        sql = "SELECT DISTINCT %s FROM %s ORDER BY %s" % (self.attributeName,
-                                                          s.ds.table(),
-                                                          self.attributeName)
         self.values = ['']  # FIXME
-        self.values.extend([i[0] for i in s.rawQuery(sql) if i[0]])
+        self.values.extend([i[0] for i in s.select(
+            [self.attributeName], orderBy=[self.attributeName],
+            distinct=True) if i[0]])
 
 
 class AttributeFilledCombobox(QtGui.QComboBox):
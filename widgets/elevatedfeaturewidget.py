@@ -18,6 +18,7 @@
 #  with this program; if not, write to the Free Software Foundation, Inc.,
 #  51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
 
+import PyQt4.QtCore as QtCore
 import PyQt4.QtGui as QtGui
 
 import re
@@ -37,24 +38,50 @@ from valuelabel import EnabledFlatBooleanButton
 from valuelabel import VisibilityBooleanButton
 
 
-def _s(widget, parentclass):
-    """Check if the widget is a subclass of the given parent class.
+# Name of the method to set the value of widgets of these types.
+SETTERS = (
+    ((QtGui.QLabel, QtGui.QLineEdit), 'setText'),
+    ((EnabledBooleanButton, EnabledFlatBooleanButton, VisibilityBooleanButton,
+      SensitivityButtonBox, DefaultValueDateEdit, ValueCheckBox,
+      AttributeFilledCombobox, ValueComboBox, ValueBooleanButton,
+      ValueMappedComboBox, ValueTextEdit, MonitoringItemWidget), 'setValue')
+)
+
+# Name of the method to get the value of widgets of these types.
+GETTERS = (
+    ((QtGui.QLineEdit,), 'text'),
+    ((SensitivityButtonBox, DefaultValueDateEdit, ValueCheckBox,
+      AttributeFilledCombobox, ValueComboBox, ValueBooleanButton,
+      ValueMappedComboBox, ValueTextEdit, MonitoringItemWidget), 'getValue')
+)
+
+
+def _resolve(widgetType, table, cache):
+    """Get the name of the method to use for widgets of the given type.
 
     Parameters
     ----------
-    widget : Object
-        Instance to check.
-    parentclass : class
-        Check if type(widget) is a subclass of this class.
+    widgetType : type
+        Type of the widget.
+    table : tuple
+        Tuple of (tuple of classes, method name) pairs, the first pair
+        that has a superclass of the widget type is used.
+    cache : dict
+        Dictionary of previously resolved types, updated with the result.
 
     Returns
     -------
-    boolean
-        'True' if the type of the widget is a subclass of the parentclass,
-        'False' otherwise.
+    str or None
+        Name of the method, or `None` if the type is not supported.
 
     """
-    return issubclass(type(widget), parentclass)
+    if widgetType not in cache:
+        cache[widgetType] = None
+        for classes, method in table:
+            if issubclass(widgetType, classes):
+                cache[widgetType] = method
+                break
+    return cache[widgetType]
 
 
 class ElevatedFeatureWidget(QtGui.QWidget):
@@ -70,10 +97,31 @@ class ElevatedFeatureWidget(QtGui.QWidget):
     start with 'efw' and end with '_fieldname' where fieldname should be
     replaced with the name of the attribute field of the feature. Note that
     you can map multiple widgets to one attribute.
+
+    Signals
+    -------
+    featureSaved : QtCore.pyqtSignal('QgsVectorLayer', 'qint64')
+        Emitted when the feature has been saved succesfully. Includes a
+        reference to the layer and the id of the feature.
+
     """
 
     UNDEFINED = str(uuid.uuid4())
 
+    # Matches the names of the subwidgets, with the field name as group.
+    reWidgetName = re.compile(r'^efw[^_]*_(.*)$')
+
+    # Cache of the bindings by widget class and field names.
+    _bindings = {}
+    _setters = {}
+    _getters = {}
+
+    # When `True`, populate only updates the subwidgets of which the value of
+    # the corresponding attribute changed since the last populate.
+    incrementalPopulate = False
+
+    featureSaved = QtCore.pyqtSignal('QgsVectorLayer', 'qint64')
+
     def __init__(self, parent, feature=None):
         """Initialisation.
 
@@ -91,6 +139,46 @@ class ElevatedFeatureWidget(QtGui.QWidget):
         self.layer = None
         self.feature = feature
         self.fieldMap = {}
+        self.fieldNames = {}
+        self.renderedValues = {}
+
+    def _isNull(self, value):
+        """Check if the given attribute value is null.
+
+        Parameters
+        ----------
+        value : object
+            Attribute value to check.
+
+        Returns
+        -------
+        boolean
+            `True` if the value is `None` or a null variant, `False`
+            otherwise.
+
+        """
+        return value is None or isinstance(value, QtCore.QPyNullVariant)
+
+    def _sameValue(self, value, otherValue):
+        """Check if the given attribute values are the same.
+
+        Parameters
+        ----------
+        value : object
+            Attribute value to compare.
+        otherValue : object
+            Attribute value to compare to.
+
+        Returns
+        -------
+        boolean
+            `True` if both values are null, or if both are of the same type
+            and equal, `False` otherwise.
+
+        """
+        if self._isNull(value) or self._isNull(otherValue):
+            return self._isNull(value) and self._isNull(otherValue)
+        return type(value) == type(otherValue) and value == otherValue
 
     def _setValue(self, widget, value):
         """Set the value of a certain widget to the given value.
@@ -104,27 +192,10 @@ class ElevatedFeatureWidget(QtGui.QWidget):
             or setValue functions of the widget.
 
         """
-        fnSetValue = None
-
-        if _s(widget, QtGui.QLabel) or \
-           _s(widget, QtGui.QLineEdit):
-            fnSetValue = widget.setText
-        elif _s(widget, EnabledBooleanButton) or \
-                _s(widget, EnabledFlatBooleanButton) or \
-                _s(widget, VisibilityBooleanButton) or \
-                _s(widget, SensitivityButtonBox) or \
-                _s(widget, DefaultValueDateEdit) or \
-                _s(widget, ValueCheckBox) or \
-                _s(widget, AttributeFilledCombobox) or \
-                _s(widget, ValueComboBox) or \
-                _s(widget, ValueBooleanButton) or \
-                _s(widget, ValueMappedComboBox) or \
-                _s(widget, ValueTextEdit) or \
-                _s(widget, MonitoringItemWidget):
-            fnSetValue = widget.setValue
-
+        fnSetValue = _resolve(type(widget), SETTERS,
+                              ElevatedFeatureWidget._setters)
         if fnSetValue:
-            fnSetValue(value)
+            getattr(widget, fnSetValue)(value)
 
     def _getValue(self, widget):
         """Get the value of the given widget.
@@ -143,25 +214,49 @@ class ElevatedFeatureWidget(QtGui.QWidget):
             is not a known widget.
 
         """
-        fnGetValue = None
-
-        if _s(widget, QtGui.QLineEdit):
-            fnGetValue = widget.text
-        elif _s(widget, SensitivityButtonBox) or \
-                _s(widget, DefaultValueDateEdit) or \
-                _s(widget, ValueCheckBox) or \
-                _s(widget, AttributeFilledCombobox) or \
-                _s(widget, ValueComboBox) or \
-                _s(widget, ValueBooleanButton) or \
-                _s(widget, ValueMappedComboBox) or \
-                _s(widget, ValueTextEdit) or \
-                _s(widget, MonitoringItemWidget):
-            fnGetValue = widget.getValue
-
+        fnGetValue = _resolve(type(widget), GETTERS,
+                              ElevatedFeatureWidget._getters)
         if fnGetValue:
-            return fnGetValue()
+            return getattr(widget, fnGetValue)()
         return ElevatedFeatureWidget.UNDEFINED
 
+    def _getBinding(self, fields):
+        """Get the binding between the subwidget names and the fields.
+
+        The binding is computed once for every widget class and set of field
+        names and shared between the instances.
+
+        Parameters
+        ----------
+        fields : QGisCore.QgsFields
+            The attribute fields of the feature to use for mapping.
+
+        Returns
+        -------
+        tuple
+            Tuple of a list of (subwidget name, field index) pairs and a list
+            of the names of the subwidgets without matching field.
+
+        """
+        fieldNames = tuple([fields.at(i).name() for i in
+                            range(fields.size())])
+        key = (type(self), fieldNames)
+        if key not in ElevatedFeatureWidget._bindings:
+            indexes = dict([(n.lower(), i) for i, n in
+                            reversed(list(enumerate(fieldNames)))])
+            mapped = []
+            unmapped = []
+            for dictfield in self.__dict__:
+                m = self.reWidgetName.match(dictfield)
+                if m:
+                    index = indexes.get(m.group(1).lower(), None)
+                    if index is not None:
+                        mapped.append((dictfield, index))
+                    else:
+                        unmapped.append(dictfield)
+            ElevatedFeatureWidget._bindings[key] = (mapped, unmapped)
+        return ElevatedFeatureWidget._bindings[key]
+
     def _mapWidgets(self, fields):
         """Build the mapping between the subwidgets and the fields.
 
@@ -172,29 +267,27 @@ class ElevatedFeatureWidget(QtGui.QWidget):
 
         """
         self.fieldMap = {}
-
-        for dictfield in self.__dict__:
-            if re.match(r'^efw[^_]*_.*$', dictfield):
-                self.__dict__[dictfield].mapped = False
-
-        for i in range(fields.size()):
-            field = fields.at(i)
-            field.index = i
-            regex = re.compile(r'^efw[^_]*_%s$' % field.name(), re.I)
-            for dictfield in self.__dict__:
-                if regex.match(dictfield):
-                    if field not in self.fieldMap:
-                        self.fieldMap[field] = set()
-                    self.fieldMap[field].add(self.__dict__[dictfield])
-                    self.__dict__[dictfield].mapped = True
-
-        for dictfield in self.__dict__:
-            if re.match(r'^efw[^_]*_.*$', dictfield):
-                if not self.__dict__[dictfield].mapped:
-                    try:
-                        self.__dict__[dictfield].hide()
-                    except AttributeError:
-                        continue
+        self.fieldNames = {}
+        self.renderedValues = {}
+
+        mapped, unmapped = self._getBinding(fields)
+        for dictfield, index in mapped:
+            name = fields.at(index).name()
+            if name not in self.fieldNames:
+                field = fields.at(index)
+                field.index = index
+                self.fieldNames[name] = field
+                self.fieldMap[field] = set()
+            widget = self.__dict__[dictfield]
+            widget.mapped = True
+            self.fieldMap[self.fieldNames[name]].add(widget)
+
+        for dictfield in unmapped:
+            self.__dict__[dictfield].mapped = False
+            try:
+                self.__dict__[dictfield].hide()
+            except AttributeError:
+                continue
 
     def _getField(self, name):
         """Get the field with a given name.
@@ -210,24 +303,33 @@ class ElevatedFeatureWidget(QtGui.QWidget):
             The field with the given name.
 
         """
-        for field in self.fieldMap:
-            if field.name() == name:
-                return field
+        return self.fieldNames.get(name, None)
 
     def populate(self):
         """Populate the subwidget.
 
         Set the values of the subwidgets to the values of the corresponding
-        attributes of the feature.
+        attributes of the feature. If incrementalPopulate is `True`, skip the
+        subwidgets of which the value did not change since the last populate.
         """
         if self.feature:
+            fields = self.feature.fields()
             if len(self.fieldMap) < 1:
-                self._mapWidgets(self.feature.fields())
-
-            for field in self.feature.fields():
-                widgets = self.fieldMap.get(self._getField(field.name()), [])
+                self._mapWidgets(fields)
+
+            attributes = self.feature.attributes()
+            for i in range(fields.size()):
+                name = fields.at(i).name()
+                value = attributes[i]
+                if self.incrementalPopulate and \
+                        name in self.renderedValues and \
+                        self._sameValue(self.renderedValues[name], value):
+                    continue
+
+                widgets = self.fieldMap.get(self._getField(name), [])
                 for w in widgets:
-                    self._setValue(w, self.feature.attribute(field.name()))
+                    self._setValue(w, value)
+                self.renderedValues[name] = value
 
     def setLayer(self, layer):
         """Set the layer to be used to save the feature.
@@ -297,4 +399,6 @@ class ElevatedFeatureWidget(QtGui.QWidget):
 
         r = self.layer.dataProvider().changeAttributeValues(
             {self.feature.id(): attrMap})
+        if r:
+            self.featureSaved.emit(self.layer, self.feature.id())
         return r
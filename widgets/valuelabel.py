@@ -389,7 +389,8 @@ class ColorLabel(QtGui.QLabel):
         style += "background-color: %s;" % bgcolor
         style += "color: %s;" % textcolor
         style += "}"
-        self.setStyleSheet(style)
+        if style != self.styleSheet():
+            self.setStyleSheet(style)
 
 
 class SensitivityColorLabel(ColorLabel):
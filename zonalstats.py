@@ -0,0 +1,281 @@
+# -*- coding: utf-8 -*-
+"""Module to calculate raster statistics for many parcels at once.
+
+Contains the ZonalStatistics class.
+"""
+
+#  DOV Erosiebezwaren, QGis plugin to assess field erosion on tablets
+#  Copyright (C) 2015-2017  Roel Huybrechts
+#
+#  This program is free software; you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation; either version 2 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License along
+#  with this program; if not, write to the Free Software Foundation, Inc.,
+#  51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+
+import PyQt4.QtCore as QtCore
+import PyQt4.QtGui as QtGui
+import qgis.core as QGisCore
+
+import itertools
+import multiprocessing
+import os
+import sys
+
+import rastercoverage
+
+from pixelmeasure import RasterBlockWrapper
+
+
+class ZonalStatistics(object):
+    """Class to calculate the raster statistics of a list of parcels.
+
+    The raster blocks of the parcels are read in the main thread, the
+    statistics are calculated in a pool of processes using
+    rastercoverage.parcelStats. The results are added to a table (a memory
+    layer without geometry) as they come in, with one row per parcel and
+    raster.
+    """
+
+    # Number of tasks to read before handing them to the pool.
+    BATCH_SIZE = 256
+
+    # Seconds to wait for a new pool to answer before giving up on it.
+    POOL_TIMEOUT = 10
+
+    def __init__(self, main):
+        """Initialisation.
+
+        Parameters
+        ----------
+        main : erosiebezwaren.Erosiebezwaren
+            Instance of main class.
+
+        """
+        self.main = main
+        self.rasterLayerNames = self.main.settings.getValue(
+            'zonalstats/rasters')
+        self.processes = self.main.settings.getValue('zonalstats/processes')
+
+    def _getProcesses(self):
+        """Get the number of processes to use.
+
+        Returns
+        -------
+        int
+            The number of processes from the setting 'zonalstats/processes',
+            or one less than the number of CPUs if it is `None`, keeping one
+            for QGis itself.
+
+        """
+        if self.processes is not None:
+            return self.processes
+        try:
+            return max(1, multiprocessing.cpu_count() - 1)
+        except NotImplementedError:
+            return 1
+
+    def _createPool(self):
+        """Create the pool of processes.
+
+        The new pool has to run a trivial task within POOL_TIMEOUT seconds
+        before it is used.
+
+        Returns
+        -------
+        multiprocessing.Pool or None
+            The pool of processes, or `None` if it could not be started and
+            the statistics should be calculated in this process.
+
+        """
+        processes = self._getProcesses()
+        if processes == 1:
+            return None
+
+        if sys.platform == 'win32':
+            # sys.executable is the QGis executable itself
+            multiprocessing.set_executable(
+                os.path.join(sys.exec_prefix, 'pythonw.exe'))
+
+        try:
+            pool = multiprocessing.Pool(processes)
+        except (OSError, ImportError, ValueError):
+            return None
+
+        try:
+            pool.apply_async(abs, (1,)).get(self.POOL_TIMEOUT)
+        except Exception:
+            # includes multiprocessing.TimeoutError
+            pool.terminate()
+            pool.join()
+            return None
+        return pool
+
+    def _getRasterLayers(self):
+        """Get the raster layers to calculate statistics of.
+
+        Returns
+        -------
+        list of QGisCore.QgsRasterLayer
+            The raster layers available in the project. Names of layers that
+            are not raster layers are skipped.
+
+        """
+        layers = []
+        for name in self.rasterLayerNames:
+            layer = self.main.utils.getLayerByName(name)
+            if layer and layer.type() == QGisCore.QgsMapLayer.RasterLayer:
+                layers.append(layer)
+        return layers
+
+    def _createLayer(self, name):
+        """Create a memory table to store the results in.
+
+        Parameters
+        ----------
+        name : str
+            Name of the new table.
+
+        Returns
+        -------
+        QGisCore.QgsVectorLayer
+            The new (empty) table.
+
+        """
+        layer = QGisCore.QgsVectorLayer(
+            'None?field=uniek_id:string&field=raster:string' +
+            '&field=count:integer&field=sum:double&field=avg:double',
+            name, 'memory')
+        QGisCore.QgsMapLayerRegistry.instance().addMapLayer(layer)
+        return layer
+
+    def _iterTasks(self, parcels, rasterLayers):
+        """Read the raster blocks of the parcels, as tasks for the pool.
+
+        Parameters
+        ----------
+        parcels : list of QGisCore.QgsFeature
+            Parcels to calculate the statistics of.
+        rasterLayers : list of QGisCore.QgsRasterLayer
+            Raster layers to calculate the statistics of.
+
+        Returns
+        -------
+        iterable of tuple
+            Arguments for rastercoverage.parcelStats, with the uniek_id of
+            the parcel and the name of the raster as key.
+
+        """
+        for parcel in parcels:
+            if not parcel.geometry():
+                continue
+            for rasterLayer in rasterLayers:
+                block = RasterBlockWrapper(
+                    rasterLayer, 1, parcel.geometry(), process=False,
+                    cache=self.main.rasterBlockCache)
+                task = block.getTask(
+                    (parcel.attribute('uniek_id'), rasterLayer.name()))
+                if task:
+                    yield task
+
+    def _iterResults(self, tasks, pool):
+        """Calculate the statistics of the tasks.
+
+        Tasks are handed to the pool per batch, the next batch is read while
+        the pool is working on the current one.
+
+        Parameters
+        ----------
+        tasks : iterable of tuple
+            Arguments for rastercoverage.parcelStats.
+        pool : multiprocessing.Pool or None
+            Pool to use, or `None` to calculate in this process.
+
+        Returns
+        -------
+        iterable of tuple
+            The key of every task with its statistics, in arbitrary order.
+
+        """
+        tasks = iter(tasks)
+        batch = list(itertools.islice(tasks, self.BATCH_SIZE))
+        while len(batch) > 0:
+            if pool:
+                results = pool.imap_unordered(rastercoverage.parcelStats,
+                                              batch, 8)
+            else:
+                results = itertools.imap(rastercoverage.parcelStats, batch)
+            batch = list(itertools.islice(tasks, self.BATCH_SIZE))
+            for result in results:
+                yield result
+
+    def run(self, parcels, name):
+        """Calculate the statistics of the parcels and show them in a table.
+
+        Shows a progress dialog which allows to cancel the calculation, the
+        results calculated until then are kept.
+
+        Parameters
+        ----------
+        parcels : list of QGisCore.QgsFeature
+            Parcels to calculate the statistics of, these should have an
+            'uniek_id' attribute.
+        name : str
+            Name of the table with the results.
+
+        Returns
+        -------
+        QGisCore.QgsVectorLayer or None
+            The table with the results, or `None` if none of the raster
+            layers is available.
+
+        """
+        rasterLayers = self._getRasterLayers()
+        if len(rasterLayers) < 1:
+            return None
+
+        layer = self._createLayer(name)
+        fields = layer.pendingFields()
+
+        progress = QtGui.QProgressDialog(
+            'Erosiestatistieken berekenen...', 'Annuleren', 0,
+            len(parcels) * len(rasterLayers), self.main.iface.mainWindow())
+        progress.setWindowModality(QtCore.Qt.WindowModal)
+        progress.setMinimumDuration(500)
+
+        pool = self._createPool()
+        features = []
+        try:
+            results = self._iterResults(
+                self._iterTasks(parcels, rasterLayers), pool)
+            for i, (key, stats) in enumerate(results):
+                feature = QGisCore.QgsFeature(fields)
+                feature.setAttributes([key[0], key[1], stats.get('count', 0),
+                                       stats.get('sum', None),
+                                       stats.get('avg', None)])
+                features.append(feature)
+
+                if len(features) >= self.BATCH_SIZE:
+                    layer.dataProvider().addFeatures(features)
+                    features = []
+
+                progress.setValue(i + 1)
+                if progress.wasCanceled():
+                    break
+        finally:
+            if pool:
+                pool.terminate()
+                pool.join()
+
+        layer.dataProvider().addFeatures(features)
+        layer.updateExtents()
+        progress.setValue(progress.maximum())
+        return layer